@@ -0,0 +1,7 @@
+"""
+Microbenchmarks for hot paths (shared.protocol, db_server handlers).
+
+    python -m bench                       # run everything, print table
+    python -m bench -k protocol --save    # run a subset and append to history
+    python -m bench --compare             # run, compare with last saved run
+"""
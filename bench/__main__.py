@@ -0,0 +1,66 @@
+import argparse
+import asyncio
+import re
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+sys.path.append(str(ROOT / "server"))
+
+from bench import core, bench_protocol, bench_db, bench_backends, bench_startup
+
+MODULES = [bench_protocol, bench_db, bench_backends, bench_startup]
+DEFAULT_HISTORY = Path(__file__).resolve().parent / "history.json"
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench")
+    parser.add_argument("-k", "--filter", default="", help="regex on benchmark names")
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="DB sizes (number of reviews), e.g. 1000,10000,100000,1000000")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--history", default=str(DEFAULT_HISTORY))
+    parser.add_argument("--save", action="store_true", help="append this run to the history file")
+    parser.add_argument("--compare", action="store_true", help="compare with the last saved run")
+    parser.add_argument("--threshold", type=float, default=0.10, help="regression threshold (0.10 = 10%% slower)")
+    args = parser.parse_args()
+    args.sizes = [int(s) for s in args.sizes.split(",") if s]
+
+    pat = re.compile(args.filter)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    results = {}
+
+    print(f"{'benchmark':<48} {'median_us':>12} {'min_us':>12} {'loops':>8}")
+    for mod in MODULES:
+        for name, timer in mod.collect(args, loop):
+            if not pat.search(name):
+                if hasattr(timer, "close"): timer.close()
+                continue
+            r = core.measure(timer, repeat=args.repeat)
+            if hasattr(timer, "close"): timer.close()
+            results[name] = r
+            print(f"{name:<48} {r['median_us']:>12.3f} {r['min_us']:>12.3f} {r['loops']:>8}", flush=True)
+
+    status = 0
+    if args.compare:
+        hist = core.load_history(args.history)
+        if not hist:
+            print("\nNo saved run to compare against.")
+        else:
+            base = hist[-1]
+            regs = core.compare(base["results"], results, args.threshold)
+            print(f"\nCompared with run rev={base.get('rev')} ts={base.get('ts')}: "
+                  f"{len(regs)} regression(s) over {args.threshold:.0%}")
+            for name, old, new, ratio in regs:
+                print(f"  REGRESSION {name}: {old:.3f}us -> {new:.3f}us (x{ratio:.2f})")
+            status = 1 if regs else 0
+
+    if args.save:
+        core.save_run(args.history, results)
+        print(f"\nSaved to {args.history}")
+    loop.close()
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+JSON vs SQLite storage backend at several DB sizes (size = number of
+reviews, data from bench_db.build_db). Each backend is opened from a file
+written beforehand, so `open` is the restart cost (JSON: mapping the
+snapshot, see bench_startup for what follows); writes go through
+backend.write() and include waiting until they are durable.
+
+    python -m bench -k backend --sizes 1000000 --repeat 3
+"""
+import asyncio
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from db_backends import JsonBackend, SqliteBackend
+from bench.bench_db import build_db
+
+def timed(loop, coro_fn):
+    async def run(loops):
+        t0 = time.perf_counter()
+        await coro_fn(loops)
+        return time.perf_counter() - t0
+    return lambda loops: loop.run_until_complete(run(loops))
+
+def bench_open(cls, path):
+    def timer(loops):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            b = cls(path)
+            if isinstance(b, SqliteBackend): b.open()
+            else: b.load()
+            b.close()
+        return time.perf_counter() - t0
+    return timer
+
+def bench_read(store, col, act, data_fn):
+    def timer(loops):
+        t0 = time.perf_counter()
+        for i in range(loops): store.read(col, act, data_fn(i))
+        return time.perf_counter() - t0
+    return timer
+
+def bench_write(loop, store, col, act, data_fn, concurrency=1):
+    """
+    Each loop issues `concurrency` writes at once (so group commit can batch
+    them) and waits for all of them; reported time is per write.
+    """
+    async def run(loops):
+        for start in range(0, loops * concurrency, concurrency):
+            await asyncio.gather(*(store.write(col, act, data_fn(i)) for i in range(start, start + concurrency)))
+    timer = timed(loop, run)
+    return lambda loops: timer(loops) / concurrency
+
+def collect(args, loop):
+    for n in args.sizes:
+        tmpdir = Path(tempfile.mkdtemp(prefix="bench_backends_"))
+        base = build_db(n)
+        n_games = len(base["games"])
+        n_users = len(base["users_player"])
+
+        js = JsonBackend(tmpdir / "db.snap")
+        js.db = base
+        js.save()
+        js.close()
+        sq = SqliteBackend(tmpdir / "db.sqlite3")
+        sq.open()
+        sq.import_json(base)
+        sq.close()
+        del base, js
+
+        for name, cls, path in (("json", JsonBackend, tmpdir / "db.snap"), ("sqlite", SqliteBackend, tmpdir / "db.sqlite3")):
+            prefix = f"backend/{name}/{n}"
+            yield f"{prefix}/open", bench_open(cls, path)
+            store = cls(path)
+            store.open(loop)
+            if isinstance(store, JsonBackend):
+                # Steady state: everything decoded, as after the background warm-up
+                loop.run_until_complete(store.warm_up())
+            yield f"{prefix}/users_player_auth", bench_read(
+                store, "Users_Player", "auth", lambda i: {"user": f"u{i % n_users}", "password": "pw"})
+            yield f"{prefix}/games_get", bench_read(store, "Games", "get", lambda i: {"game_id": f"g{i % n_games}"})
+            yield f"{prefix}/games_list", bench_read(store, "Games", "list", lambda i: {})
+            yield f"{prefix}/reviews_list", bench_read(store, "Reviews", "list", lambda i: {"game_id": f"g{i % n_games}"})
+            # (u, g{u % n_games}) is always an existing, played pair -> update path
+            review = lambda i: {"user": f"u{i % n_users}", "game_id": f"g{i % n_users % n_games}",
+                                "rating": 1 + i % 5, "comment": "again"}
+            yield f"{prefix}/reviews_submit", bench_write(loop, store, "Reviews", "submit", review)
+            yield f"{prefix}/reviews_submit_x64", bench_write(loop, store, "Reviews", "submit", review, concurrency=64)
+            store.close()
+            del store
+        shutil.rmtree(tmpdir, ignore_errors=True)
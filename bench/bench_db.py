@@ -0,0 +1,116 @@
+"""
+db_server handlers at several DB sizes (size = number of reviews; users and
+games scale with it), against the JSON backend. Handlers only apply changes
+in memory (the Persister thread is not started here); atomic_save, the cost
+of one persisted snapshot, is timed on its own.
+"""
+import asyncio
+import copy
+import tempfile
+import time
+from pathlib import Path
+
+import db_server
+from db_backends import JsonBackend
+from shared.protocol import _pack
+from bench.bench_protocol import NullWriter
+
+def build_db(n):
+    n_games = max(10, n // 100)
+    n_users = max(10, n // 10)
+    games = {}
+    for i in range(n_games):
+        gid = f"g{i}"
+        games[gid] = {
+            "id": gid, "name": f"Game {i}", "author": f"dev{i % 50}", "description": "bench game",
+            "type": "GUI", "min_players": 2, "max_players": 4,
+            "versions": [{"version": "1.0.0", "file_path": f"storage/{gid}/1.0.0/game_1.0.0.zip", "uploaded_at": 0}],
+            "latest_version": "1.0.0", "reviews": [],
+            "rating_sum": 0, "rating_count": 0, "is_active": i % 10 != 0
+        }
+    users = {
+        f"u{i}": {"password": "pw", "status": "Idle", "play_history": [f"g{i % n_games}", f"g{(i + 1) % n_games}"], "created_at": str(i)}
+        for i in range(n_users)
+    }
+    reviews = {}
+    for i in range(n):
+        # one review per (game, user), as handle_submit_review guarantees
+        uid = i % n_users
+        gid = f"g{(uid + i // n_users) % n_games}"
+        r = 1 + i % 5
+        reviews[str(i + 1)] = {"id": str(i + 1), "game_id": gid, "user": f"u{uid}", "rating": r, "comment": "ok", "timestamp": 0}
+        games[gid]["rating_sum"] += r
+        games[gid]["rating_count"] += 1
+    for g in games.values():
+        if g["rating_count"]: g["average_rating"] = g["rating_sum"] / g["rating_count"]
+    return {
+        "users_dev": {f"dev{i}": {"password": "pw", "games": [], "created_at": str(i)} for i in range(50)},
+        "users_player": users, "games": games, "rooms": {}, "reviews": reviews,
+        "_counters": {"room": 0, "review": n, "timestamp": n_users}
+    }
+
+class RouterWriter(NullWriter):
+    def get_extra_info(self, name): return None
+    def close(self): pass
+    async def wait_closed(self): pass
+
+def bench_handler(fn, data_fn):
+    def timer(loops):
+        t0 = time.perf_counter()
+        for i in range(loops): fn(data_fn(i))
+        return time.perf_counter() - t0
+    return timer
+
+def bench_router(loop, req):
+    """Full db_server.handle_client path (decode, dispatch, encode) over in-memory streams."""
+    frame = _pack(req)
+    async def run(loops):
+        reader = asyncio.StreamReader(limit=2 ** 30)
+        reader.feed_data(frame * loops)
+        reader.feed_eof()
+        t0 = time.perf_counter()
+        await db_server.handle_client(reader, RouterWriter())
+        return time.perf_counter() - t0
+    return lambda loops: loop.run_until_complete(run(loops))
+
+def bench_atomic_save(store):
+    def timer(loops):
+        t0 = time.perf_counter()
+        for _ in range(loops): store.save()
+        return time.perf_counter() - t0
+    return timer
+
+def collect(args, loop):
+    tmpdir = Path(tempfile.mkdtemp(prefix="bench_db_"))
+    store = JsonBackend(tmpdir / "db.snap")
+    db_server.STORE = store
+
+    for n in args.sizes:
+        base = build_db(n)
+        n_games = len(base["games"])
+        n_users = len(base["users_player"])
+
+        def fresh():
+            store.db = copy.deepcopy(base)
+
+        fresh()
+        yield f"db/{n}/handle_game_list", bench_handler(store.games_list, lambda i: {})
+        yield f"db/{n}/handle_user_player_auth", bench_handler(
+            store.users_player_auth, lambda i: {"user": f"u{i % n_users}", "password": "pw"})
+        yield f"db/{n}/handle_record_play", bench_handler(
+            store.users_player_record_play, lambda i: {"user": f"u{i % n_users}", "game_id": f"g{i % n_games}"})
+        # existing (user, game) pair -> update path, found through the ReviewIndex (last user: worst case of the old scan)
+        last_u = n_users - 1
+        yield f"db/{n}/handle_submit_review_update", bench_handler(
+            store.reviews_submit,
+            lambda i: {"user": f"u{last_u}", "game_id": f"g{last_u % n_games}", "rating": 1 + i % 5, "comment": "again"})
+        yield f"db/{n}/handle_game_upload", bench_handler(
+            store.games_upload,
+            lambda i: {"game_id": f"g{i % n_games}", "metadata": {"name": "x", "author": "dev0"},
+                       "version_info": {"version": f"2.{i}", "file_path": "x", "uploaded_at": 0}})
+        fresh()
+        yield f"db/{n}/router_games_get", bench_router(loop, {"collection": "Games", "action": "get", "data": {"game_id": "g1"}})
+        yield f"db/{n}/router_reviews_list", bench_router(loop, {"collection": "Reviews", "action": "list", "data": {"game_id": "g1"}})
+        yield f"db/{n}/router_games_list", bench_router(loop, {"collection": "Games", "action": "list", "data": {}})
+
+        yield f"db/{n}/atomic_save", bench_atomic_save(store)
@@ -0,0 +1,85 @@
+"""
+shared.protocol: _pack, and sendf/recvf over in-memory streams and loopback TCP.
+"""
+import asyncio
+import time
+
+from shared.protocol import _pack, sendf, recvf
+
+SIZE_CLASSES = {"64B": 64, "4KB": 4 * 1024, "256KB": 256 * 1024, "4MB": 4 * 1024 * 1024}
+
+def payload(n):
+    return {"type": "BENCH", "data": "x" * n}
+
+class NullWriter:
+    """Minimal StreamWriter stand-in that swallows bytes."""
+    def __init__(self): self.n = 0
+    def is_closing(self): return False
+    def write(self, data): self.n += len(data)
+    async def drain(self): pass
+
+def bench_pack(obj):
+    def timer(loops):
+        t0 = time.perf_counter()
+        for _ in range(loops): _pack(obj)
+        return time.perf_counter() - t0
+    return timer
+
+def bench_inmem_send(loop, obj):
+    async def run(loops):
+        w = NullWriter()
+        t0 = time.perf_counter()
+        for _ in range(loops): await sendf(w, obj)
+        return time.perf_counter() - t0
+    return lambda loops: loop.run_until_complete(run(loops))
+
+def bench_inmem_recv(loop, obj):
+    frame = _pack(obj)
+    async def run(loops):
+        reader = asyncio.StreamReader(limit=2 ** 30)
+        reader.feed_data(frame * loops)
+        t0 = time.perf_counter()
+        for _ in range(loops): await recvf(reader)
+        return time.perf_counter() - t0
+    return lambda loops: loop.run_until_complete(run(loops))
+
+def bench_loopback(loop, obj):
+    """One-way: client sendf N frames, server recvf N frames; timed until the last arrives."""
+    state = {}
+
+    async def handler(reader, writer):
+        state["reader"] = reader
+        state["ready"].set()
+
+    async def setup():
+        state["ready"] = asyncio.Event()
+        server = await asyncio.start_server(handler, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        _, writer = await asyncio.open_connection("127.0.0.1", port)
+        await state["ready"].wait()
+        return server, writer
+
+    server, writer = loop.run_until_complete(setup())
+
+    async def run(loops):
+        reader = state["reader"]
+        t0 = time.perf_counter()
+        async def send():
+            for _ in range(loops): await sendf(writer, obj)
+        sender = asyncio.ensure_future(send())
+        for _ in range(loops): await recvf(reader)
+        await sender
+        return time.perf_counter() - t0
+
+    def timer(loops):
+        return loop.run_until_complete(run(loops))
+    timer.close = lambda: (writer.close(), server.close())
+    return timer
+
+def collect(args, loop):
+    for label, n in SIZE_CLASSES.items():
+        obj = payload(n)
+        yield f"protocol/pack/{label}", bench_pack(obj)
+        yield f"protocol/inmem_send/{label}", bench_inmem_send(loop, obj)
+        yield f"protocol/inmem_recv/{label}", bench_inmem_recv(loop, obj)
+        yield f"protocol/loopback/{label}", bench_loopback(loop, obj)
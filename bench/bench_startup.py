@@ -0,0 +1,69 @@
+"""
+db_server restart cost at several DB sizes (size = number of reviews, data
+from bench_db.build_db):
+
+    json_full_load      the pre-snapshot restart: read db.json + json.loads
+    snapshot_open       map db.snap; the server can listen after this
+    first_auth          open + one Users_Player/auth on a cold record
+    first_reviews_list  open + Reviews/list (decodes every review)
+    warm_up             open + the whole background warm-up
+
+    python -m bench -k startup --sizes 10000,100000,1000000 --repeat 3
+"""
+import contextlib
+import io
+import json
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from db_backends import JsonBackend
+from bench.bench_db import build_db
+
+def quiet(fn):
+    """Run fn without the [DB] log lines open() prints."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn()
+
+def bench_json_load(path):
+    def timer(loops):
+        t0 = time.perf_counter()
+        for _ in range(loops): json.loads(path.read_text(encoding="utf-8"))
+        return time.perf_counter() - t0
+    return timer
+
+def bench_open(path, then=None):
+    def timer(loops):
+        t = 0.0
+        for _ in range(loops):
+            b = JsonBackend(path)
+            t0 = time.perf_counter()
+            quiet(b.load)
+            if then: then(b)
+            t += time.perf_counter() - t0
+            b.close()
+        return t
+    return timer
+
+def collect(args, loop):
+    for n in args.sizes:
+        tmpdir = Path(tempfile.mkdtemp(prefix="bench_startup_"))
+        base = build_db(n)
+        n_users = len(base["users_player"])
+        (tmpdir / "db.json").write_text(json.dumps(base, ensure_ascii=False, indent=2), encoding="utf-8")
+        js = JsonBackend(tmpdir / "db.snap")
+        js.db = base
+        quiet(js.save)
+        js.close()
+        del base, js
+
+        snap = tmpdir / "db.snap"
+        prefix = f"startup/{n}"
+        yield f"{prefix}/json_full_load", bench_json_load(tmpdir / "db.json")
+        yield f"{prefix}/snapshot_open", bench_open(snap)
+        yield f"{prefix}/first_auth", bench_open(
+            snap, lambda b: b.read("Users_Player", "auth", {"user": f"u{n_users // 2}", "password": "pw"}))
+        yield f"{prefix}/first_reviews_list", bench_open(snap, lambda b: b.read("Reviews", "list", {"game_id": "g0"}))
+        yield f"{prefix}/warm_up", bench_open(snap, lambda b: quiet(lambda: loop.run_until_complete(b.warm_up())))
+        shutil.rmtree(tmpdir, ignore_errors=True)
@@ -0,0 +1,58 @@
+import json
+import platform
+import statistics
+import subprocess
+import time
+from pathlib import Path
+
+MIN_SAMPLE_S = 0.02
+
+def measure(timer, repeat=5, min_sample=MIN_SAMPLE_S):
+    """
+    timer(loops) -> elapsed seconds for `loops` operations.
+    Doubles loops until one sample takes min_sample, then takes `repeat`
+    samples and returns per-op timings in microseconds.
+    """
+    loops = 1
+    while True:
+        dt = timer(loops)
+        if dt >= min_sample or loops >= 1 << 20: break
+        loops *= 2
+    samples = [timer(loops) / loops * 1e6 for _ in range(repeat)]
+    return {
+        "median_us": round(statistics.median(samples), 3),
+        "min_us": round(min(samples), 3),
+        "loops": loops
+    }
+
+def git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except Exception:
+        return ""
+
+def load_history(path):
+    p = Path(path)
+    if not p.exists(): return []
+    return json.loads(p.read_text(encoding="utf-8"))
+
+def save_run(path, results):
+    hist = load_history(path)
+    hist.append({
+        "ts": int(time.time()),
+        "rev": git_rev(),
+        "python": platform.python_version(),
+        "results": results
+    })
+    Path(path).write_text(json.dumps(hist, indent=2), encoding="utf-8")
+
+def compare(baseline, results, threshold):
+    """Returns [(name, old_us, new_us, ratio)] for benches slower than baseline by more than threshold."""
+    regressions = []
+    for name, r in results.items():
+        old = baseline.get(name)
+        if not old: continue
+        ratio = r["median_us"] / old["median_us"] if old["median_us"] else 1.0
+        if ratio > 1.0 + threshold:
+            regressions.append((name, old["median_us"], r["median_us"], ratio))
+    return regressions
@@ -11,6 +11,8 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from shared.protocol import sendf, recvf
 from shared.consts import DEV_PORT, DEFAULT_DEV_HOST
 
+SDK_DIR = Path(__file__).parent / "game_sdk"
+
 # --- Utils ---
 async def ainput(prompt: str) -> str:
     print(prompt, end='', flush=True)
@@ -40,10 +42,19 @@ def pack_game(game_dir):
     
     with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
         for root, dirs, files in os.walk(game_path):
+            dirs[:] = [d for d in dirs if d != "__pycache__"]  # the dev server compiles for its own interpreter
             for file in files:
                 abs_path = Path(root) / file
                 rel_path = abs_path.relative_to(game_path)
                 zf.write(abs_path, rel_path)
+
+        # Bundle the shared game SDK unless the game ships its own copy
+        if not (game_path / "game_sdk").exists():
+            for root, dirs, files in os.walk(SDK_DIR):
+                dirs[:] = [d for d in dirs if d != "__pycache__"]
+                for file in files:
+                    abs_path = Path(root) / file
+                    zf.write(abs_path, Path("game_sdk") / abs_path.relative_to(SDK_DIR))
     
     size = os.path.getsize(zip_path)
     return zip_path, size, config
@@ -145,8 +156,8 @@ async def list_games_flow(reader, writer):
             elif op == "2":
                 await sendf(writer, {"type": "OFFSHELF", "game_id": selected['id']})
                 resp = await recvf(reader)
-                print("操作結果:", resp.get("status"))
-                selected['is_active'] = False 
+                print("操作結果:", resp.get("status"), resp.get("reason", ""))
+                if resp.get("status") == "OK": selected['is_active'] = False
             elif op == "3":
                 await view_reviews_flow(reader, writer, selected['id'])
                 
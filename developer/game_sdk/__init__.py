@@ -0,0 +1,11 @@
+"""
+Shared SDK for games hosted on the store.
+developer_client.pack_game bundles this package into every uploaded zip,
+so games import it as a top-level package (`from game_sdk import ...`).
+"""
+SDK_VERSION = "1.0.0"
+
+from .transport import Connection, pack, MAX_FRAME_SIZE
+from .handshake import server_handshake, connect
+from .room import GameRoom, parse_server_args, parse_client_args
+from .tick import TickClock
@@ -0,0 +1,48 @@
+import asyncio
+import json
+
+from . import SDK_VERSION
+from .transport import Connection
+
+AUTH_TIMEOUT = 10
+
+def _major(v):
+    return str(v or "0").split(".")[0]
+
+async def _write_line(writer, obj):
+    writer.write((json.dumps(obj) + "\n").encode())
+    await writer.drain()
+
+async def server_handshake(conn, token, timeout=AUTH_TIMEOUT):
+    """
+    Room-side half of the AUTH line exchange that precedes framed traffic.
+    Returns True when the token (and SDK major version, if sent) match.
+    """
+    try:
+        line = await asyncio.wait_for(conn.reader.readline(), timeout)
+        msg = json.loads(line.decode()) if line else {}
+    except (asyncio.TimeoutError, ValueError):
+        return False
+
+    reason = None
+    if msg.get("type") != "AUTH" or msg.get("token") != token:
+        reason = "BAD_TOKEN"
+    elif "sdk" in msg and _major(msg["sdk"]) != _major(SDK_VERSION):
+        reason = "SDK_MISMATCH"
+
+    if reason:
+        await _write_line(conn.writer, {"type": "AUTH", "status": "FAIL", "reason": reason})
+        return False
+    await _write_line(conn.writer, {"type": "AUTH", "status": "OK", "sdk": SDK_VERSION})
+    return True
+
+async def connect(host, port, token, timeout=AUTH_TIMEOUT):
+    """Open a connection to a room and authenticate. Raises ConnectionRefusedError on AUTH failure."""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    await _write_line(writer, {"type": "AUTH", "token": token, "sdk": SDK_VERSION})
+    line = await asyncio.wait_for(reader.readline(), timeout)
+    resp = json.loads(line.decode()) if line else {}
+    if resp.get("status") != "OK":
+        writer.close()
+        raise ConnectionRefusedError(f"Auth Failed: {resp.get('reason', resp)}")
+    return Connection(reader, writer)
@@ -0,0 +1,85 @@
+import argparse
+import asyncio
+
+from .transport import Connection, pack
+from .handshake import server_handshake
+
+class GameRoom:
+    """
+    Base class for a room server spawned by the lobby.
+    Handles listening, the AUTH handshake, the per-player receive loop and
+    teardown; games override the hooks below.
+    """
+    max_players = 2
+
+    def __init__(self, port, token, room_id):
+        self.port = port
+        self.token = token
+        self.room_id = room_id
+        self.conns = []
+        self._server = None
+        self._done = None
+
+    # --- hooks ---
+
+    async def on_join(self, conn): pass
+    async def on_message(self, conn, msg): pass
+    async def on_leave(self, conn): pass
+
+    # --- helpers ---
+
+    def broadcast(self, obj):
+        """Encode once and queue to every player without waiting on slow readers."""
+        frame = pack(obj)
+        for conn in list(self.conns):
+            conn.send_frame(frame)
+
+    def stop(self):
+        """Close the listener and let serve() return."""
+        if self._done and not self._done.done():
+            self._done.set_result(None)
+
+    # --- plumbing ---
+
+    async def handle_client(self, reader, writer):
+        conn = Connection(reader, writer)
+        try:
+            if not await server_handshake(conn, self.token): return
+            if len(self.conns) >= self.max_players: return
+            self.conns.append(conn)
+            await self.on_join(conn)
+            while True:
+                msg = await conn.recv()
+                await self.on_message(conn, msg)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        except Exception as e:
+            print(f"[Room {self.room_id}] Client error: {e}")
+        finally:
+            if conn in self.conns:
+                self.conns.remove(conn)
+                await self.on_leave(conn)
+            conn.close()
+
+    async def serve(self, host="0.0.0.0"):
+        self._done = asyncio.get_running_loop().create_future()
+        self._server = await asyncio.start_server(self.handle_client, host, self.port)
+        print(f"[Room {self.room_id}] Listening on {self.port}")
+        async with self._server:
+            await self._done
+        for conn in list(self.conns): conn.close()
+
+def parse_server_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--room-id", required=True)
+    return parser.parse_args()
+
+def parse_client_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--room-id", required=True)
+    return parser.parse_args()
@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+MAX_CATCHUP_TICKS = 5
+LATE_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100]
+
+class TickClock:
+    """
+    Fixed-period scheduler on the monotonic clock.
+    Sleeps until the next deadline rather than a fixed delay, so processing time
+    does not stretch the period. Missed ticks are replayed up to max_catchup;
+    beyond that the schedule is re-based on the current time.
+    """
+    def __init__(self, period_ms, max_catchup=MAX_CATCHUP_TICKS):
+        self.period = period_ms / 1000.0
+        self.max_catchup = max_catchup
+        self.next_deadline = None
+        self.ticks = 0
+        self.skipped = 0
+        self.max_late_ms = 0.0
+        self.hist = [0] * (len(LATE_BUCKETS_MS) + 1)
+
+    def start(self):
+        self.next_deadline = time.monotonic() + self.period
+
+    def _record(self, late_ms):
+        late_ms = max(0.0, late_ms)
+        self.max_late_ms = max(self.max_late_ms, late_ms)
+        for i, b in enumerate(LATE_BUCKETS_MS):
+            if late_ms <= b:
+                self.hist[i] += 1
+                return
+        self.hist[-1] += 1
+
+    async def wait(self):
+        """Sleep until the next deadline. Returns how many ticks are due (>= 1)."""
+        delay = self.next_deadline - time.monotonic()
+        if delay > 0: await asyncio.sleep(delay)
+        now = time.monotonic()
+        behind = now - self.next_deadline
+        self._record(behind * 1000.0)
+        due = 1 + max(0, int(behind // self.period))
+        if due > self.max_catchup:
+            self.skipped += due - self.max_catchup
+            due = self.max_catchup
+            self.next_deadline = now + self.period
+        else:
+            self.next_deadline += due * self.period
+        self.ticks += due
+        return due
+
+    def stats(self):
+        labels = [f"<={b}ms" for b in LATE_BUCKETS_MS] + [f">{LATE_BUCKETS_MS[-1]}ms"]
+        return {
+            "period_ms": self.period * 1000.0,
+            "ticks": self.ticks,
+            "skipped": self.skipped,
+            "max_late_ms": round(self.max_late_ms, 3),
+            "late_hist": dict(zip(labels, self.hist))
+        }
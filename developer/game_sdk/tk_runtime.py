@@ -0,0 +1,145 @@
+import asyncio
+import collections
+import queue
+import threading
+import time
+
+FRAME_MS = 16
+IDLE_GAP_S = 0.5
+LATENCY_SAMPLES = 512
+
+class TkRuntime:
+    """
+    Runs the asyncio network loop in a background thread and feeds Tk through
+    a thread-safe queue. The Tk thread only wakes when something is posted
+    (no update() polling), and repaints are coalesced to one per frame.
+
+    Network side (loop thread):  post(fn, *args)
+    GUI side (Tk thread):        submit(coro), request_render()
+    """
+    def __init__(self, root, on_render=None, frame_ms=FRAME_MS):
+        self.root = root
+        self.on_render = on_render
+        self.frame_s = frame_ms / 1000.0
+        self.loop = asyncio.new_event_loop()
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._run_loop, daemon=True)
+
+        self._wake_lock = threading.Lock()
+        self._wake_pending = False
+        self._render_pending = False
+        self._last_paint = 0.0
+        self._oldest_unpainted = None
+        self._current_ts = None
+
+        # stats
+        self.msgs = 0
+        self.paints = 0
+        self.latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+        self._last_wake_wall = self._start_wall
+        self._last_wake_cpu = self._start_cpu
+        self.idle_wall = 0.0
+        self.idle_cpu = 0.0
+
+    # --- loop thread ---
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def start(self, coro):
+        """Start the loop thread and schedule the main network coroutine on it."""
+        self.thread.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def post(self, fn, *args):
+        """Queue fn(*args) to run on the Tk thread. Safe to call from any thread."""
+        self.queue.put((time.perf_counter(), fn, args))
+        with self._wake_lock:
+            if self._wake_pending: return
+            self._wake_pending = True
+        try:
+            # Tkinter marshals calls from foreign threads onto the Tk thread
+            self.root.after(0, self._drain)
+        except RuntimeError:
+            # Mainloop not running (yet, or any more): let the next post() try again
+            with self._wake_lock:
+                self._wake_pending = False
+
+    # --- Tk thread ---
+
+    def submit(self, coro):
+        """Run a coroutine on the network loop from the Tk thread."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def _drain(self):
+        now = time.perf_counter()
+        cpu = time.process_time()
+        if now - self._last_wake_wall >= IDLE_GAP_S:
+            self.idle_wall += now - self._last_wake_wall
+            self.idle_cpu += cpu - self._last_wake_cpu
+        self._last_wake_wall, self._last_wake_cpu = now, cpu
+
+        with self._wake_lock:
+            self._wake_pending = False
+        while True:
+            try:
+                ts, fn, args = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            self.msgs += 1
+            self._current_ts = ts
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"GUI Error: {e}")
+        self._current_ts = None
+
+    def request_render(self):
+        """Schedule a repaint on the next frame boundary; repeated calls coalesce."""
+        if not self.on_render: return
+        if self._oldest_unpainted is None:
+            self._oldest_unpainted = self._current_ts or time.perf_counter()
+        if self._render_pending: return
+        self._render_pending = True
+        wait = self._last_paint + self.frame_s - time.perf_counter()
+        self.root.after(max(0, int(wait * 1000)), self._paint)
+
+    def _paint(self):
+        self._render_pending = False
+        try:
+            self.on_render()
+        except Exception as e:
+            print(f"GUI Error: {e}")
+        self._last_paint = time.perf_counter()
+        self.paints += 1
+        if self._oldest_unpainted is not None:
+            self.latencies.append(self._last_paint - self._oldest_unpainted)
+            self._oldest_unpainted = None
+
+    def mainloop(self):
+        self.root.after(0, self._drain)  # whatever was posted before the mainloop could be woken
+        try:
+            self.root.mainloop()
+        finally:
+            self.stop()
+
+    def stop(self):
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def stats(self):
+        wall = time.perf_counter() - self._start_wall
+        cpu = time.process_time() - self._start_cpu
+        lat = sorted(self.latencies)
+        def pct(p): return round(lat[min(len(lat) - 1, int(p * len(lat)))] * 1000, 2) if lat else 0.0
+        return {
+            "wall_s": round(wall, 2),
+            "cpu_pct": round(100 * cpu / wall, 2) if wall else 0.0,
+            "idle_cpu_pct": round(100 * self.idle_cpu / self.idle_wall, 2) if self.idle_wall else 0.0,
+            "msgs": self.msgs,
+            "paints": self.paints,
+            "msg_to_paint_ms": {"p50": pct(0.5), "p95": pct(0.95), "max": pct(1.0)}
+        }
@@ -0,0 +1,85 @@
+import asyncio
+import json
+import struct
+
+MAX_FRAME_SIZE = 1 << 20          # 1 MiB per frame
+HIGH_WATER = 64 * 1024            # send() waits for the peer above this
+MAX_BUFFERED = 1 << 20            # send_frame() drops peers that fall this far behind
+
+_HDR = struct.Struct('!I')
+
+def pack(obj):
+    """
+    Encode a message as a length-prefixed frame.
+    Format: [4-byte Big-Endian Length] [UTF-8 JSON Body]
+    """
+    if isinstance(obj, bytes):
+        body = obj
+    else:
+        body = json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    if len(body) > MAX_FRAME_SIZE:
+        raise ValueError(f"Frame too large: {len(body)} > {MAX_FRAME_SIZE}")
+    return _HDR.pack(len(body)) + body
+
+class Connection:
+    """
+    One framed peer. `data` is free for the game to keep per-player state.
+    """
+    def __init__(self, reader, writer, max_frame=MAX_FRAME_SIZE):
+        self.reader = reader
+        self.writer = writer
+        self.max_frame = max_frame
+        self.peer = writer.get_extra_info('peername')
+        self.data = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        transport = writer.transport
+        if transport is not None:
+            transport.set_write_buffer_limits(high=HIGH_WATER)
+
+    @property
+    def closed(self):
+        return self.writer.is_closing()
+
+    def buffered(self):
+        transport = self.writer.transport
+        return transport.get_write_buffer_size() if transport else 0
+
+    def send_frame(self, frame):
+        """
+        Queue a pre-encoded frame without waiting. Used for broadcasts so one
+        slow reader cannot stall the room; a peer that falls more than
+        MAX_BUFFERED behind is disconnected. Returns False if dropped.
+        """
+        if self.closed: return False
+        if self.buffered() > MAX_BUFFERED:
+            print(f"[SDK] Dropping slow peer {self.peer}")
+            self.close()
+            return False
+        self.writer.write(frame)
+        self.bytes_out += len(frame)
+        return True
+
+    async def send(self, obj):
+        if self.closed:
+            raise ConnectionResetError("Connection closed")
+        frame = pack(obj)
+        self.writer.write(frame)
+        self.bytes_out += len(frame)
+        await self.writer.drain()
+
+    async def recv(self):
+        try:
+            raw = await self.reader.readexactly(4)
+            n = _HDR.unpack(raw)[0]
+            if n > self.max_frame:
+                raise ValueError(f"Frame too large: {n}")
+            body = await self.reader.readexactly(n)
+        except asyncio.IncompleteReadError:
+            raise ConnectionResetError("Connection closed by peer")
+        self.bytes_in += 4 + n
+        return json.loads(body.decode('utf-8'))
+
+    def close(self):
+        try: self.writer.close()
+        except Exception: pass
@@ -1,29 +1,17 @@
 import asyncio
-import json
-import argparse
+import os
 import sys
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))  # game_sdk in the dev tree
+from game_sdk import connect, parse_client_args
+
 async def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--host", default="127.0.0.1")
-    parser.add_argument("--port", type=int, required=True)
-    parser.add_argument("--token", required=True)
-    parser.add_argument("--room-id", required=True)
-    args = parser.parse_args()
+    args = parse_client_args()
+    conn = None
     
     try:
-        reader, writer = await asyncio.open_connection(args.host, args.port)
-        
         # 1. Auth
-        writer.write((json.dumps({"type": "AUTH", "token": args.token}) + "\n").encode())
-        await writer.drain()
-        
-        line = await reader.readline()
-        if not line: return
-        resp = json.loads(line.decode())
-        if resp.get("status") != "OK":
-            print(f"Auth failed: {resp}")
-            return
+        conn = await connect(args.host, args.port, args.token)
         
         print("Connected to RPS Server! Waiting for opponent...")
         
@@ -31,10 +19,11 @@ async def main():
         choices = ["rock", "paper", "scissors"]
         
         while True:
-            line = await reader.readline()
-            if not line: break
+            try:
+                msg = await conn.recv()
+            except ConnectionResetError:
+                break
             
-            msg = json.loads(line.decode())
             typ = msg.get("type")
             
             if typ == "GAME_START":
@@ -45,12 +34,10 @@ async def main():
                     m = await asyncio.get_event_loop().run_in_executor(None, input, "Your move (rock/paper/scissors/q): ")
                     m = m.strip().lower()
                     if m == 'q':
-                        writer.write((json.dumps({"move": "q"}) + "\n").encode())
-                        await writer.drain()
+                        await conn.send({"move": "q"})
                         return
                     if m in choices:
-                        writer.write((json.dumps({"move": m}) + "\n").encode())
-                        await writer.drain()
+                        await conn.send({"move": m})
                         print("Waiting for opponent...")
                         break
                     print("Invalid move.")
@@ -68,8 +55,7 @@ async def main():
     except Exception as e:
         print(f"Client error: {e}")
     finally:
-        try: writer.close(); await writer.wait_closed()
-        except: pass
+        if conn: conn.close()
 
 if __name__ == "__main__":
     if sys.platform == 'win32':
@@ -1,94 +1,46 @@
-import asyncio
-import json
 import argparse
+import asyncio
+import itertools
+import os
 import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))  # game_sdk in the dev tree
+from game_sdk import Connection, server_handshake
+
 CHOICES = ["rock", "paper", "scissors"]
+ROUND_TIMEOUT = 30
 
 def decide(a: str, b: str) -> int:
     if a == b: return 0
     wins = {("rock", "scissors"), ("scissors", "paper"), ("paper", "rock")}
     return 1 if (a, b) in wins else -1
 
-async def handle_game_session(reader, writer, expected_token):
-    peer = writer.get_extra_info('peername')
-    print(f"[RPS Server] Connection from {peer}")
-    
-    # 1. Auth Handshake (HW3 specific)
-    try:
-        # Expect token message first
-        line = await reader.readline()
-        if not line:
-            return
-        
-        try:
-            msg = json.loads(line.decode())
-            if msg.get("type") != "AUTH" or msg.get("token") != expected_token:
-                print(f"[RPS Server] Auth fail. Expected {expected_token}, got {msg.get('token')}")
-                writer.write((json.dumps({"type": "AUTH", "status": "FAIL"}) + "\n").encode())
-                await writer.drain()
-                return
-        except:
-             return
-
-        writer.write((json.dumps({"type": "AUTH", "status": "OK"}) + "\n").encode())
-        await writer.drain()
-        print(f"[RPS Server] Client authenticated.")
-        
-    except Exception as e:
-        print(f"[RPS Server] Auth error: {e}")
-        return
-    pass
-
-clients = [] 
-
-async def acceptor(reader, writer, token):
-    global clients
+async def read_move(conn, timeout):
     try:
-        line = await reader.readline()
-        if not line: return
-        msg = json.loads(line.decode())
-        if msg.get("type") != "AUTH" or msg.get("token") != token:
-            writer.write((json.dumps({"type": "AUTH", "status": "FAIL"}) + "\n").encode())
-            await writer.drain()
-            writer.close()
-            return
-            
-        writer.write((json.dumps({"type": "AUTH", "status": "OK"}) + "\n").encode())
-        await writer.drain()
-        
-        clients.append({"r": reader, "w": writer, "ipv": writer.get_extra_info('peername')})
-        print(f"[RPS] Accepted client {len(clients)}/2")
-        
-        if len(clients) >= 2:
-            # Start Game
-            await run_game_loop()
-            
-    except Exception as e:
-        print(f"[RPS] Accept error: {e}")
+        msg = await asyncio.wait_for(conn.recv(), timeout)
+        return msg.get("move")
+    except asyncio.TimeoutError:
+        return None
+    except (ValueError, AttributeError, ConnectionError):  # bad frame, not an object, or gone
+        return None
 
-async def run_game_loop():
-    p1 = clients[0]
-    p2 = clients[1]
-    
-    print("[RPS] Starting Game!")
-    
-    await send_json(p1["w"], {"type": "GAME_START", "opponent": "Player 2"})
-    await send_json(p2["w"], {"type": "GAME_START", "opponent": "Player 1"})
-    
+async def run_match(p1, p2, match_id, round_timeout=ROUND_TIMEOUT):
+    print(f"[RPS] Match {match_id} starting")
     score = [0, 0] 
     
     try:
+        await p1.send({"type": "GAME_START", "opponent": "Player 2"})
+        await p2.send({"type": "GAME_START", "opponent": "Player 1"})
+        
         while True:
-            await send_json(p1["w"], {"type": "REQUEST_MOVE"})
-            await send_json(p2["w"], {"type": "REQUEST_MOVE"})
+            await p1.send({"type": "REQUEST_MOVE"})
+            await p2.send({"type": "REQUEST_MOVE"})
             
-            moves = await asyncio.gather(
-                read_move(p1["r"]),
-                read_move(p2["r"])
+            m1, m2 = await asyncio.gather(
+                read_move(p1, round_timeout),
+                read_move(p2, round_timeout)
             )
-            
-            m1, m2 = moves
-            if not m1 or not m2 or m1=='q' or m2=='q':
+            if m1 not in CHOICES or m2 not in CHOICES:
                 break
                 
             res = decide(m1, m2)
@@ -100,46 +52,80 @@ async def run_game_loop():
                 "p1_move": m1, "p2_move": m2,
                 "score": score
             }
-            await send_json(p1["w"], round_res)
-            await send_json(p2["w"], round_res)
+            await p1.send(round_res)
+            await p2.send(round_res)
             
     except Exception as e:
-        print(f"Game error: {e}")
+        print(f"[RPS] Match {match_id} error: {e}")
     finally:
-        await broadcast({"type": "GAME_END", "final_score": score})
-        sys.exit(0)
+        for c in (p1, p2):
+            try: await c.send({"type": "GAME_END", "final_score": score})
+            except: pass
+            c.close()
+        print(f"[RPS] Match {match_id} finished {score}")
 
-async def read_move(reader):
-    try:
-        line = await reader.readline()
-        if not line: return None
-        msg = json.loads(line.decode())
-        return msg.get("move")
-    except: return None
+class MatchMaker:
+    """
+    Pairs authenticated connections into independent match tasks, so one
+    process can host many concurrent matches. serve() returns once
+    max_matches have finished (0 = run until cancelled).
+    """
+    def __init__(self, token, max_matches=1, round_timeout=ROUND_TIMEOUT):
+        self.token = token
+        self.max_matches = max_matches
+        self.round_timeout = round_timeout
+        self.waiting = None
+        self.matches = set()
+        self.finished = 0
+        self._ids = itertools.count(1)
+        self._done = None
+
+    async def handle_client(self, reader, writer):
+        conn = Connection(reader, writer)
+        try:
+            if not await server_handshake(conn, self.token):
+                conn.close()
+                return
+        except Exception as e:
+            print(f"[RPS] Accept error: {e}")
+            conn.close()
+            return
+
+        if self.waiting is None or self.waiting.closed or self.waiting.reader.at_eof():
+            self.waiting = conn
+            return
+
+        p1, self.waiting = self.waiting, None
+        task = asyncio.create_task(run_match(p1, conn, next(self._ids), self.round_timeout))
+        self.matches.add(task)
+        task.add_done_callback(self._match_done)
 
-async def send_json(writer, data):
-    writer.write((json.dumps(data) + "\n").encode())
-    await writer.drain()
+    def _match_done(self, task):
+        self.matches.discard(task)
+        self.finished += 1
+        if self.max_matches and self.finished >= self.max_matches and not self._done.done():
+            self._done.set_result(None)
 
-async def broadcast(data):
-    for c in clients:
-        try: await send_json(c["w"], data)
-        except: pass
+    async def serve(self, host, port):
+        self._done = asyncio.get_running_loop().create_future()
+        server = await asyncio.start_server(self.handle_client, host, port)
+        print(f"[RPS Server] Listening on {port}")
+        async with server:
+            await self._done
+        for t in list(self.matches): t.cancel()
+        if self.waiting: self.waiting.close()
 
 async def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--port", type=int, required=True)
     parser.add_argument("--token", required=True)
     parser.add_argument("--room-id", required=True)
+    parser.add_argument("--max-matches", type=int, default=1, help="exit after N matches (0 = unlimited)")
+    parser.add_argument("--round-timeout", type=float, default=ROUND_TIMEOUT)
     args = parser.parse_args()
     
-    server = await asyncio.start_server(
-        lambda r, w: acceptor(r, w, args.token),
-        "0.0.0.0", args.port
-    )
-    print(f"[RPS Server] Listening on {args.port}")
-    async with server:
-        await server.serve_forever()
+    mm = MatchMaker(args.token, args.max_matches, args.round_timeout)
+    await mm.serve("0.0.0.0", args.port)
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,30 +1,24 @@
 import sys
-import argparse
+import os
 import asyncio
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))  # game_sdk in the dev tree
+from game_sdk import connect, parse_client_args
+
 async def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--host", default="127.0.0.1")
-    parser.add_argument("--port", type=int, required=True)
-    parser.add_argument("--token", required=True)
-    parser.add_argument("--room-id", required=True)
-    args, unknown = parser.parse_known_args()
+    args = parse_client_args()
 
     print(f"[DemoClient] Connecting to {args.host}:{args.port} with token {args.token}")
     
     try:
-        reader, writer = await asyncio.open_connection(args.host, args.port)
-        
-        writer.write(f"{args.token}\n".encode())
-        await writer.drain()
+        conn = await connect(args.host, args.port, args.token)
         
         print("[DemoClient] Connected! Type something to echo (or 'quit'):")
         
         async def recv_loop():
             while True:
-                data = await reader.read(1024)
-                if not data: break
-                print(f"\n[Server] {data.decode().strip()}")
+                msg = await conn.recv()
+                print(f"\n[Server] {msg.get('text', '')}")
         
         asyncio.create_task(recv_loop())
         
@@ -34,8 +28,7 @@ async def main():
             if not msg: continue
             if msg == "quit": break
             
-            writer.write(f"{msg}\n".encode())
-            await writer.drain()
+            await conn.send({"type": "ECHO", "text": msg})
             
     except Exception as e:
         print(f"[DemoClient] Error: {e}")
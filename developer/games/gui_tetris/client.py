@@ -1,41 +1,117 @@
 import asyncio
-import json
-import argparse
 import sys
 import os
 import tkinter as tk
-from threading import Thread
-import struct
 
-# --- Protocol ---
-_MAX = 65536
-def _pack(obj):
-    body = json.dumps(obj).encode('utf-8')
-    return struct.pack('!I', len(body)) + body
+from tetris_core import BOARD_W, BOARD_H, collides, rotate_cw, rotate_ccw
 
-async def sendf(writer, obj):
-    writer.write(_pack(obj))
-    await writer.drain()
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))  # game_sdk in the dev tree
+from game_sdk import connect, parse_client_args
+from game_sdk.tk_runtime import TkRuntime
 
-async def recvf(reader):
-    raw = await reader.readexactly(4)
-    n = struct.unpack('!I', raw)[0]
-    data = await reader.readexactly(n)
-    return json.loads(data.decode('utf-8'))
+# --- Rendering / Prediction ---
+
+CELL = 20
+COLORS = {'.': "black", '#': "gray", '@': "cyan"}
+
+class BoardView:
+    """
+    Fixed BOARD_W x BOARD_H grid of canvas rectangles created once.
+    update() only reconfigures the cells whose character changed.
+    """
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.rows = ['.' * BOARD_W] * BOARD_H
+        self.items = [
+            [canvas.create_rectangle(x*CELL, y*CELL, (x+1)*CELL, (y+1)*CELL, fill="black", outline="black")
+             for x in range(BOARD_W)]
+            for y in range(BOARD_H)
+        ]
+        self.title = ""
+        self.title_item = canvas.create_text(10, 10, text="", fill="white", anchor="nw")
+
+    def update(self, rows, title):
+        for y, row in enumerate(rows[:BOARD_H]):
+            old = self.rows[y]
+            if row == old: continue
+            for x, ch in enumerate(row[:BOARD_W]):
+                if ch != old[x]:
+                    color = COLORS.get(ch, "black")
+                    self.canvas.itemconfigure(self.items[y][x], fill=color, outline="black" if ch == '.' else "white")
+            self.rows[y] = row
+        if title != self.title:
+            self.title = title
+            self.canvas.itemconfigure(self.title_item, text=title)
+
+class Predictor:
+    """
+    Local copy of this player's falling piece. Inputs are applied immediately
+    and kept in a pending buffer; each snapshot resets to the server state,
+    drops inputs up to its "ack" seq and replays the rest.
+    """
+    def __init__(self):
+        self.seq = 0
+        self.pending = []   # [(seq, action)]
+        self.board = None   # locked cells of the last snapshot
+        self.piece = None   # (x, y, shape)
+        self.dropped = False
+
+    def push(self, action):
+        self.seq += 1
+        self.pending.append((self.seq, action))
+        self._apply(action)
+        return self.seq
+
+    def _apply(self, action):
+        # After a hard drop the next piece is unknown until the server answers
+        if not self.piece or self.board is None or self.dropped: return
+        x, y, shape = self.piece
+        if action == "L": cand = (x-1, y, shape)
+        elif action == "R": cand = (x+1, y, shape)
+        elif action == "SD": cand = (x, y+1, shape)
+        elif action == "CW": cand = (x, y, rotate_cw(shape))
+        elif action == "CCW": cand = (x, y, rotate_ccw(shape))
+        elif action == "HD":
+            while not collides(self.board, x, y+1, shape): y += 1
+            self.piece = (x, y, shape)
+            self.dropped = True
+            return
+        else: return
+        if not collides(self.board, *cand): self.piece = cand
+
+    def reconcile(self, view):
+        ack = view.get("ack", 0)
+        self.pending = [(s, a) for s, a in self.pending if s > ack]
+        self.board = [[1 if c == '#' else 0 for c in row] for row in view["board"]]
+        p = view.get("piece")
+        live = p and any('@' in row for row in view["board"])
+        self.piece = (p["x"], p["y"], [tuple(c) for c in p["shape"]]) if live else None
+        self.dropped = False
+        for _, a in self.pending: self._apply(a)
+
+    def rows(self):
+        vis = [['#' if c else '.' for c in row] for row in self.board]
+        if self.piece:
+            x, y, shape = self.piece
+            for dx, dy in shape:
+                cx, cy = x+dx, y+dy
+                if 0 <= cx < BOARD_W and 0 <= cy < BOARD_H: vis[cy][cx] = '@'
+        return [''.join(row) for row in vis]
 
 # --- Client Logic with Tkinter ---
 
 class TetrisClientGUI:
-    def __init__(self, loop, args):
-        self.loop = loop
+    def __init__(self, args):
         self.args = args
-        self.reader = None
-        self.writer = None
+        self.conn = None
         self.role = "?"
+        self.predictor = Predictor()
+        self.last_snap = None
         
         self.root = tk.Tk()
         self.root.title("Tetris (GUI)")
         self.root.geometry("600x500")
+        self.rt = TkRuntime(self.root, on_render=self.render)
         
         self.lbl_status = tk.Label(self.root, text="Connecting...", font=("Arial", 14))
         self.lbl_status.pack(pady=5)
@@ -52,72 +128,64 @@ class TetrisClientGUI:
         self.lbl_p2 = tk.Label(frame_boards, text="Player 2", font=("Arial", 12))
         self.lbl_p2.place(in_=self.cv_p2, relx=0.5, rely=-0.05, anchor="s")
         
+        self.view_p1 = BoardView(self.cv_p1)
+        self.view_p2 = BoardView(self.cv_p2)
+
         self.root.bind("<Key>", self.on_key)
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
-        
-        self.loop.create_task(self.connect())
 
-    def draw_board(self, canvas, rows, lines, title):
-        canvas.delete("all")
-        bw = 20
-        
-        for y, row in enumerate(rows):
-            for x, char in enumerate(row):
-                color = "black"
-                if char == '#': color = "gray"
-                elif char == '@': color = "cyan"
-                
-                if color != "black":
-                    canvas.create_rectangle(x*bw, y*bw, (x+1)*bw, (y+1)*bw, fill=color, outline="white")
-        
-        canvas.create_text(10, 10, text=f"{title}\nLines: {lines}", fill="white", anchor="nw")
+    def render(self):
+        if not self.last_snap: return
+        for key, view in (("p1", self.view_p1), ("p2", self.view_p2)):
+            p = self.last_snap[key]
+            mine = key == self.role.lower()
+            rows = self.predictor.rows() if mine and self.predictor.board is not None else p["board"]
+            view.update(rows, f"{'YOU' if mine else key.upper()}\nLines: {p['lines']}  Lv {p.get('level', 0)}")
+
+    def set_status(self, text):
+        self.lbl_status.config(text=text)
+
+    # --- Runs on the network thread; everything touching Tk goes through rt.post ---
 
     async def connect(self):
         try:
-            self.reader, self.writer = await asyncio.open_connection(self.args.host, self.args.port)
-            
-            self.writer.write((json.dumps({"type": "AUTH", "token": self.args.token}) + "\n").encode())
-            await self.writer.drain()
-            
-            line = await self.reader.readline()
-            resp = json.loads(line.decode())
-            if resp.get("status") != "OK":
-                self.lbl_status.config(text=f"Auth Failed: {resp}")
-                return
-
-            self.lbl_status.config(text="Waiting for opponent...")
+            self.conn = await connect(self.args.host, self.args.port, self.args.token)
+            self.rt.post(self.set_status, "Waiting for opponent...")
             
             while True:
-                msg = await recvf(self.reader)
-                t = msg.get("type")
-                
-                if t == "WELCOME":
-                    self.role = msg.get("role")
-                    self.root.title(f"Tetris (GUI) - You are {self.role}")
-                    
-                elif t == "START":
-                    self.lbl_status.config(text="Game Started!")
-                    
-                elif t == "SNAPSHOT":
-                    p1 = msg["p1"]
-                    p2 = msg["p2"]
-                    
-                    self.draw_board(self.cv_p1, p1["board"], p1["lines"], "YOU" if self.role=="P1" else "P1")
-                    self.draw_board(self.cv_p2, p2["board"], p2["lines"], "YOU" if self.role=="P2" else "P2")
-                    
-                elif t == "BYE":
-                    reason = msg.get("reason", "")
-                    self.lbl_status.config(text=f"Game Over: {reason}")
-                    break
+                msg = await self.conn.recv()
+                self.rt.post(self.on_message, msg)
+                if msg.get("type") == "BYE": break
                     
+        except ConnectionRefusedError as e:
+            self.rt.post(self.set_status, str(e))
         except Exception as e:
             print(f"Error: {e}")
-            self.lbl_status.config(text="Connection Error")
-        finally:
-            self.root.quit()
+            self.rt.post(self.set_status, "Connection Error")
+
+    # --- Tk thread ---
+
+    def on_message(self, msg):
+        t = msg.get("type")
+        if t == "WELCOME":
+            self.role = msg.get("role")
+            self.root.title(f"Tetris (GUI) - You are {self.role}")
+            
+        elif t == "START":
+            self.set_status("Game Started!")
+            
+        elif t == "SNAPSHOT":
+            self.last_snap = msg
+            mine = msg.get(self.role.lower())
+            if mine and "piece" in mine:
+                self.predictor.reconcile(mine)
+            self.rt.request_render()
+            
+        elif t == "BYE":
+            self.set_status(f"Game Over: {msg.get('reason', '')}")
 
     def on_key(self, event):
-        if not self.writer: return 
+        if not self.conn: return 
         k = event.keysym
         action = None
         if k == 'Left': action = "L"
@@ -128,64 +196,32 @@ class TetrisClientGUI:
         elif k == 'z': action = "CCW"
         
         if action:
-            self.loop.create_task(sendf(self.writer, {"type": "INPUT", "action": action}))
+            seq = self.predictor.push(action)
+            self.rt.request_render()
+            self.rt.submit(self.conn.send({"type": "INPUT", "action": action, "seq": seq}))
 
-    async def on_close(self):
-        try:
-            if self.writer: 
-                self.writer.close()
-        except: pass
-        
+    def on_close(self):
+        if self.conn:
+            self.rt.loop.call_soon_threadsafe(self.conn.close)
+        print(f"[Runtime] {self.rt.stats()}")
         try:
             self.root.destroy()
         except: pass
         
         os._exit(0)
 
-    def on_close_handler(self):
-        self.loop.create_task(self.on_close())
-
 def run_gui(args):
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    
-    app = TetrisClientGUI(loop, args)
-    app.root.protocol("WM_DELETE_WINDOW", app.on_close_handler)
-    
-    async def tk_updater():
-        while True:
-            try:
-                app.root.update()
-                await asyncio.sleep(0.01)
-            except (tk.TclError, RuntimeError):
-                break
-            except Exception as e:
-                print(f"GUI Error: {e}")
-                break
-        
-        try:
-            tasks = [t for t in asyncio.all_tasks(loop) if t is not asyncio.current_task()]
-            for task in tasks: task.cancel()
-        except: pass
-        
-        
-        loop.stop()
-        os._exit(0)
-    
+    app = TetrisClientGUI(args)
+    app.rt.start(app.connect())
     try:
-        loop.run_until_complete(tk_updater())
+        app.rt.mainloop()
     except KeyboardInterrupt:
         pass
     os._exit(0)
 
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--host", default="127.0.0.1")
-    parser.add_argument("--port", type=int, required=True)
-    parser.add_argument("--token", required=True)
-    parser.add_argument("--room-id", required=True)
-    args = parser.parse_args()
+    args = parse_client_args()
     
     if sys.platform == 'win32':
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
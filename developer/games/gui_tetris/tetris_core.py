@@ -0,0 +1,153 @@
+"""
+Tetris rules shared by server.py (authoritative) and client.py (prediction).
+"""
+import random
+
+BOARD_W, BOARD_H = 10, 20
+DROP_MS_DEFAULT = 600
+TARGET_LINES = 20
+
+TICK_MS = 50
+LINES_PER_LEVEL = 5
+LEVEL_STEP_MS = 60
+MIN_DROP_MS = 100
+
+I_SHAPE = [(-1,0),(0,0),(1,0),(2,0)]
+O_SHAPE = [(0,0),(1,0),(0,1),(1,1)]
+T_SHAPE = [(-1,0),(0,0),(1,0),(0,1)]
+S_SHAPE = [(-1,1),(0,1),(0,0),(1,0)]
+Z_SHAPE = [(-1,0),(0,0),(0,1),(1,1)]
+J_SHAPE = [(-1,0),(-1,1),(0,0),(1,0)]
+L_SHAPE = [(-1,0),(0,0),(1,0),(1,1)]
+ALL_SHAPES = [I_SHAPE,O_SHAPE,T_SHAPE,S_SHAPE,Z_SHAPE,J_SHAPE,L_SHAPE]
+
+def rotate_cw(shape): return [(y, -x) for (x,y) in shape]
+def rotate_ccw(shape): return [(-y, x) for (x,y) in shape]
+
+def collides(board, x, y, shape):
+    for dx, dy in shape:
+        cx, cy = x+dx, y+dy
+        if cx < 0 or cx >= BOARD_W or cy < 0 or cy >= BOARD_H: return True
+        if board[cy][cx]: return True
+    return False
+
+class Tetris:
+    def __init__(self, seed: int):
+        self.rng = random.Random(seed)
+        self.board = [[0]*BOARD_W for _ in range(BOARD_H)]
+        self.score = 0
+        self.lines = 0
+        self.bag = []
+        self.next_queue = []        
+        self.dead = False
+        self.gravity_acc = 0
+        self.spawn_piece()
+
+    def _refill_bag(self):
+        bag = ALL_SHAPES[:]               
+        self.rng.shuffle(bag)
+        self.bag.extend(bag)
+
+    def next_piece(self):
+        if not self.bag: self._refill_bag()
+        return [tuple(p) for p in self.bag.pop(0)]
+
+    def spawn_piece(self):
+        while len(self.next_queue) < 3:
+            self.next_queue.append(self.next_piece())
+        self.px, self.py = (BOARD_W//2), 0
+        self.shape = [tuple(p) for p in self.next_queue.pop(0)]
+        if self.collide(self.px, self.py, self.shape):
+            self.dead = True
+        else:
+            self.dead = False
+
+    def rotate_right(self):
+        if self.dead: return
+        cand = rotate_cw(self.shape)
+        if not self.collide(self.px, self.py, cand): self.shape = cand
+
+    def rotate_left(self):
+        if self.dead: return
+        cand = rotate_ccw(self.shape)
+        if not self.collide(self.px, self.py, cand): self.shape = cand
+
+    def collide(self, x, y, shape):
+        return collides(self.board, x, y, shape)
+
+    def lock(self):
+        for dx, dy in self.shape:
+            cx, cy = self.px+dx, self.py+dy
+            if 0 <= cy < BOARD_H and 0 <= cx < BOARD_W:
+                self.board[cy][cx] = 1
+        
+        new_rows = [row for row in self.board if not all(row)]
+        cleared = BOARD_H - len(new_rows)
+        while len(new_rows) < BOARD_H:
+            new_rows.insert(0, [0]*BOARD_W)
+        self.board = new_rows
+        if cleared: self.lines += cleared
+
+    def step_gravity(self):
+        if self.dead: return
+        ny = self.py + 1
+        if self.collide(self.px, ny, self.shape):
+            self.lock()
+            self.spawn_piece()
+        else:
+            self.py = ny
+
+    @property
+    def level(self):
+        return self.lines // LINES_PER_LEVEL
+
+    def drop_ticks(self, base_ms):
+        ms = max(MIN_DROP_MS, base_ms - self.level * LEVEL_STEP_MS)
+        return max(1, round(ms / TICK_MS))
+
+    def tick(self, base_ms):
+        """Advance one scheduler tick; returns True if gravity was applied."""
+        if self.dead: return False
+        self.gravity_acc += 1
+        if self.gravity_acc < self.drop_ticks(base_ms): return False
+        self.gravity_acc = 0
+        self.step_gravity()
+        return True
+
+    def move(self, dx):
+        if self.dead: return
+        nx = self.px + dx
+        if not self.collide(nx, self.py, self.shape): self.px = nx
+
+    def soft_drop(self):
+        if self.dead: return
+        ny = self.py + 1
+        if not self.collide(self.px, ny, self.shape): self.py = ny
+    
+    def hard_drop(self):
+        if self.dead: return
+        while True:
+            ny = self.py + 1
+            if self.collide(self.px, ny, self.shape):
+                self.lock()
+                self.spawn_piece()
+                break
+            else:
+                self.py = ny
+
+    def to_rows(self):
+        vis = [row[:] for row in self.board]
+        if not self.dead:
+            for dx, dy in self.shape:
+                x, y = self.px+dx, self.py+dy
+                if 0 <= x < BOARD_W and 0 <= y < BOARD_H:
+                    vis[y][x] = 2
+        
+        rows = []
+        for y in range(BOARD_H):
+            s = ''.join('#' if vis[y][x]==1 else ('@' if vis[y][x]==2 else '.') for x in range(BOARD_W))
+            rows.append(s)
+        return rows
+
+    def piece(self):
+        return {"x": self.px, "y": self.py, "shape": [list(p) for p in self.shape]}
@@ -1,28 +1,24 @@
-import asyncio, json, struct, sys, argparse, os, tkinter as tk
+import asyncio, sys, os, time, tkinter as tk
 
-def _pack(obj):
-    body = json.dumps(obj).encode('utf-8')
-    return struct.pack('!I', len(body)) + body
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))  # game_sdk in the dev tree
+from game_sdk import connect, parse_client_args
+from game_sdk.tk_runtime import TkRuntime
 
-async def sendf(writer, obj):
-    writer.write(_pack(obj))
-    await writer.drain()
-
-async def recvf(reader):
-    raw = await reader.readexactly(4)
-    n = struct.unpack('!I', raw)[0]
-    data = await reader.readexactly(n)
-    return json.loads(data.decode('utf-8'))
+SEND_INTERVAL = 0.05    # at most one CLICKS frame per 50 ms
 
 class ClickerGUI:
-    def __init__(self, loop, args):
-        self.loop = loop
+    def __init__(self, args):
         self.args = args
-        self.writer = None
+        self.conn = None
+        self.scores = {}
+        self.pending = []           # click times, owned by the network thread
+        self._flush_handle = None
+        self._last_send = 0.0
         
         self.root = tk.Tk()
         self.root.title("Multi Clicker")
         self.root.geometry("400x300")
+        self.rt = TkRuntime(self.root, on_render=self.render)
         
         self.lbl_info = tk.Label(self.root, text="Waiting...", font=("Arial", 14))
         self.lbl_info.pack(pady=10)
@@ -33,88 +29,84 @@ class ClickerGUI:
         self.lbl_scores = tk.Label(self.root, text="", font=("Courier", 12), justify="left")
         self.lbl_scores.pack(pady=10)
         
-        self.root.protocol("WM_DELETE_WINDOW", self.on_close_handler)
-        self.loop.create_task(self.connect())
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def on_click(self):
-        if self.writer:
-            self.loop.create_task(sendf(self.writer, {"type": "CLICK"}))
+        if self.conn:
+            self.rt.loop.call_soon_threadsafe(self._queue_click, time.monotonic())
+
+    # --- Network thread: clicks are batched and sent at a bounded rate ---
+
+    def _queue_click(self, ts):
+        self.pending.append(ts)
+        if not self._flush_handle:
+            wait = max(0.0, self._last_send + SEND_INTERVAL - time.monotonic())
+            self._flush_handle = self.rt.loop.call_later(wait, self._flush)
+
+    def _flush(self):
+        self._flush_handle = None
+        if not self.pending or not self.conn: return
+        now = time.monotonic()
+        ago = [int((now - t) * 1000) for t in self.pending]
+        self.pending = []
+        self._last_send = now
+        self.rt.loop.create_task(self.conn.send({"type": "CLICKS", "n": len(ago), "ago_ms": ago}))
+
+    def set_info(self, text):
+        self.lbl_info.config(text=text)
+
+    def render(self):
+        txt = "Scores:\n" + "\n".join([f"{k}: {v}" for k, v in self.scores.items()])
+        self.lbl_scores.config(text=txt)
+
+    def on_message(self, msg):
+        t = msg.get("type")
+        if t == "WELCOME":
+            self.set_info(f"You are {msg['my_id']}")
+        elif t == "UPDATE":
+            self.scores = msg.get("scores", {})
+            self.rt.request_render()
+        elif t == "DELTA":
+            self.scores.update(msg.get("scores", {}))
+            self.rt.request_render()
+        elif t == "WINNER":
+            self.set_info(f"Winner: {msg['winner']}!")
 
     async def connect(self):
         try:
-            reader, writer = await asyncio.open_connection(self.args.host, self.args.port)
-            self.writer = writer
-            
-            # Auth
-            writer.write((json.dumps({"type": "AUTH", "token": self.args.token}) + "\n").encode())
-            await writer.drain()
-            
-            line = await reader.readline()
-            if json.loads(line.decode()).get("status") != "OK":
-                self.lbl_info.config(text="Auth Failed")
-                return
-
-            self.lbl_info.config(text="Connected!")
+            self.conn = await connect(self.args.host, self.args.port, self.args.token)
+            self.rt.post(self.set_info, "Connected!")
             
             while True:
-                msg = await recvf(reader)
-                t = msg.get("type")
-                if t == "WELCOME":
-                    self.lbl_info.config(text=f"You are {msg['my_id']}")
-                elif t == "UPDATE":
-                    scores = msg.get("scores", {})
-                    txt = "Scores:\n" + "\n".join([f"{k}: {v}" for k, v in scores.items()])
-                    self.lbl_scores.config(text=txt)
-                elif t == "WINNER":
-                    self.lbl_info.config(text=f"Winner: {msg['winner']}!")
+                msg = await self.conn.recv()
+                self.rt.post(self.on_message, msg)
 
+        except ConnectionRefusedError as e:
+            self.rt.post(self.set_info, str(e))
         except Exception as e:
             print(e)
-            try:
-                self.lbl_info.config(text="Disconnected")
-            except: pass
+            self.rt.post(self.set_info, "Disconnected")
         finally:
-            self.on_close_handler()
+            self.rt.post(self.on_close)
 
-    async def on_close(self):
-        try: 
-            if self.writer: self.writer.close()
-        except: pass
+    def on_close(self):
+        if self.conn:
+            self.rt.loop.call_soon_threadsafe(self.conn.close)
+        print(f"[Runtime] {self.rt.stats()}")
         try:
             self.root.destroy()
         except: pass
         os._exit(0)
-
-    def on_close_handler(self):
-        self.loop.create_task(self.on_close())
     
 def run(args):
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    app = ClickerGUI(loop, args)
-    
-    async def tk_loop():
-        while True:
-            try:
-                app.root.update()
-                await asyncio.sleep(0.01)
-            except: 
-                break
-        
-        loop.stop()
-        os._exit(0)
-    
-    try: loop.run_until_complete(tk_loop())
+    app = ClickerGUI(args)
+    app.rt.start(app.connect())
+    try: app.rt.mainloop()
     except: pass
     os._exit(0)
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--host", default="127.0.0.1")
-    parser.add_argument("--port", type=int, required=True)
-    parser.add_argument("--token", required=True)
-    parser.add_argument("--room-id", required=True)
-    args = parser.parse_args()
+    args = parse_client_args()
     
     if sys.platform == 'win32':
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
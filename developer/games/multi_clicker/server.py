@@ -1,99 +1,114 @@
-import argparse, asyncio, json, struct, sys, random, os
+import asyncio, sys, os, time
 
-_MAX = 65536
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))  # game_sdk in the dev tree
+from game_sdk import GameRoom, TickClock, parse_server_args
 
-def _pack(obj):
-    body = json.dumps(obj).encode('utf-8')
-    return struct.pack('!I', len(body)) + body
+WIN_SCORE = 50
+MAX_CPS = 20            # accepted clicks per second per player (token bucket, burst = 1s)
+BROADCAST_MS = 100      # scores are applied and broadcast at this interval
+MAX_CLICK_AGE_MS = BROADCAST_MS  # how far back a client may date a click: about one send interval plus one tick
 
-async def sendf(writer, obj):
-    try:
-        writer.write(_pack(obj))
-        await writer.drain()
-    except: pass
+class ClickerServer(GameRoom):
+    max_players = 5
 
-async def recvf(reader):
-    raw = await reader.readexactly(4)
-    n = struct.unpack('!I', raw)[0]
-    data = await reader.readexactly(n)
-    return json.loads(data.decode('utf-8'))
-
-class ClickerServer:
     def __init__(self, port, token, room_id):
-        self.port = port
-        self.token = token
-        self.room_id = room_id
-        self.players = {}
-        self.running = False
+        super().__init__(port, token, room_id)
+        self.flush_task = None
+        self._arrival = 0
+
+    async def on_join(self, conn):
+        pid = f"P{len(self.conns)}"
+        conn.data.update({
+            "name": pid, "score": 0, "pending": [],
+            "tokens": float(MAX_CPS), "refill_ts": time.monotonic(), "last_ts": 0.0
+        })
+        print(f"[{pid}] Connected from {conn.peer}")
         
-    async def broadcast(self, msg):
-        dead = []
-        for w in list(self.players.keys()):
-            try: await sendf(w, msg)
-            except: dead.append(w)
-        for w in dead: 
-            if w in self.players: del self.players[w]
+        await conn.send({"type": "WELCOME", "my_id": pid})
+        self.broadcast_scores()
+        if not self.flush_task:
+            self.flush_task = asyncio.create_task(self._flush_loop())
 
-    async def handle_client(self, reader, writer):
-        addr = writer.get_extra_info('peername')
-        try:
-            line = await reader.readline()
-            if not line: return
-            auth = json.loads(line.decode())
-            if auth.get("type") != "AUTH" or auth.get("token") != self.token:
-                writer.close()
+    def _take_tokens(self, conn, n, now):
+        d = conn.data
+        d["tokens"] = min(float(MAX_CPS), d["tokens"] + (now - d["refill_ts"]) * MAX_CPS)
+        d["refill_ts"] = now
+        ok = max(0, min(n, int(d["tokens"])))
+        d["tokens"] -= ok
+        return ok
+
+    async def on_message(self, conn, msg):
+        t = msg.get("type")
+        if t == "CLICKS":
+            try:
+                n = int(msg.get("n", 0))
+                ago = [int(a) for a in list(msg.get("ago_ms") or [])[:MAX_CPS]]
+            except (TypeError, ValueError):
                 return
-            
-            writer.write((json.dumps({"type": "AUTH", "status": "OK"}) + "\n").encode())
-            await writer.drain()
+            n = max(0, min(n, MAX_CPS))  # more than a full bucket could never be admitted
+        elif t == "CLICK":
+            n, ago = 1, [0]
+        else:
+            return
 
-            pid = f"P{len(self.players)+1}"
-            self.players[writer] = {"name": pid, "score": 0}
-            print(f"[{pid}] Connected from {addr}")
-            
-            await sendf(writer, {"type": "WELCOME", "my_id": pid})
+        now = time.monotonic()
+        ok = self._take_tokens(conn, n, now)
+        if ok < n:
+            print(f"[{conn.data['name']}] rate limited: {n - ok} clicks dropped")
+        ago = ago[:ok] + [0] * (ok - len(ago[:ok]))
+        # Server-clock time of each click, oldest first, never earlier than this
+        # player's previous batch, so a client cannot jump the queue.
+        times = sorted(now - min(max(a, 0), MAX_CLICK_AGE_MS) / 1000.0 for a in ago)
+        for ts in times:
+            ts = max(ts, conn.data["last_ts"])
+            conn.data["last_ts"] = ts
+            self._arrival += 1
+            conn.data["pending"].append((ts, self._arrival))
 
-            await self.broadcast_scores()
+    async def _flush_loop(self):
+        clock = TickClock(BROADCAST_MS)
+        clock.start()
+        while True:
+            await clock.wait()
+            self.flush()
 
-            while True:
-                msg = await recvf(reader)
-                t = msg.get("type")
-                if t == "CLICK":
-                    self.players[writer]["score"] += 1
-                    await self.broadcast_scores()
-                    
-                    if self.players[writer]["score"] >= 50:
-                        await self.broadcast({"type": "WINNER", "winner": self.players[writer]["name"]})
-                        for p in self.players.values(): p["score"] = 0
-                        await self.broadcast_scores()
+    def flush(self):
+        """
+        Apply all pending clicks in timestamp order and broadcast only the scores
+        that changed. The first click to reach WIN_SCORE wins, even when several
+        players cross it within the same batch.
+        """
+        events = []
+        for c in self.conns:
+            events.extend((ts, seq, c) for ts, seq in c.data["pending"])
+            c.data["pending"] = []
+        if not events: return
+        events.sort(key=lambda e: (e[0], e[1]))
 
-        except Exception as e:
-            print(f"Error {e}")
-        finally:
-            if writer in self.players: 
-                del self.players[writer]
-                await self.broadcast_scores()
-            
-            if len(self.players) == 0:
-                print("Last player left, closing server.")
-                os._exit(0)
+        changed = {}
+        for _, _, c in events:
+            c.data["score"] += 1
+            changed[c.data["name"]] = c.data["score"]
+            if c.data["score"] >= WIN_SCORE:
+                self.broadcast({"type": "WINNER", "winner": c.data["name"]})
+                for p in self.conns: p.data["score"] = 0
+                self.broadcast_scores()
+                return
+        self.broadcast({"type": "DELTA", "scores": changed})
 
-    async def broadcast_scores(self):
-        scores = {p["name"]: p["score"] for p in self.players.values()}
-        await self.broadcast({"type": "UPDATE", "scores": scores})
+    async def on_leave(self, conn):
+        self.broadcast_scores()
+        if len(self.conns) == 0:
+            print("Last player left, closing server.")
+            if self.flush_task: self.flush_task.cancel()
+            self.stop()
 
-    async def serve(self):
-        server = await asyncio.start_server(self.handle_client, "0.0.0.0", self.port)
-        print(f"Clicker Server on {self.port}")
-        async with server:
-            await server.serve_forever()
+    def broadcast_scores(self):
+        scores = {c.data["name"]: c.data["score"] for c in self.conns}
+        self.broadcast({"type": "UPDATE", "scores": scores})
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--port", type=int, required=True)
-    parser.add_argument("--token", required=True)
-    parser.add_argument("--room-id", required=True)
-    args = parser.parse_args()
+    args = parse_server_args()
     
     if sys.platform == 'win32':
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
@@ -1,4 +1,5 @@
 import asyncio
+import compileall
 import json
 import os
 import sys
@@ -13,6 +14,7 @@ from shared.consts import LOBBY_PORT, DEFAULT_LOBBY_HOST, DOWNLOADS_DIR
 # --- Globals ---
 USER = None
 DOWNLOADS_ROOT = Path(__file__).parent / DOWNLOADS_DIR
+CATALOG_FILE = DOWNLOADS_ROOT / "catalog.json"  # last store catalog: {"version", "games"}
 
 # --- Utils ---
 async def ainput(prompt: str) -> str:
@@ -39,6 +41,31 @@ def get_installed_games():
             if params[1]: games.append({"id": d.name, "version": params[1]})
     return games
 
+def load_catalog_cache():
+    try:
+        return json.loads(CATALOG_FILE.read_text(encoding="utf-8"))
+    except: return {}
+
+def save_catalog_cache(version, games):
+    try:
+        CATALOG_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp = CATALOG_FILE.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"version": version, "games": games}, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, CATALOG_FILE)
+    except OSError: pass
+
+async def fetch_catalog(reader, writer):
+    """The store catalog; only downloaded again when the server's version differs from the local copy."""
+    cache = load_catalog_cache()
+    await sendf(writer, {"type": "LIST_GAMES", "if_version": cache.get("version")})
+    resp = await recvf(reader)
+    if resp.get("status") == "NOT_MODIFIED":
+        return cache.get("games", [])
+    games = resp.get("games", [])
+    if resp.get("status") == "OK" and resp.get("version"):
+        save_catalog_cache(resp["version"], games)
+    return games
+
 # --- Sub Flows ---
 
 async def view_reviews(reader, writer, game_id):
@@ -78,6 +105,8 @@ async def waiting_room_loop(reader, writer, room_info, is_host):
         
         if status == "PLAYING":
             print("遊戲已開始！正在啟動客戶端...")
+            # The game server is only started with the game, possibly on another machine
+            room_info["host"], room_info["port"] = resp.get("server_host"), resp.get("port")
             await launch_game(room_info, DOWNLOADS_ROOT / USER / gid)
             break
             
@@ -114,6 +143,7 @@ async def launch_game(info, game_path):
         if not cmd_tmpl: raise ValueError("No run_cmd")
         
         cmd = list(cmd_tmpl)
+        if cmd[0] in ("python", "python3"): cmd[0] = sys.executable  # the interpreter the bytecode was built for
         cmd.extend([
             "--host", info["host"], 
             "--port", str(info["port"]), 
@@ -188,6 +218,8 @@ async def download_game(reader, writer, game_id):
     with zipfile.ZipFile(tmp_file, 'r') as zf:
         zf.extractall(target_dir)
     os.remove(tmp_file)
+    # Compile once here so the first launch does not have to
+    await asyncio.get_running_loop().run_in_executor(None, lambda: compileall.compile_dir(str(target_dir), quiet=1))
     print("\n安裝成功！")
     return True
 
@@ -200,9 +232,7 @@ async def store_menu(reader, writer):
         
         c = (await ainput("> ")).strip()
         if c == "1":
-            await sendf(writer, {"type": "LIST_GAMES"})
-            resp = await recvf(reader)
-            cached_games = resp.get("games", [])
+            cached_games = await fetch_catalog(reader, writer)
             
             print(f"\n{'No.':<4} {'ID':<15} {'名稱':<15} {'類型':<6} {'人數':<5} {'作者':<10} {'評分':<8}")
             print("-" * 85)
@@ -0,0 +1,987 @@
+"""
+Storage backends for db_server.
+
+A backend implements one method per collection/action of the DB protocol,
+named "<collection>_<action>" in lower case (e.g. users_player_auth). Each
+method takes the request's data dict and returns the response dict.
+
+    backend.open(loop)              load / connect, start the writer thread
+    backend.read(col, act, data)    READ_OPS, run directly on the event loop
+    await backend.write(col, act, data)
+                                    WRITE_OPS, resolved once the change is durable
+    await backend.batch(ops, stop_on_fail)
+                                    several ops applied with nothing in between,
+                                    acknowledged by one durable commit; an op
+                                    that raises undoes the whole batch
+
+JsonBackend keeps the whole store in memory and persists it to a
+memory-mapped snapshot file (db_snapshot) that is loaded lazily.
+SqliteBackend keeps it in indexed sqlite3 tables (WAL).
+
+When its transaction fails (commit error, or the file stays locked past
+busy_timeout), SqliteBackend has rolled the write back and answers
+NOT_DURABLE; it is safe to retry. JsonBackend cannot take back a change
+other requests may already have read or built on, so it answers
+{"ok": False, "reason": "DURABILITY_UNKNOWN", "applied": True, "result": r}:
+the change stays in effect and goes to disk with the next successful
+snapshot (or is lost if the server stops first). Do not simply retry
+such a write; re-read to see where things stand.
+"""
+import asyncio
+import copy
+import json
+import os
+import pathlib
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared import metrics, tracing
+import db_snapshot
+
+READ_OPS = {
+    ("Users_Dev", "auth"), ("Users_Dev", "get"),
+    ("Users_Player", "auth"), ("Users_Player", "get"),
+    ("Games", "list"), ("Games", "get"),
+    ("Reviews", "list"),
+}
+WRITE_OPS = {
+    ("Users_Dev", "register"),
+    ("Users_Player", "register"), ("Users_Player", "record_play"),
+    ("Games", "upload"), ("Games", "set_active"),
+    ("Reviews", "submit"),
+}
+
+M_APPLY = metrics.histogram("db_apply_seconds", "Time spent applying a write")
+M_DURABLE_WAIT = metrics.histogram("db_durable_wait_seconds", "Time a write waited for its batch to reach disk")
+M_BATCH = metrics.histogram("db_commit_batch_size", "Writes acknowledged per persisted batch",
+                            buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512))
+M_SAVE = metrics.histogram("db_atomic_save_seconds", "Persisting one batch (JSON: snapshot rewrite + fsync, SQLite: commit)")
+
+GAME_COLUMNS = ("name", "author", "description", "type", "min_players", "max_players")
+
+def op_method(col, act):
+    return f"{col}_{act}".lower()
+
+def empty_db():
+    return {
+        "users_dev": {},    # { username: {pwd, games: []} }
+        "users_player": {}, # { username: {pwd, status, play_history: []} }
+        "games": {},        # { game_id: { ... } }
+        "rooms": {},        # { room_id: { ... } }
+        "reviews": {},      # { review_id: { ... } }
+        "_counters": {
+            "room": 0,
+            "review": 0
+        }
+    }
+
+def _get(g, key, default):
+    v = g.get(key)
+    return default if v is None else v
+
+def game_summary(g):
+    """Games/list entry built from a full game record (missing or null fields get defaults)."""
+    return {
+        "id": g["id"],
+        "name": g["name"],
+        "author": _get(g, "author", "unknown"),
+        "latest_version": g["latest_version"],
+        "description": _get(g, "description", ""),
+        "rating_avg": _get(g, "average_rating", 0),
+        "rating_count": _get(g, "rating_count", 0),
+        "is_active": bool(_get(g, "is_active", True)),
+        "type": _get(g, "type", "Unknown"),
+        "min_players": _get(g, "min_players", 1),
+        "max_players": _get(g, "max_players", 2)
+    }
+
+def expect_ok(resp, expect):
+    """True if every dotted path in `expect` (e.g. "game.author") has the given value in resp."""
+    for path, want in expect.items():
+        v = resp
+        for part in path.split("."):
+            v = v.get(part) if isinstance(v, dict) else None
+        if v != want: return False
+    return True
+
+def run_ops(call, ops, stop_on_fail=True):
+    """
+    Run batch ops in order through call(col, act, data) and return their
+    results. An op may carry "expect" ({dotted path: value}) that its result
+    must match, otherwise the result is turned into EXPECT_FAILED. With
+    stop_on_fail, every op after the first failure is SKIPPED. A failed op
+    is a result, not an error: the ops before it stay applied. An op that
+    raises propagates out, and the backend then undoes the whole batch
+    (SQLite savepoint, JsonBackend undo journal).
+    """
+    results = []
+    failed = False
+    for op in ops:
+        if failed and stop_on_fail:
+            results.append({"ok": False, "reason": "SKIPPED"})
+            continue
+        col, act = op.get("collection"), op.get("action")
+        if (col, act) in READ_OPS or (col, act) in WRITE_OPS:
+            resp = call(col, act, op.get("data", {}))
+            if resp.get("ok") and op.get("expect") and not expect_ok(resp, op["expect"]):
+                resp = {**resp, "ok": False, "reason": "EXPECT_FAILED"}
+        else:
+            resp = {"ok": False, "reason": "UNKNOWN_CMD"}
+        failed = failed or not resp.get("ok")
+        # JsonBackend hands out live records: freeze each result as of its place in the batch
+        results.append(copy.deepcopy(resp))
+    return {"ok": not failed, "results": results}
+
+class Backend:
+    name = ""
+
+    def open(self, loop):
+        raise NotImplementedError
+
+    def read(self, col, act, data):
+        return getattr(self, op_method(col, act))(data)
+
+    async def write(self, col, act, data):
+        raise NotImplementedError
+
+    async def batch(self, ops, stop_on_fail=True):
+        raise NotImplementedError
+
+    def counts(self):
+        """{collection: number of records}, for the db_records gauge."""
+        raise NotImplementedError
+
+# --- JSON records in a snapshot file ---
+
+WARM_CHUNK = 2000  # records decoded per loop iteration during warm-up
+
+_ABSENT = object()  # journal value of a record that did not exist yet
+
+class JsonBackend(Backend):
+    """
+    Whole store in memory as dicts of JSON records, persisted to a snapshot
+    file (db_snapshot) that is memory-mapped on open: collections are
+    LazyCollections that decode a record the first time it is read, and a
+    background task warms everything up after the server is listening.
+
+    Writes are applied in memory on the loop; handlers touch() the records
+    they are about to change and write() then waits for the Persister to put
+    a snapshot containing them on disk (group commit). Inside a batch,
+    touch() also keeps each record's previous value, so a batch that raises
+    half-way is undone.
+    """
+    name = "json"
+
+    def __init__(self, path="db.snap"):
+        path = pathlib.Path(path)
+        # A pre-snapshot db.json next to it is imported on first start
+        self.legacy = path if path.suffix == ".json" else path.with_suffix(".json")
+        self.path = path.with_suffix(".snap") if path.suffix == ".json" else path
+        self.db = empty_db()
+        self.snap = None
+        self.persister = None  # without it (tools, benchmarks) writes stay in memory
+        self._review_index = (None, None)  # (db it was built from, ReviewIndex)
+        self.journal = None    # {(collection, key): value before this write, or _ABSENT} while applying
+        self.indexing = None   # executor future of warm_up() reading the snapshot off the loop
+
+    def open(self, loop):
+        self.load()
+        self.persister = Persister(self, loop)
+        loop.create_task(self.warm_up())
+
+    def close(self):
+        if self.snap is not None: self.snap.close()
+        self.snap = None
+
+    def load(self):
+        t0 = time.perf_counter()
+        if self.path.exists():
+            try:
+                self.map(db_snapshot.Snapshot(self.path))
+                print(f"[DB] Snapshot {self.path} mapped in {(time.perf_counter() - t0) * 1000:.1f}ms "
+                      f"({sum(self.counts().values())} records, loaded on demand).")
+                return
+            except Exception as e:
+                print(f"[DB] Error loading DB: {e}. Using empty DB.")
+                self.db = empty_db()
+                return
+        if self.legacy.exists():
+            try:
+                content = self.legacy.read_text(encoding="utf-8")
+                if content.strip():
+                    self.db = json.loads(content)
+                    for key, val in empty_db().items():
+                        if key not in self.db:
+                            self.db[key] = val
+                    print(f"[DB] Imported {self.legacy} in {time.perf_counter() - t0:.2f}s, writing {self.path}.")
+            except Exception as e:
+                print(f"[DB] Error loading DB: {e}. Using empty DB.")
+        else:
+            print(f"[DB] {self.path} not found, creating new.")
+        self.save()
+
+    def map(self, snap):
+        """Serve the collections of `snap` lazily."""
+        self.close()
+        self.snap = snap
+        self.db = {}
+        for name in snap.names():
+            self.db[name] = db_snapshot.LazyCollection(snap, name, self.db)
+        for key, val in empty_db().items():
+            if key not in self.db:
+                self.db[key] = val
+
+    async def warm_up(self):
+        """Decode every cold record, a chunk per loop iteration, then swap in plain dicts."""
+        t0 = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        total = 0
+        for name in list(self.db):
+            coll = self.db[name]
+            if not isinstance(coll, db_snapshot.LazyCollection): continue
+            # Parsing the key list and index of a big collection is one long call: keep it off the
+            # loop. The Persister holds back install() (which closes this snapshot) until it returns.
+            self.indexing = loop.run_in_executor(None, coll.index)
+            try: await self.indexing
+            finally: self.indexing = None
+            while coll.promoted is None and coll.remaining() > 0:
+                n = coll.remaining()
+                coll.warm(WARM_CHUNK)
+                total += min(n, WARM_CHUNK)
+                await asyncio.sleep(0)
+            coll.promote()
+        db, reviews, index = self.db, self.db["reviews"], ReviewIndex()
+        rids = list(reviews)
+        for start in range(0, len(rids), WARM_CHUNK):
+            for rid in rids[start:start + WARM_CHUNK]: index.add(rid, reviews[rid])
+            await asyncio.sleep(0)
+            # A submit in between built the index itself (reviews only change through it)
+            if self._review_index[0] is db: break
+        else:
+            if self.db is db: self._review_index = (db, index)
+        print(f"[DB] Warm-up done in {time.perf_counter() - t0:.2f}s ({total} records decoded).")
+
+    def install(self, tmp, tables, written):
+        """Replace the snapshot file with `tmp` (written by db_snapshot, which returned `tables`)."""
+        old = self.snap
+        # The map must be closed before the file can be replaced on Windows
+        if old is not None: old.close()
+        try:
+            os.replace(tmp, self.path)
+        except Exception:
+            if old is not None: self.remap(db_snapshot.Snapshot(self.path), {})
+            raise
+        self.remap(db_snapshot.Snapshot(self.path, tables), written)
+
+    def remap(self, snap, written):
+        """Point lazy collections at `snap`; `written` = {collection: changes rewrite() applied}."""
+        self.snap = snap
+        for name, coll in self.db.items():
+            if isinstance(coll, db_snapshot.LazyCollection):
+                coll.rebase(snap, written.get(name))
+
+    def save(self):
+        """
+        Write the whole DB to a new snapshot file and swap it in atomically
+        (write .tmp, fsync, rename). Returns True once the data is durable.
+        """
+        tmp_file = self.path.with_suffix(".tmp")
+        t0 = time.perf_counter()
+        try:
+            with tracing.span("atomic_save"):
+                tables = db_snapshot.write(tmp_file, db_snapshot.dump_all(self.db))
+                self.install(tmp_file, tables, {})
+            return True
+        except Exception as e:
+            print(f"[DB] Save failed: {e}")
+            return False
+        finally:
+            M_SAVE.observe(time.perf_counter() - t0)
+
+    async def write(self, col, act, data):
+        return await self.apply(lambda: getattr(self, op_method(col, act))(data))
+
+    async def batch(self, ops, stop_on_fail=True):
+        return await self.apply(lambda: self.atomic(lambda: run_ops(
+            lambda col, act, data: getattr(self, op_method(col, act))(data), ops, stop_on_fail)))
+
+    def atomic(self, fn):
+        """fn(), with every record it touched restored if it raises (single writes skip the journal's copies)."""
+        self.journal = {}
+        try:
+            return fn()
+        except BaseException:
+            for (col, key), old in reversed(list(self.journal.items())):
+                coll = self.db[col]
+                if old is not _ABSENT: coll[key] = old
+                elif key in coll: del coll[key]
+            self._review_index = (None, None)  # rebuilt on next use
+            raise
+        finally:
+            self.journal = None
+
+    async def apply(self, fn):
+        """Run fn() (synchronous handlers) and wait until whatever it touched is durable."""
+        p = self.persister
+        changes = p.changes if p else 0
+        t0 = time.perf_counter()
+        # Handlers are synchronous, so this is atomic on the loop without a lock
+        resp = fn()
+        t_apply = time.perf_counter()
+        M_APPLY.observe(t_apply - t0)
+        if p and p.changes != changes:
+            with tracing.span("durable"):
+                ok = await p.commit()
+            M_DURABLE_WAIT.observe(time.perf_counter() - t_apply)
+            if not ok:
+                # Applied and visible, just not on disk yet: see the module docstring
+                return {"ok": False, "reason": "DURABILITY_UNKNOWN", "applied": True, "result": resp}
+        return resp
+
+    def counts(self):
+        return {k: len(v) for k, v in self.db.items() if not k.startswith("_")}
+
+    def review_index(self):
+        db, index = self._review_index
+        if db is not self.db:
+            index = ReviewIndex(self.db["reviews"])
+            self._review_index = (self.db, index)
+        return index
+
+    def touch(self, col, key):
+        """Mark db[col][key] as about to change, before changing it, so it can be undone and gets persisted."""
+        if self.journal is not None and (col, key) not in self.journal:
+            coll = self.db[col]
+            self.journal[(col, key)] = copy.deepcopy(coll[key]) if key in coll else _ABSENT
+        if self.persister is not None: self.persister.touch(col, key)
+
+    def get_next_id(self, kind):
+        DB = self.db
+        self.touch("_counters", kind)
+        DB["_counters"].setdefault(kind, 0)
+        DB["_counters"][kind] += 1
+        return str(DB["_counters"][kind])
+
+    # --- Handlers ---
+
+    def users_dev_register(self, data):
+        DB = self.db
+        user = data.get("user")
+        pwd = data.get("password")
+        if user in DB["users_dev"]:
+            return {"ok": False, "reason": "ACCOUNT_EXISTS"}
+
+        self.touch("users_dev", user)
+        DB["users_dev"][user] = {
+            "password": pwd,
+            "games": [],
+            "created_at": self.get_next_id("timestamp")
+        }
+        return {"ok": True}
+
+    def users_dev_auth(self, data):
+        u = self.db["users_dev"].get(data.get("user"))
+        if not u:
+            return {"ok": False, "reason": "USER_NOT_FOUND"}
+        if u["password"] != data.get("password"):
+            return {"ok": False, "reason": "WRONG_PASSWORD"}
+        return {"ok": True}
+
+    def users_dev_get(self, data):
+        u = self.db["users_dev"].get(data.get("user"))
+        return {"ok": True, "data": u} if u else {"ok": False, "reason": "NOT_FOUND"}
+
+    def users_player_register(self, data):
+        DB = self.db
+        user = data.get("user")
+        pwd = data.get("password")
+        if user in DB["users_player"]:
+            return {"ok": False, "reason": "ACCOUNT_EXISTS"}
+
+        self.touch("users_player", user)
+        DB["users_player"][user] = {
+            "password": pwd,
+            "status": "Idle",
+            "play_history": [],
+            "created_at": self.get_next_id("timestamp")
+        }
+        return {"ok": True}
+
+    def users_player_auth(self, data):
+        u = self.db["users_player"].get(data.get("user"))
+        if not u:
+            return {"ok": False, "reason": "USER_NOT_FOUND"}
+        if u["password"] != data.get("password"):
+            return {"ok": False, "reason": "WRONG_PASSWORD"}
+        return {"ok": True, "play_history": u.get("play_history", [])}
+
+    def users_player_get(self, data):
+        u = self.db["users_player"].get(data.get("user"))
+        return {"ok": True, "data": u} if u else {"ok": False, "reason": "NOT_FOUND"}
+
+    def users_player_record_play(self, data):
+        user = data.get("user")
+        gid = data.get("game_id")
+        if user in self.db["users_player"]:
+            if gid not in self.db["users_player"][user].get("play_history", []):
+                self.touch("users_player", user)
+                self.db["users_player"][user].setdefault("play_history", []).append(gid)
+        return {"ok": True}
+
+    def games_upload(self, data):
+        DB = self.db
+        gid = data.get("game_id")
+        meta = data.get("metadata")
+        v_info = data.get("version_info")
+
+        self.touch("games", gid)
+        if gid not in DB["games"]:
+            DB["games"][gid] = {
+                "id": gid,
+                **meta,
+                "versions": [],
+                "reviews": [],
+                "rating_sum": 0,
+                "rating_count": 0,
+                "is_active": True
+            }
+        else:
+            for k, v in meta.items():
+                DB["games"][gid][k] = v
+
+            DB["games"][gid]["is_active"] = True
+
+        if v_info:
+            DB["games"][gid]["versions"].append(v_info)
+            DB["games"][gid]["latest_version"] = v_info["version"]
+
+        return {"ok": True}
+
+    def games_list(self, data):
+        include_inactive = data.get("include_inactive", False)
+        games = [game_summary(g) for g in self.db["games"].values()
+                 if include_inactive or g.get("is_active", True)]
+        return {"ok": True, "games": games}
+
+    def games_get(self, data):
+        g = self.db["games"].get(data.get("game_id"))
+        return {"ok": True, "game": g} if g else {"ok": False, "reason": "NOT_FOUND"}
+
+    def games_set_active(self, data):
+        gid = data.get("game_id")
+        if gid in self.db["games"]:
+            self.touch("games", gid)
+            self.db["games"][gid]["is_active"] = data.get("is_active")
+            return {"ok": True}
+        return {"ok": False, "reason": "NOT_FOUND"}
+
+    def reviews_submit(self, data):
+        # {game_id, user, rating, comment}
+        DB = self.db
+        gid = data.get("game_id")
+        user = data.get("user")
+        rating = int(data.get("rating"))
+        comment = data.get("comment")
+
+        u = DB["users_player"].get(user)
+        if not u or gid not in u.get("play_history", []):
+            return {"ok": False, "reason": "MUST_PLAY_FIRST"}
+
+        index = self.review_index()
+        rid = index.by_pair.get((gid, user))
+        if rid is not None:
+            self.touch("reviews", rid)
+            self.touch("games", gid)
+            r = DB["reviews"][rid]
+            old_rating = r["rating"]
+            r["rating"] = rating
+            r["comment"] = comment
+            r["timestamp"] = 0
+
+            g = DB["games"].get(gid)
+            if g:
+                g["rating_sum"] = g.get("rating_sum", 0) - old_rating + rating
+                if g["rating_count"] > 0:
+                    g["average_rating"] = g["rating_sum"] / g["rating_count"]
+
+            return {"ok": True}
+
+        rid = self.get_next_id("review")
+        self.touch("reviews", rid)
+        self.touch("games", gid)
+        DB["reviews"][rid] = {
+            "id": rid,
+            "game_id": gid,
+            "user": user,
+            "rating": rating,
+            "comment": comment,
+            "timestamp": 0
+        }
+        index.add(rid, DB["reviews"][rid])
+
+        g = DB["games"].get(gid)
+        if g:
+            g["rating_sum"] = g.get("rating_sum", 0) + rating
+            g["rating_count"] = g.get("rating_count", 0) + 1
+            g["average_rating"] = g["rating_sum"] / g["rating_count"]
+
+        return {"ok": True}
+
+    def reviews_list(self, data):
+        reviews = self.db["reviews"]
+        return {"ok": True, "reviews": [reviews[rid] for rid in self.review_index().by_game.get(data.get("game_id"), ())]}
+
+class ReviewIndex:
+    """
+    Reviews by game and by (game, user), so submit and list do not scan every
+    review. Only reviews_submit adds reviews and it keeps this in step.
+    """
+    def __init__(self, reviews=None):
+        self.by_game = {}  # game_id -> [review_id] in insertion order
+        self.by_pair = {}  # (game_id, user) -> review_id (the first, as the old scan found)
+        for rid, r in (reviews or {}).items(): self.add(rid, r)
+
+    def add(self, rid, r):
+        gid = r["game_id"]
+        self.by_game.setdefault(gid, []).append(rid)
+        self.by_pair.setdefault((gid, r["user"]), rid)
+
+class Persister:
+    """
+    Group commit on a background thread for JsonBackend. commit() returns a
+    future that resolves (True/False) once a snapshot containing every
+    change touched so far is on disk.
+
+    `frozen` holds the changes that are not on disk yet, already encoded
+    ({collection: {key: record bytes, or None if deleted}}). It is only
+    updated on the loop while the thread is idle, so the thread reads it
+    without locking; it rewrites the current snapshot with those changes
+    (every other record is copied as raw bytes) and the loop swaps the new
+    file in. Each batch costs the loop one json.dumps per changed record.
+    """
+    def __init__(self, backend, loop):
+        self.backend = backend
+        self.loop = loop
+        self.frozen = {}
+        self.dirty = {}      # (collection, key) changed since the last snapshot, in first-touch order
+        self.changes = 0
+        self.waiters = []    # futures of writes waiting for the next snapshot
+        self.busy = False
+        self.jobs = queue.SimpleQueue()
+        threading.Thread(target=self._run, name="db-persister", daemon=True).start()
+
+    def touch(self, col, key):
+        self.dirty[(col, key)] = None
+        self.changes += 1
+
+    def commit(self):
+        fut = self.loop.create_future()
+        self.waiters.append(fut)
+        if len(self.waiters) == 1 and not self.busy:
+            # Let every request already ready in this loop iteration join the batch
+            self.loop.call_soon(self._flush)
+        return fut
+
+    def _flush(self):
+        if self.busy or not self.waiters: return
+        batch, self.waiters = self.waiters, []
+        db = self.backend.db
+        for col, key in self.dirty:
+            src = db.get(col, {})
+            self.frozen.setdefault(col, {})[key] = db_snapshot.encode(src[key]) if key in src else None
+        self.dirty.clear()
+        self.busy = True
+        self.jobs.put(batch)
+
+    def _run(self):
+        tmp = self.backend.path.with_suffix(".tmp")
+        while True:
+            batch = self.jobs.get()
+            t0 = time.perf_counter()
+            try:
+                tables = db_snapshot.rewrite(tmp, self.backend.snap, self.frozen)
+            except Exception as e:
+                print(f"[DB] Save failed: {e}")
+                tables = None
+            M_SAVE.observe(time.perf_counter() - t0)
+            self.loop.call_soon_threadsafe(self._done, batch, tmp, tables)
+
+    def _done(self, batch, tmp, tables):
+        indexing = self.backend.indexing
+        if indexing is not None and not indexing.done():
+            indexing.add_done_callback(lambda _: self._done(batch, tmp, tables))
+            return
+        ok = tables is not None
+        if ok:
+            try:
+                self.backend.install(tmp, tables, self.frozen)
+                self.frozen = {}
+            except Exception as e:
+                print(f"[DB] Save failed: {e}")
+                ok = False
+        self.busy = False
+        M_BATCH.observe(len(batch))
+        for fut in batch:
+            if not fut.done(): fut.set_result(ok)
+        if self.waiters: self._flush()
+
+# --- SQLite ---
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users_dev (
+    name TEXT PRIMARY KEY, password TEXT, games TEXT NOT NULL DEFAULT '[]', created_at TEXT
+);
+CREATE TABLE IF NOT EXISTS users_player (
+    name TEXT PRIMARY KEY, password TEXT, status TEXT, created_at TEXT
+);
+CREATE TABLE IF NOT EXISTS play_history (
+    seq INTEGER PRIMARY KEY, user TEXT NOT NULL, game_id TEXT, UNIQUE (user, game_id)
+);
+CREATE TABLE IF NOT EXISTS games (
+    id TEXT PRIMARY KEY, name TEXT, author TEXT, description TEXT, type TEXT,
+    min_players INTEGER, max_players INTEGER, latest_version TEXT,
+    rating_sum INTEGER NOT NULL DEFAULT 0, rating_count INTEGER NOT NULL DEFAULT 0,
+    average_rating REAL, is_active INTEGER NOT NULL DEFAULT 1, extra TEXT
+);
+CREATE TABLE IF NOT EXISTS game_versions (
+    seq INTEGER PRIMARY KEY, game_id TEXT NOT NULL, version TEXT, file_path TEXT,
+    uploaded_at INTEGER, extra TEXT
+);
+CREATE INDEX IF NOT EXISTS game_versions_game ON game_versions (game_id);
+CREATE TABLE IF NOT EXISTS reviews (
+    id INTEGER PRIMARY KEY, game_id TEXT, user TEXT, rating INTEGER, comment TEXT, timestamp INTEGER
+);
+CREATE UNIQUE INDEX IF NOT EXISTS reviews_game_user ON reviews (game_id, user);
+CREATE TABLE IF NOT EXISTS counters (kind TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+def _json_or_none(d):
+    return json.dumps(d, ensure_ascii=False) if d else None
+
+class SqliteBackend(Backend):
+    """
+    Store in sqlite3 tables (WAL mode). Reads use a connection on the loop
+    thread; writes are queued to one writer thread, which applies everything
+    queued so far in a single transaction (one savepoint per write) and
+    resolves each write once that transaction has committed.
+    """
+    name = "sqlite"
+
+    def __init__(self, path="db.sqlite3"):
+        self.path = str(path)
+        self.conn = None
+        self.loop = None
+        self.jobs = queue.SimpleQueue()
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    def open(self, loop=None):
+        self.conn = self.connect()
+        self.conn.executescript(SCHEMA)
+        print(f"[DB] SQLite store {self.path} opened.")
+        if loop is not None:
+            self.loop = loop
+            threading.Thread(target=self._writer, name="db-sqlite-writer", daemon=True).start()
+
+    def close(self):
+        if self.conn: self.conn.close()
+
+    def read(self, col, act, data):
+        return getattr(self, op_method(col, act))(self.conn, data)
+
+    async def write(self, col, act, data):
+        return await self.submit(getattr(self, op_method(col, act)), data)
+
+    async def batch(self, ops, stop_on_fail=True):
+        if all((op.get("collection"), op.get("action")) in READ_OPS for op in ops):
+            # Read-only: one read transaction on the loop's connection, so all ops see one snapshot
+            self.conn.execute("BEGIN")
+            try:
+                return run_ops(self.read, ops, stop_on_fail)
+            finally:
+                self.conn.execute("COMMIT")
+        # One job for the writer thread: a single savepoint, so an exception undoes the whole batch
+        return await self.submit(lambda c, data: run_ops(
+            lambda col, act, d: getattr(self, op_method(col, act))(c, d), ops, stop_on_fail), None)
+
+    async def submit(self, fn, data):
+        """Queue fn(conn, data) for the writer thread; resolves once its transaction committed."""
+        fut = self.loop.create_future()
+        t0 = time.perf_counter()
+        self.jobs.put((fut, fn, data))
+        with tracing.span("durable"):
+            resp = await fut
+        M_DURABLE_WAIT.observe(time.perf_counter() - t0)
+        return resp
+
+    def _writer(self):
+        conn = self.connect()
+        while True:
+            batch = [self.jobs.get()]
+            while True:
+                try: batch.append(self.jobs.get_nowait())
+                except queue.Empty: break
+            results = []
+            t0 = time.perf_counter()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for fut, fn, data in batch:
+                    conn.execute("SAVEPOINT op")
+                    try:
+                        results.append((fn(conn, data), None))
+                        conn.execute("RELEASE op")
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO op")
+                        conn.execute("RELEASE op")
+                        results.append((None, e))
+                t_apply = time.perf_counter()
+                M_APPLY.observe(t_apply - t0)
+                conn.execute("COMMIT")
+                ok = True
+                M_SAVE.observe(time.perf_counter() - t_apply)
+            except Exception as e:
+                # BUSY past busy_timeout, disk errors, ...: nothing of the batch is kept
+                print(f"[DB] Write batch failed: {e}")
+                try:
+                    if conn.in_transaction: conn.execute("ROLLBACK")
+                except Exception as e2:
+                    print(f"[DB] Rollback failed: {e2}")
+                results, ok = [(None, None)] * len(batch), False
+            self.loop.call_soon_threadsafe(self._done, batch, results, ok)
+
+    def _done(self, batch, results, ok):
+        M_BATCH.observe(len(batch))
+        for (fut, _, _), (resp, exc) in zip(batch, results):
+            if fut.done(): continue
+            if exc is not None: fut.set_exception(exc)
+            elif not ok: fut.set_result({"ok": False, "reason": "NOT_DURABLE"})
+            else: fut.set_result(resp)
+
+    def counts(self):
+        c = self.conn
+        return {t: c.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+                for t in ("users_dev", "users_player", "games", "reviews")}
+
+    def get_next_id(self, c, kind):
+        c.execute("INSERT INTO counters (kind, value) VALUES (?, 1) "
+                  "ON CONFLICT (kind) DO UPDATE SET value = value + 1", (kind,))
+        return str(c.execute("SELECT value FROM counters WHERE kind = ?", (kind,)).fetchone()[0])
+
+    def play_history(self, c, user):
+        return [r[0] for r in c.execute("SELECT game_id FROM play_history WHERE user = ? ORDER BY seq", (user,))]
+
+    def game_record(self, c, row):
+        """Full game dict in the same shape JsonBackend stores."""
+        g = {"id": row["id"]}
+        for k in GAME_COLUMNS:
+            g[k] = row[k]
+        if row["extra"]: g.update(json.loads(row["extra"]))
+        versions = []
+        for v in c.execute("SELECT version, file_path, uploaded_at, extra FROM game_versions "
+                           "WHERE game_id = ? ORDER BY seq", (row["id"],)):
+            vd = {"version": v["version"], "file_path": v["file_path"], "uploaded_at": v["uploaded_at"]}
+            if v["extra"]: vd.update(json.loads(v["extra"]))
+            versions.append(vd)
+        g.update({
+            "versions": versions, "reviews": [],
+            "rating_sum": row["rating_sum"], "rating_count": row["rating_count"],
+            "is_active": bool(row["is_active"]),
+        })
+        if row["latest_version"] is not None: g["latest_version"] = row["latest_version"]
+        if row["average_rating"] is not None: g["average_rating"] = row["average_rating"]
+        return g
+
+    # --- Handlers (c is the connection to use) ---
+
+    def users_dev_register(self, c, data):
+        user = data.get("user")
+        if c.execute("SELECT 1 FROM users_dev WHERE name = ?", (user,)).fetchone():
+            return {"ok": False, "reason": "ACCOUNT_EXISTS"}
+        c.execute("INSERT INTO users_dev (name, password, created_at) VALUES (?, ?, ?)",
+                  (user, data.get("password"), self.get_next_id(c, "timestamp")))
+        return {"ok": True}
+
+    def users_dev_auth(self, c, data):
+        u = c.execute("SELECT password FROM users_dev WHERE name = ?", (data.get("user"),)).fetchone()
+        if not u:
+            return {"ok": False, "reason": "USER_NOT_FOUND"}
+        if u["password"] != data.get("password"):
+            return {"ok": False, "reason": "WRONG_PASSWORD"}
+        return {"ok": True}
+
+    def users_dev_get(self, c, data):
+        u = c.execute("SELECT * FROM users_dev WHERE name = ?", (data.get("user"),)).fetchone()
+        if not u:
+            return {"ok": False, "reason": "NOT_FOUND"}
+        return {"ok": True, "data": {"password": u["password"], "games": json.loads(u["games"]), "created_at": u["created_at"]}}
+
+    def users_player_register(self, c, data):
+        user = data.get("user")
+        if c.execute("SELECT 1 FROM users_player WHERE name = ?", (user,)).fetchone():
+            return {"ok": False, "reason": "ACCOUNT_EXISTS"}
+        c.execute("INSERT INTO users_player (name, password, status, created_at) VALUES (?, ?, 'Idle', ?)",
+                  (user, data.get("password"), self.get_next_id(c, "timestamp")))
+        return {"ok": True}
+
+    def users_player_auth(self, c, data):
+        user = data.get("user")
+        u = c.execute("SELECT password FROM users_player WHERE name = ?", (user,)).fetchone()
+        if not u:
+            return {"ok": False, "reason": "USER_NOT_FOUND"}
+        if u["password"] != data.get("password"):
+            return {"ok": False, "reason": "WRONG_PASSWORD"}
+        return {"ok": True, "play_history": self.play_history(c, user)}
+
+    def users_player_get(self, c, data):
+        user = data.get("user")
+        u = c.execute("SELECT * FROM users_player WHERE name = ?", (user,)).fetchone()
+        if not u:
+            return {"ok": False, "reason": "NOT_FOUND"}
+        return {"ok": True, "data": {"password": u["password"], "status": u["status"],
+                                     "play_history": self.play_history(c, user), "created_at": u["created_at"]}}
+
+    def users_player_record_play(self, c, data):
+        user = data.get("user")
+        if c.execute("SELECT 1 FROM users_player WHERE name = ?", (user,)).fetchone():
+            c.execute("INSERT OR IGNORE INTO play_history (user, game_id) VALUES (?, ?)", (user, data.get("game_id")))
+        return {"ok": True}
+
+    def games_upload(self, c, data):
+        gid = data.get("game_id")
+        meta = data.get("metadata")
+        v_info = data.get("version_info")
+        cols = {k: v for k, v in meta.items() if k in GAME_COLUMNS}
+        extra = {k: v for k, v in meta.items() if k not in GAME_COLUMNS and k != "id"}
+
+        row = c.execute("SELECT extra FROM games WHERE id = ?", (gid,)).fetchone()
+        if row is None:
+            names = ["id", *cols, "extra"]
+            c.execute(f"INSERT INTO games ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+                      (gid, *cols.values(), _json_or_none(extra)))
+        else:
+            if row["extra"]: extra = {**json.loads(row["extra"]), **extra}
+            sets = "".join(f"{k} = ?, " for k in cols)
+            c.execute(f"UPDATE games SET {sets}extra = ?, is_active = 1 WHERE id = ?",
+                      (*cols.values(), _json_or_none(extra), gid))
+
+        if v_info:
+            v_extra = {k: v for k, v in v_info.items() if k not in ("version", "file_path", "uploaded_at")}
+            c.execute("INSERT INTO game_versions (game_id, version, file_path, uploaded_at, extra) VALUES (?, ?, ?, ?, ?)",
+                      (gid, v_info["version"], v_info.get("file_path"), v_info.get("uploaded_at"), _json_or_none(v_extra)))
+            c.execute("UPDATE games SET latest_version = ? WHERE id = ?", (v_info["version"], gid))
+        return {"ok": True}
+
+    def games_list(self, c, data):
+        sql = ("SELECT id, name, author, latest_version, description, average_rating, rating_count, is_active, "
+               "type, min_players, max_players FROM games")
+        if not data.get("include_inactive", False): sql += " WHERE is_active"
+        cur = c.cursor()
+        cur.row_factory = None  # plain tuples: this is the one query that returns a row per game
+        games = []
+        for gid, name, author, latest, desc, avg, count, active, gtype, min_p, max_p in cur.execute(sql):
+            games.append({
+                "id": gid,
+                "name": name,
+                "author": "unknown" if author is None else author,
+                "latest_version": latest,
+                "description": "" if desc is None else desc,
+                "rating_avg": avg or 0,
+                "rating_count": count,
+                "is_active": bool(active),
+                "type": "Unknown" if gtype is None else gtype,
+                "min_players": 1 if min_p is None else min_p,
+                "max_players": 2 if max_p is None else max_p
+            })
+        return {"ok": True, "games": games}
+
+    def games_get(self, c, data):
+        row = c.execute("SELECT * FROM games WHERE id = ?", (data.get("game_id"),)).fetchone()
+        return {"ok": True, "game": self.game_record(c, row)} if row else {"ok": False, "reason": "NOT_FOUND"}
+
+    def games_set_active(self, c, data):
+        cur = c.execute("UPDATE games SET is_active = ? WHERE id = ?", (1 if data.get("is_active") else 0, data.get("game_id")))
+        return {"ok": True} if cur.rowcount else {"ok": False, "reason": "NOT_FOUND"}
+
+    def reviews_submit(self, c, data):
+        gid = data.get("game_id")
+        user = data.get("user")
+        rating = int(data.get("rating"))
+        comment = data.get("comment")
+
+        if not c.execute("SELECT 1 FROM play_history WHERE user = ? AND game_id = ?", (user, gid)).fetchone():
+            return {"ok": False, "reason": "MUST_PLAY_FIRST"}
+
+        old = c.execute("SELECT id, rating FROM reviews WHERE game_id = ? AND user = ?", (gid, user)).fetchone()
+        if old:
+            c.execute("UPDATE reviews SET rating = ?, comment = ?, timestamp = 0 WHERE id = ?", (rating, comment, old["id"]))
+            c.execute("UPDATE games SET rating_sum = rating_sum - ? + ?, "
+                      "average_rating = CASE WHEN rating_count > 0 THEN CAST(rating_sum - ? + ? AS REAL) / rating_count END "
+                      "WHERE id = ?", (old["rating"], rating, old["rating"], rating, gid))
+            return {"ok": True}
+
+        rid = self.get_next_id(c, "review")
+        c.execute("INSERT INTO reviews (id, game_id, user, rating, comment, timestamp) VALUES (?, ?, ?, ?, ?, 0)",
+                  (int(rid), gid, user, rating, comment))
+        c.execute("UPDATE games SET rating_sum = rating_sum + ?, rating_count = rating_count + 1, "
+                  "average_rating = CAST(rating_sum + ? AS REAL) / (rating_count + 1) WHERE id = ?", (rating, rating, gid))
+        return {"ok": True}
+
+    def reviews_list(self, c, data):
+        rows = c.execute("SELECT * FROM reviews WHERE game_id = ? ORDER BY id", (data.get("game_id"),))
+        return {"ok": True, "reviews": [
+            {"id": str(r["id"]), "game_id": r["game_id"], "user": r["user"], "rating": r["rating"],
+             "comment": r["comment"], "timestamp": r["timestamp"]} for r in rows]}
+
+    # --- Migration ---
+
+    def import_json(self, db):
+        """Bulk-load a db.json dict into empty tables (one transaction)."""
+        c = self.conn
+        c.execute("BEGIN")
+        try:
+            c.executemany("INSERT INTO users_dev (name, password, games, created_at) VALUES (?, ?, ?, ?)",
+                          ((n, u.get("password"), json.dumps(u.get("games", [])), u.get("created_at"))
+                           for n, u in db.get("users_dev", {}).items()))
+            c.executemany("INSERT INTO users_player (name, password, status, created_at) VALUES (?, ?, ?, ?)",
+                          ((n, u.get("password"), u.get("status", "Idle"), u.get("created_at"))
+                           for n, u in db.get("users_player", {}).items()))
+            c.executemany("INSERT OR IGNORE INTO play_history (user, game_id) VALUES (?, ?)",
+                          ((n, gid) for n, u in db.get("users_player", {}).items() for gid in u.get("play_history", [])))
+            for gid, g in db.get("games", {}).items():
+                skip = set(GAME_COLUMNS) | {"id", "versions", "reviews", "rating_sum", "rating_count",
+                                            "average_rating", "is_active", "latest_version"}
+                extra = {k: v for k, v in g.items() if k not in skip}
+                c.execute("INSERT INTO games (id, name, author, description, type, min_players, max_players, latest_version, "
+                          "rating_sum, rating_count, average_rating, is_active, extra) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                          (gid, *(g.get(k) for k in GAME_COLUMNS), g.get("latest_version"),
+                           g.get("rating_sum", 0), g.get("rating_count", 0), g.get("average_rating"),
+                           1 if g.get("is_active", True) else 0, _json_or_none(extra)))
+                for v in g.get("versions", []):
+                    v_extra = {k: x for k, x in v.items() if k not in ("version", "file_path", "uploaded_at")}
+                    c.execute("INSERT INTO game_versions (game_id, version, file_path, uploaded_at, extra) VALUES (?, ?, ?, ?, ?)",
+                              (gid, v.get("version"), v.get("file_path"), v.get("uploaded_at"), _json_or_none(v_extra)))
+            # db_server never stores two reviews for one (game, user); keep the first if a file does
+            c.executemany("INSERT OR IGNORE INTO reviews (id, game_id, user, rating, comment, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+                          ((int(r.get("id", rid)), r.get("game_id"), r.get("user"), r.get("rating"), r.get("comment"),
+                            r.get("timestamp", 0)) for rid, r in db.get("reviews", {}).items()))
+            c.executemany("INSERT INTO counters (kind, value) VALUES (?, ?)",
+                          ((k, int(v)) for k, v in db.get("_counters", {}).items()))
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+        # Move the bulk load out of the WAL into the main file
+        c.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+BACKENDS = {"json": JsonBackend, "sqlite": SqliteBackend}
@@ -0,0 +1,183 @@
+"""
+Change feed of db_server, for components that cache DB data.
+
+A client sends {"collection": "Feed", "action": "subscribe", "data": {"since": seq, "epoch": epoch}}
+on its own connection and keeps it open. The server answers
+
+    {"ok": True, "epoch": e, "seq": n, "resumed": bool}
+
+and then streams one frame per event:
+
+    {"seq": 42, "type": "game_uploaded",    "game_id": g, "version": v}
+    {"seq": 43, "type": "game_status",      "game_id": g, "is_active": b}
+    {"seq": 44, "type": "review_submitted", "game_id": g, "user": u}
+    {"seq": 44, "type": "heartbeat"}        (when idle; seq = last event)
+
+Sequence numbers increase by one per event within an epoch; the epoch
+changes whenever db_server restarts. If the epoch matches and the
+events after `since` are still in the backlog they are replayed first
+("resumed": true). Otherwise the subscriber has missed changes and must
+drop everything it cached. Events are published once the write is
+durable (or applied with DURABILITY_UNKNOWN, since readers see it either
+way), so a re-read after an event sees the change.
+
+    python server/db_feed.py          # print events as they happen
+"""
+import asyncio
+import os
+import sys
+import uuid
+from collections import deque
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.protocol import sendf, recvf
+from shared.consts import DB_PORT, DEFAULT_DB_HOST
+from shared import metrics
+
+FEED_BACKLOG = 10000    # events kept for resume
+FEED_QUEUE = 1000       # unsent events per subscriber before it is dropped
+FEED_HEARTBEAT = 5.0    # seconds
+
+M_EVENTS = metrics.counter("db_feed_events_total", "Change events published", ("type",))
+M_SUBS = metrics.gauge("db_feed_subscribers", "Connected change-feed subscribers")
+M_DROPPED = metrics.counter("db_feed_dropped_total", "Subscribers disconnected for falling behind")
+
+def applied(resp):
+    """The handler's own response of a write that took effect, even if it is not durable yet."""
+    return resp["result"] if resp.get("applied") else resp
+
+def events_for(col, act, data, resp):
+    """The change events of one successful write."""
+    resp = applied(resp)
+    if not resp.get("ok"): return []
+    gid = data.get("game_id")
+    if (col, act) == ("Games", "upload"):
+        return [{"type": "game_uploaded", "game_id": gid, "version": (data.get("version_info") or {}).get("version")}]
+    if (col, act) == ("Games", "set_active"):
+        return [{"type": "game_status", "game_id": gid, "is_active": bool(data.get("is_active"))}]
+    if (col, act) == ("Reviews", "submit"):
+        return [{"type": "review_submitted", "game_id": gid, "user": data.get("user")}]
+    return []
+
+class _Sub:
+    def __init__(self):
+        self.pending = deque()
+        self.wake = asyncio.Event()
+        self.lagged = False
+
+class ChangeFeed:
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:12]
+        self.seq = 0
+        self.backlog = deque(maxlen=FEED_BACKLOG)
+        self.subs = set()
+        M_SUBS.set_function(lambda: len(self.subs))
+
+    def publish(self, events):
+        for ev in events:
+            self.seq += 1
+            ev = {"seq": self.seq, **ev}
+            self.backlog.append(ev)
+            M_EVENTS.inc(ev["type"])
+            for s in list(self.subs):
+                s.pending.append(ev)
+                if len(s.pending) > FEED_QUEUE:
+                    # Cut it loose; it can resume from the backlog on reconnect
+                    s.lagged = True
+                    self.subs.discard(s)
+                    M_DROPPED.inc()
+                s.wake.set()
+
+    def publish_write(self, col, act, data, resp):
+        self.publish(events_for(col, act, data, resp))
+
+    def publish_batch(self, ops, resp):
+        for op, r in zip(ops, applied(resp).get("results", [])):
+            self.publish(events_for(op.get("collection"), op.get("action"), op.get("data", {}), r))
+
+    def can_resume(self, since, epoch):
+        if epoch != self.epoch or not isinstance(since, int) or since > self.seq: return False
+        oldest = self.backlog[0]["seq"] if self.backlog else self.seq + 1
+        return since >= oldest - 1
+
+    async def serve(self, writer, data):
+        """Stream events to one subscriber until it disconnects or falls behind."""
+        since, epoch = data.get("since"), data.get("epoch")
+        resumed = self.can_resume(since, epoch)
+        s = _Sub()
+        # Registering and taking the replay happen without an await in between,
+        # so every event is either replayed or queued, never both or neither
+        if resumed: s.pending.extend(ev for ev in self.backlog if ev["seq"] > since)
+        self.subs.add(s)
+        try:
+            await sendf(writer, {"ok": True, "epoch": self.epoch, "seq": self.seq, "resumed": resumed})
+            while not s.lagged:
+                while s.pending:
+                    await sendf(writer, s.pending.popleft())
+                s.wake.clear()
+                try:
+                    await asyncio.wait_for(s.wake.wait(), FEED_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    await sendf(writer, {"seq": self.seq, "type": "heartbeat"})
+            print(f"[DB] Feed subscriber {writer.get_extra_info('peername')} fell behind, disconnecting")
+        finally:
+            self.subs.discard(s)
+
+class FeedClient:
+    """
+    Follows the change feed: on_event(ev) for every event, on_reset() when
+    changes may have been missed (first connect, db_server restart, backlog
+    overrun). `live` is True only while connected and following, so callers
+    can stop trusting their caches while it is False.
+    """
+    def __init__(self, on_event, on_reset, host=DEFAULT_DB_HOST, port=DB_PORT, tag="Feed"):
+        self.on_event = on_event
+        self.on_reset = on_reset
+        self.host, self.port = host, port
+        self.tag = tag
+        self.epoch = None
+        self.seq = None
+        self.live = False
+
+    async def run(self):
+        delay = 0.5
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+            except OSError:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 5.0)
+                continue
+            try:
+                await sendf(writer, {"collection": "Feed", "action": "subscribe",
+                                     "data": {"since": self.seq, "epoch": self.epoch}})
+                hello = await asyncio.wait_for(recvf(reader), FEED_HEARTBEAT * 3)
+                if not hello.get("ok"): raise ConnectionError(hello.get("reason"))
+                if not hello.get("resumed"):
+                    self.on_reset()
+                    self.seq = hello["seq"]
+                self.epoch = hello["epoch"]
+                self.live = True
+                delay = 0.5
+                print(f"[{self.tag}] Following DB changes from seq {self.seq} ({'resumed' if hello.get('resumed') else 'fresh'})")
+                while True:
+                    ev = await asyncio.wait_for(recvf(reader), FEED_HEARTBEAT * 3)
+                    if ev.get("type") == "heartbeat": continue
+                    self.seq = ev["seq"]
+                    self.on_event(ev)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[{self.tag}] Change feed lost ({type(e).__name__}), reconnecting")
+            finally:
+                self.live = False
+                writer.close()
+            await asyncio.sleep(delay)
+
+if __name__ == "__main__":
+    client = FeedClient(print, lambda: print("-- reset: anything cached may be stale --"))
+    try:
+        asyncio.run(client.run())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,344 @@
+"""
+Record-addressable snapshot file for JsonBackend, read through mmap.
+
+Layout:
+    b"GSSNAP1\\n" | dir_offset (u64) | dir_length (u64)
+    records       one compact UTF-8 JSON value + b"\\n" per record, collection by collection
+    per collection: its keys (one JSON value + b"\\n" each) and the record
+                  lengths (little-endian int64 each)
+    directory     JSON {"collections": {name: {"count", "start", "keys": [off, len], "lengths": [off, len]}}}
+
+Opening a snapshot only reads the directory. A collection's key list is
+parsed the first time the collection is touched, and a record is decoded
+the first time its key is read (LazyCollection). Rewriting copies the raw
+bytes of unchanged records, keys and lengths in whole runs, so its Python
+work is proportional to the number of changed records.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import MutableMapping
+from itertools import accumulate
+
+MAGIC = b"GSSNAP1\n"
+HEADER = struct.Struct("<8sQQ")
+WRITE_BUFFER = 1 << 20
+COPY_CHUNK = 16 << 20
+
+def encode(value):
+    # Compact JSON never contains a raw newline, so b"\n" can end every record
+    return json.dumps(value, ensure_ascii=False).encode("utf-8") + b"\n"
+
+def decode_lines(buf):
+    """A run of encode()d values as a list, decoded with one json.loads."""
+    if not buf: return []
+    return json.loads(b"[" + buf[:-1].replace(b"\n", b",") + b"]")
+
+def _int64s(raw):
+    a = array("q")
+    a.frombytes(raw)
+    if sys.byteorder != "little": a.byteswap()
+    return a
+
+def _le(a):
+    if sys.byteorder == "little": return a.tobytes()
+    a = array("q", a)
+    a.byteswap()
+    return a.tobytes()
+
+class Table:
+    """One collection of a snapshot: keys, record lengths and offsets, key positions."""
+    def __init__(self, keys, lengths, start, key_block=None, positions=None):
+        self.keys = keys
+        self.lengths = lengths
+        self.offsets = array("q", accumulate(lengths, initial=start))
+        self.key_block = key_block  # the encoded keys as stored, reused while they do not change
+        self._positions = positions
+
+    def positions(self):
+        """{key: index}; only the persister thread uses (and extends) it."""
+        if self._positions is None:
+            self._positions = {k: i for i, k in enumerate(self.keys)}
+        return self._positions
+
+def empty_table():
+    return Table([], array("q"), 0, b"")
+
+class Snapshot:
+    def __init__(self, path, tables=None):
+        self.path = str(path)
+        self.f = open(self.path, "rb")
+        self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, off, length = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path}: not a snapshot file")
+        self.dir = json.loads(self.mm[off:off + length])["collections"]
+        self._tables = dict(tables or {})  # name -> Table
+
+    def names(self):
+        return list(self.dir)
+
+    def count(self, name):
+        return self.dir[name]["count"] if name in self.dir else 0
+
+    def table(self, name):
+        t = self._tables.get(name)
+        if t is None:
+            d = self.dir.get(name)
+            if d is None: return empty_table()
+            ko, kl = d["keys"]
+            lo, ll = d["lengths"]
+            kb = self.mm[ko:ko + kl]
+            t = self._tables[name] = Table(decode_lines(kb), _int64s(self.mm[lo:lo + ll]), d["start"], kb)
+        return t
+
+    def raw(self, offsets, i):
+        return self.mm[offsets[i]:offsets[i + 1]]
+
+    def close(self):
+        try: self.mm.close()
+        except Exception: pass
+        self.f.close()
+
+class _Writer:
+    def __init__(self, path):
+        self.f = open(path, "wb", buffering=WRITE_BUFFER)
+        self.f.write(HEADER.pack(MAGIC, 0, 0))
+        self.pos = HEADER.size
+        self.directory = {}
+        self.tables = {}
+
+    def put(self, data):
+        self.f.write(data)
+        self.pos += len(data)
+
+    def copy(self, mm, start, stop):
+        for a in range(start, stop, COPY_CHUNK):
+            self.put(mm[a:min(a + COPY_CHUNK, stop)])
+
+    def end_collection(self, name, start, keys, lengths, key_block, positions=None):
+        lb = _le(lengths)
+        self.directory[name] = {"count": len(keys), "start": start, "keys": [self.pos, len(key_block)],
+                                "lengths": [self.pos + len(key_block), len(lb)]}
+        self.tables[name] = Table(keys, lengths, start, key_block, positions)
+        self.put(key_block)
+        self.put(lb)
+
+    def finish(self):
+        db = json.dumps({"collections": self.directory}).encode("utf-8")
+        f = self.f
+        f.write(db)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, self.pos, len(db)))
+        f.flush()
+        os.fsync(f.fileno())
+        f.close()
+        return self.tables
+
+def write(path, collections):
+    """
+    collections: iterable of (name, iterable of (key, encode()d record)).
+    Writes and fsyncs `path`, returns {name: Table} of what was written.
+    """
+    w = _Writer(path)
+    try:
+        for name, items in collections:
+            start = w.pos
+            keys, lengths = [], array("q")
+            for key, data in items:
+                w.put(data)
+                keys.append(key)
+                lengths.append(len(data))
+            w.end_collection(name, start, keys, lengths, b"".join(encode(k) for k in keys))
+        return w.finish()
+    finally:
+        w.f.close()
+
+def rewrite(path, base, changes):
+    """
+    Write `base` with `changes` ({name: {key: encode()d record, or None to
+    delete}}) applied. Runs of unchanged records are copied from the map as
+    one slice and changed keys keep their position; new keys go at the end of
+    their collection in the order of `changes`. Returns write()'s tables.
+    """
+    w = _Writer(path)
+    grown = []  # (positions, appended keys) to extend once the file is complete
+    try:
+        names = base.names() if base is not None else []
+        names += [n for n in changes if n not in names]
+        for name in names:
+            over = changes.get(name) or {}
+            t = base.table(name) if base is not None and name in base.dir else empty_table()
+            keys, lengths, offs = t.keys, t.lengths, t.offsets
+            start = w.pos
+            if not over and keys:
+                w.copy(base.mm, offs[0], offs[-1])
+                w.end_collection(name, start, keys, lengths, t.key_block, t._positions)
+                continue
+            pos = t.positions()
+            changed = sorted(pos[k] for k in over if k in pos)
+            new_keys, new_lengths = [], array("q")
+            deleted = False
+            prev = 0
+            for i in changed + [len(keys)]:
+                if i > prev:
+                    w.copy(base.mm, offs[prev], offs[i])
+                    new_keys += keys[prev:i]
+                    new_lengths += lengths[prev:i]
+                if i < len(keys):
+                    data = over[keys[i]]
+                    if data is None:
+                        deleted = True
+                    else:
+                        w.put(data)
+                        new_keys.append(keys[i])
+                        new_lengths.append(len(data))
+                prev = i + 1
+            appended = [k for k, data in over.items() if k not in pos and data is not None]
+            for k in appended:
+                data = over[k]
+                w.put(data)
+                new_keys.append(k)
+                new_lengths.append(len(data))
+            if deleted:
+                kb, positions = b"".join(encode(k) for k in new_keys), None
+            else:
+                kb = t.key_block + b"".join(encode(k) for k in appended)
+                positions = pos
+                if appended: grown.append((pos, appended, len(keys)))
+            w.end_collection(name, start, new_keys, new_lengths, kb, positions)
+        tables = w.finish()
+    finally:
+        w.f.close()
+    for pos, appended, n in grown:
+        for i, k in enumerate(appended, n): pos[k] = i
+    return tables
+
+def dump_all(db):
+    """write() input for a whole in-memory DB dict."""
+    return ((name, ((k, encode(v)) for k, v in coll.items())) for name, coll in db.items())
+
+class LazyCollection(MutableMapping):
+    """
+    A collection backed by a Snapshot: records are decoded on first access
+    and kept in `data`. warm() walks the snapshot in order, building the
+    plain dict that promote() finally installs under owner[name]; after
+    that this object only forwards to it.
+    """
+    def __init__(self, snap, name, owner):
+        self.snap = snap
+        self.name = name
+        self.owner = owner
+        self.data = {}        # decoded or newly written records
+        self.new = {}         # keys written that the snapshot does not have (ordered)
+        self.deleted = set()
+        self.building = {}    # snapshot records [0, built) in order, for promote()
+        self.built = 0
+        self.promoted = None
+        self._index = None
+
+    def index(self):
+        if self._index is None:
+            self._index = {k: i for i, k in enumerate(self.snap.table(self.name).keys)}
+        return self._index
+
+    def _load(self, key):
+        i = self.index().get(key)
+        if i is None or key in self.deleted: raise KeyError(key)
+        v = self.data[key] = json.loads(self.snap.raw(self.snap.table(self.name).offsets, i))
+        return v
+
+    def __getitem__(self, key):
+        if self.promoted is not None: return self.promoted[key]
+        try: return self.data[key]
+        except KeyError: return self._load(key)
+
+    def get(self, key, default=None):
+        try: return self[key]
+        except KeyError: return default
+
+    def __contains__(self, key):
+        if self.promoted is not None: return key in self.promoted
+        if key in self.data: return True
+        return key not in self.deleted and key in self.index()
+
+    def __setitem__(self, key, value):
+        if self.promoted is not None:
+            self.promoted[key] = value
+            return
+        if key not in self.index(): self.new[key] = None
+        elif key in self.building: self.building[key] = value
+        self.deleted.discard(key)
+        self.data[key] = value
+
+    def __delitem__(self, key):
+        if self.promoted is not None:
+            del self.promoted[key]
+            return
+        if key not in self: raise KeyError(key)
+        self.data.pop(key, None)
+        self.new.pop(key, None)
+        if key in self.index():
+            self.deleted.add(key)
+            # A later re-insert would lose its place in the partial build; start over
+            self.building, self.built = {}, 0
+
+    def __len__(self):
+        if self.promoted is not None: return len(self.promoted)
+        return self.snap.count(self.name) - len(self.deleted) + len(self.new)
+
+    def __iter__(self):
+        return iter(self.promote())
+
+    def keys(self): return self.promote().keys()
+    def values(self): return self.promote().values()
+    def items(self): return self.promote().items()
+
+    def remaining(self):
+        return self.snap.count(self.name) - self.built if self.promoted is None else 0
+
+    def warm(self, n):
+        """Decode (if needed) and add the next n snapshot records to the build."""
+        t = self.snap.table(self.name)
+        keys, offs = t.keys, t.offsets
+        data, building, deleted = self.data, self.building, self.deleted
+        start = self.built
+        stop = min(start + n, len(keys))
+        values = decode_lines(self.snap.mm[offs[start]:offs[stop]])
+        for k, v in zip(keys[start:stop], values):
+            if k in deleted: continue
+            building[k] = data.setdefault(k, v)
+        self.built = stop
+
+    def promote(self):
+        """Decode everything and replace this collection with a plain dict."""
+        if self.promoted is None:
+            self.warm(self.remaining())
+            d = self.building
+            for k in self.new: d[k] = self.data[k]
+            self.promoted = d
+            self.owner[self.name] = d
+            self.data = self.new = self.building = self._index = None
+        return self.promoted
+
+    def rebase(self, snap, written):
+        """Point at a rewritten snapshot; `written` are the changes rewrite() applied here."""
+        self.snap = snap
+        if self.promoted is not None or not written: return
+        if any(v is None for v in written.values()):
+            # Deletions renumber the records: rebuild the index and the build
+            self._index = None
+            self.building, self.built = {}, 0
+        elif self._index is not None:
+            idx = self._index
+            for k in written:
+                if k not in idx: idx[k] = len(idx)
+        for k, v in written.items():
+            if v is not None: self.new.pop(k, None)
+            else:
+                self.deleted.discard(k)
+                if k in self.data: self.new[k] = None  # re-added since
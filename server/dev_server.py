@@ -3,24 +3,50 @@ import json
 import os
 import sys
 import shutil
+import signal
+import time
 from pathlib import Path
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from shared.protocol import sendf, recvf
-from shared.consts import DEV_PORT, DB_PORT, DEFAULT_DB_HOST, STORAGE_DIR
+from shared.consts import DEV_PORT, DB_PORT, DEFAULT_DB_HOST, STORAGE_DIR, DEV_ADMIN_PORT, ADMIN_HOST
+from shared import metrics, tracing, profiler, watchdog
+import game_runtime
+from db_feed import applied
+
+DEV_CMDS = {"LOGIN", "REGISTER", "UPLOAD_INIT", "LIST_MY_GAMES", "OFFSHELF", "LIST_REVIEWS"}
+M_REQS = metrics.counter("dev_requests_total", "Dev server requests by type and status", ("type", "status"))
+M_LATENCY = metrics.histogram("dev_request_seconds", "Dev server request handling time", ("type",))
+M_UPLOAD_BYTES = metrics.counter("dev_upload_bytes_total", "Raw game archive bytes received")
+M_STARTUP = metrics.histogram("dev_game_startup_seconds", "Spawn-to-listening time of uploaded game servers",
+                              buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+STARTUP_PROBE = os.environ.get("DEV_STARTUP_PROBE", "0") == "1"  # start each upload once, after replying
 
 async def db_call(payload):
+    name = "batch" if "batch" in payload else f"{payload.get('collection')}.{payload.get('action')}"
+    with tracing.span(f"db {name}") as sp:
+        try:
+            reader, writer = await asyncio.open_connection(DEFAULT_DB_HOST, DB_PORT)
+            await sendf(writer, tracing.inject(payload))
+            resp = await recvf(reader)
+            writer.close()
+            await writer.wait_closed()
+            return resp
+        except Exception as e:
+            print(f"[DevServer] DB Error: {e}")
+            sp.set(error=type(e).__name__)
+            return {"ok": False, "reason": "DB_ERROR"}
+
+async def probe_upload(game_id, version, path, cfg):
+    """Time one start of an uploaded game server for dev_game_startup_seconds; never holds up the upload."""
     try:
-        reader, writer = await asyncio.open_connection(DEFAULT_DB_HOST, DB_PORT)
-        await sendf(writer, payload)
-        resp = await recvf(reader)
-        writer.close()
-        await writer.wait_closed()
-        return resp
+        startup_ms = await game_runtime.probe_startup(path, cfg)
     except Exception as e:
-        print(f"[DevServer] DB Error: {e}")
-        return {"ok": False, "reason": "DB_ERROR"}
+        print(f"[DevServer] {game_id} {version}: startup probe failed: {e}")
+        return
+    if startup_ms is not None: M_STARTUP.observe(startup_ms / 1000)
+    print(f"[DevServer] {game_id} {version}: server listening after {startup_ms} ms")
 
 async def handle_client(reader, writer):
     user = None
@@ -32,7 +58,9 @@ async def handle_client(reader, writer):
             req = await recvf(reader)
             if not req: break
             
+            t0 = time.perf_counter()
             cmd = req.get("type")
+            root = tracing.begin(cmd, user=user)
             resp = {"type": cmd, "status": "FAIL", "reason": "UNKNOWN"}
 
             if cmd == "LOGIN":
@@ -67,18 +95,28 @@ async def handle_client(reader, writer):
                     await sendf(writer, {"type": cmd, "status": "READY_TO_RECV", "game_id": game_id})
                     
                     read_bytes = 0
-                    with open(target_file, "wb") as f:
+                    with tracing.span("recv_upload", size=file_size), open(target_file, "wb") as f:
                         while read_bytes < file_size:
                             chunk_size = min(64*1024, file_size - read_bytes)
                             chunk = await reader.readexactly(chunk_size)
                             f.write(chunk)
                             read_bytes += len(chunk)
+                    M_UPLOAD_BYTES.inc(amount=read_bytes)
                     
                     import zipfile
                     try:
-                        with zipfile.ZipFile(target_file, 'r') as zip_ref:
+                        with tracing.span("extract"), zipfile.ZipFile(target_file, 'r') as zip_ref:
                             zip_ref.extractall(svr_path)
-                            
+
+                        # Bytecode for the interpreter the lobby launches games with
+                        with tracing.span("precompile"):
+                            compiled = await asyncio.get_running_loop().run_in_executor(None, game_runtime.precompile, svr_path)
+                        print(f"[DevServer] {game_id} {version}: bytecode {'ok' if compiled else 'FAILED'}")
+                        if STARTUP_PROBE:
+                            cfg_path = svr_path / "game_config.json"
+                            cfg = json.loads(cfg_path.read_text(encoding="utf-8")) if cfg_path.exists() else {}
+                            asyncio.create_task(probe_upload(game_id, version, svr_path, cfg))
+
                         db_payload = {
                             "collection": "Games",
                             "action": "upload",
@@ -95,7 +133,8 @@ async def handle_client(reader, writer):
                                 "version_info": {
                                     "version": version,
                                     "file_path": str(target_file),
-                                    "uploaded_at": 0 # TODO ts
+                                    "uploaded_at": 0, # TODO ts
+                                    "bytecode": sys.implementation.cache_tag if compiled else None
                                 }
                             }
                         }
@@ -118,9 +157,18 @@ async def handle_client(reader, writer):
                 
             elif cmd == "OFFSHELF":
                 gid = req.get("game_id")
-                # TODO: verify ownership
-                await db_call({"collection": "Games", "action": "set_active", "data": {"game_id": gid, "is_active": False}})
-                resp = {"type": cmd, "status": "OK"}
+                # Ownership check and take-down commit together
+                res = applied(await db_call({"batch": [
+                    {"collection": "Games", "action": "get", "data": {"game_id": gid}, "expect": {"game.author": user}},
+                    {"collection": "Games", "action": "set_active", "data": {"game_id": gid, "is_active": False}},
+                ]}))
+                first = (res.get("results") or [res])[0]
+                if res.get("ok"):
+                    resp = {"type": cmd, "status": "OK"}
+                elif first.get("reason") == "EXPECT_FAILED":
+                    resp = {"type": cmd, "status": "FAIL", "reason": "NOT_OWNER"}
+                else:
+                    resp = {"type": cmd, "status": "FAIL", "reason": "GAME_NOT_FOUND"}
             
             elif cmd == "LIST_REVIEWS":
                 gid = req.get("game_id")
@@ -128,6 +176,10 @@ async def handle_client(reader, writer):
                 resp = {"type": cmd, "status": "OK", "reviews": res.get("reviews", [])}
 
             await sendf(writer, resp)
+            c = cmd if cmd in DEV_CMDS else "unknown"
+            M_LATENCY.observe(time.perf_counter() - t0, c)
+            M_REQS.inc(c, resp.get("status") or "NONE")
+            tracing.end(root, status=resp.get("status"))
             
     except Exception as e:
         print(f"[DevServer] Error: {e}")
@@ -136,6 +188,16 @@ async def handle_client(reader, writer):
         await writer.wait_closed()
 
 async def main():
+    # SIGTERM unwinds like Ctrl-C does, so running startup probes are stopped with the server
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    except (NotImplementedError, AttributeError):  # Windows
+        pass
+    tracing.configure("dev")
+    profiler.install("dev")
+    watchdog.install("dev")
+    await metrics.start_admin_server(DEV_ADMIN_PORT, ADMIN_HOST)
+    print(f"[DevServer] Metrics on http://{ADMIN_HOST}:{DEV_ADMIN_PORT}/metrics")
     server = await asyncio.start_server(handle_client, "0.0.0.0", DEV_PORT)
     print(f"[DevServer] Listening on 0.0.0.0:{DEV_PORT}")
     async with server:
@@ -144,5 +206,5 @@ async def main():
 if __name__ == "__main__":
     try:
         asyncio.run(main())
-    except KeyboardInterrupt:
+    except (KeyboardInterrupt, asyncio.CancelledError):
         pass
@@ -0,0 +1,388 @@
+"""
+Game host agents: run game servers for the lobby on other machines (or on
+other ports of this one), so match capacity is not limited to the lobby's box.
+
+    python server/game_host.py --name h1 --advertise 10.0.0.5 --capacity 8
+    python server/game_host.py --name h2      # a second agent on the same machine
+
+An agent connects to the lobby's normal port and sends
+
+    {"type": "HOST_REGISTER", "name": n, "address": a, "capacity": c, "secret": s}
+
+The connection then belongs to the agent. The lobby sends
+
+    {"id": 7, "cmd": "SPAWN", "room_id": r, "game_id": g, "version": v, "token": t}
+    {"cmd": "KILL", "room_id": r}
+
+SPAWN is answered once the game server listens (or failed to):
+
+    {"id": 7, "ok": true, "port": p, "pid": pid, "startup": seconds}
+    {"id": 7, "ok": false, "reason": "NOT_LISTENING", "detail": "..."}
+
+and the agent reports
+
+    {"type": "HOST_LOAD", "rooms": n, "load": l}     every HOST_REPORT seconds
+    {"type": "ROOM_VIOLATION", "room_id": r, "limit": k, "detail": d}
+    {"type": "ROOM_EXITED", "room_id": r, "returncode": c, "violation": k or null}
+
+Games missing from the agent's --storage are fetched from the lobby
+(DOWNLOAD_GAME of that exact version), unpacked and precompiled before
+their first room. Game servers run under the same limits as the lobby's
+own (game_runtime). When the lobby connection drops the agent stops its
+game servers, whose rooms the lobby has closed, and registers again.
+
+The lobby accepts an agent only when GAME_HOST_SECRET is set on both ends
+and matches; without it agents are refused. GAME_HOST_ALLOW_LOOPBACK=1 on
+the lobby also admits agents from loopback without the secret (local testing
+only: any local process could then register and send players elsewhere).
+"""
+import argparse
+import asyncio
+import hmac
+import io
+import json
+import os
+import shutil
+import signal
+import socket
+import sys
+import zipfile
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.protocol import sendf, recvf
+from shared.consts import LOBBY_PORT, DEFAULT_LOBBY_HOST
+import game_runtime
+
+HOST_REPORT = 2.0        # seconds between load reports
+SPAWN_TIMEOUT = 60.0     # artifact fetch + startup, as seen by the lobby
+HOST_LOST = -1           # returncode of game servers whose agent disconnected
+GAME_HOST_SECRET = os.environ.get("GAME_HOST_SECRET", "")
+GAME_HOST_ALLOW_LOOPBACK = os.environ.get("GAME_HOST_ALLOW_LOOPBACK", "0") == "1"
+
+class SpawnError(Exception):
+    def __init__(self, reason, detail=""):
+        super().__init__(f"{reason} {detail}".strip())
+        self.reason = reason
+        self.detail = detail
+
+# --- Lobby side ---
+
+class RemoteProc:
+    """Stands in for the asyncio Process of a game server running on an agent."""
+    def __init__(self, host, room_id, port, pid):
+        self.host, self.room_id, self.port, self.pid = host, room_id, port, pid
+        self.returncode = None
+        self.violation = None  # limit that killed it, per game_runtime.exit_violation on the agent
+        self.exited = asyncio.Event()
+
+    def terminate(self):
+        if self.returncode is None: self.host.kill(self.room_id)
+
+    kill = terminate
+
+    def exit(self, returncode):
+        if self.returncode is None:
+            self.returncode = returncode
+            self.exited.set()
+
+    async def wait(self):
+        await self.exited.wait()
+        return self.returncode
+
+class GameHost:
+    """The lobby's end of one registered agent."""
+    def __init__(self, reader, writer, hello):
+        self.reader, self.writer = reader, writer
+        self.name = str(hello.get("name"))
+        self.address = hello.get("address") or writer.get_extra_info("peername")[0]
+        self.capacity = max(1, int(hello.get("capacity") or 1))
+        self.load = 0.0
+        self.procs = {}      # room_id -> RemoteProc
+        self.pending = {}    # request id -> (room_id, Future of the agent's answer)
+        self.next_id = 0
+        self.spawning = 0
+        self.closed = False
+
+    def active(self):
+        return len(self.procs) + self.spawning
+
+    def score(self):
+        return (self.active() / self.capacity, self.load)
+
+    def send(self, msg):
+        if self.closed: return
+        asyncio.create_task(sendf(self.writer, msg)).add_done_callback(self._sent)
+
+    def _sent(self, task):
+        if task.cancelled() or task.exception() is None: return
+        print(f"[Lobby] Could not reach game host {self.name}: {task.exception()!r}")
+        # serve() then sees the connection end and counts the agent's game servers as exited
+        self.writer.close()
+
+    def kill(self, room_id):
+        self.send({"cmd": "KILL", "room_id": room_id})
+
+    async def spawn(self, room_id, game_id, version, token):
+        """Start a game server on the agent. Returns (RemoteProc, seconds to listening); raises SpawnError."""
+        if self.closed: raise SpawnError("HOST_LOST")
+        self.next_id += 1
+        rid = self.next_id
+        fut = asyncio.get_running_loop().create_future()
+        self.pending[rid] = (room_id, fut)
+        self.spawning += 1
+        try:
+            await sendf(self.writer, {"id": rid, "cmd": "SPAWN", "room_id": room_id,
+                                      "game_id": game_id, "version": version, "token": token})
+            resp, proc = await asyncio.wait_for(fut, SPAWN_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.kill(room_id)  # in case it comes up after all
+            raise SpawnError("TIMEOUT")
+        except ConnectionError:
+            raise SpawnError("HOST_LOST")
+        finally:
+            self.pending.pop(rid, None)
+            self.spawning -= 1
+        if not resp.get("ok"): raise SpawnError(resp.get("reason", "ERROR"), resp.get("detail", ""))
+        return proc, resp.get("startup") or 0.0
+
+    async def serve(self, on_violation):
+        """Follow the agent's messages until it disconnects; its game servers count as exited then."""
+        try:
+            while True:
+                msg = await recvf(self.reader)
+                if not isinstance(msg, dict): break
+                kind = msg.get("type")
+                if "id" in msg:
+                    room_id, fut = self.pending.get(msg["id"], (None, None))
+                    if fut is None or fut.done(): continue
+                    proc = None
+                    if msg.get("ok"):
+                        # Registered before reading on, so a ROOM_EXITED right behind the answer finds it
+                        proc = self.procs[room_id] = RemoteProc(self, room_id, msg["port"], msg.get("pid"))
+                    fut.set_result((msg, proc))
+                elif kind == "HOST_LOAD":
+                    self.load = float(msg.get("load") or 0.0)
+                elif kind == "ROOM_EXITED":
+                    proc = self.procs.pop(msg.get("room_id"), None)
+                    if proc:
+                        proc.violation = msg.get("violation")
+                        proc.exit(msg.get("returncode"))
+                elif kind == "ROOM_VIOLATION":
+                    on_violation(msg.get("room_id"), msg.get("limit"), msg.get("detail", ""))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.closed = True
+            for _, fut in self.pending.values():
+                if not fut.done(): fut.set_exception(ConnectionError("game host disconnected"))
+            for proc in self.procs.values(): proc.exit(HOST_LOST)
+            self.procs.clear()
+
+def pick_host(hosts):
+    """The least loaded agent with a free slot, or None."""
+    free = [h for h in hosts if not h.closed and h.active() < h.capacity]
+    return min(free, key=GameHost.score, default=None)
+
+def authorized(peer, secret):
+    if (GAME_HOST_SECRET and isinstance(secret, str)
+            and hmac.compare_digest(secret.encode(), GAME_HOST_SECRET.encode())): return True
+    return GAME_HOST_ALLOW_LOOPBACK and peer in ("127.0.0.1", "::1")
+
+# --- Agent side ---
+
+def _install(data, path):
+    """Unpack a game zip into path (atomically) and precompile it; runs in an executor."""
+    tmp = path.with_name(path.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        zf.extractall(tmp)
+    game_runtime.precompile(tmp)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+
+class HostAgent:
+    def __init__(self, name, address, capacity, storage, log_dir, lobby_host=DEFAULT_LOBBY_HOST,
+                 lobby_port=LOBBY_PORT, reserved_cpu=None):
+        self.name, self.address, self.capacity = name, address, capacity
+        self.storage, self.log_dir = Path(storage), Path(log_dir)
+        self.lobby_host, self.lobby_port = lobby_host, lobby_port
+        self.cpus = game_runtime.CpuPlacer(reserved=reserved_cpu)
+        self.rooms = {}      # room_id -> Process
+        self.fetches = {}    # (game_id, version) -> Task of fetch()
+        self.writer = None
+
+    async def send(self, msg):
+        if self.writer is None: return
+        try:
+            await sendf(self.writer, msg)
+        except ConnectionError:
+            pass
+
+    async def fetch(self, game_id, version):
+        path = self.storage / game_id / version
+        if (path / "game_config.json").exists(): return path
+        print(f"[Host {self.name}] Fetching {game_id} {version} from the lobby")
+        reader, writer = await asyncio.open_connection(self.lobby_host, self.lobby_port)
+        try:
+            await sendf(writer, {"type": "DOWNLOAD_GAME", "game_id": game_id, "version": version})
+            resp = await recvf(reader)
+            if resp.get("status") != "OK": raise SpawnError("FETCH_FAILED", resp.get("reason", ""))
+            data = await reader.readexactly(resp["size"])
+        finally:
+            writer.close()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        await asyncio.get_running_loop().run_in_executor(None, _install, data, path)
+        return path
+
+    async def ensure_game(self, game_id, version):
+        """Local copy of the game, fetched once however many rooms ask for it at the same time."""
+        key = (game_id, version)
+        task = self.fetches.get(key)
+        if task is None:
+            task = self.fetches[key] = asyncio.create_task(self.fetch(game_id, version))
+            task.add_done_callback(lambda t: self.fetches.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def spawn(self, msg, replied):
+        rid = msg["room_id"]
+        cpu = None
+        try:
+            path = await self.ensure_game(msg["game_id"], msg["version"])
+            cfg = json.loads((path / "game_config.json").read_text(encoding="utf-8"))
+            cmd = game_runtime.resolve_cmd(cfg.get("server_cmd") or [])
+            if not cmd: raise SpawnError("NO_SERVER_CMD")
+            port = game_runtime.free_port()
+            limits = game_runtime.resource_limits(cfg)
+            cpu = self.cpus.acquire()
+            proc = await asyncio.create_subprocess_exec(
+                *cmd, "--port", str(port), "--token", msg["token"], "--room-id", str(rid),
+                cwd=str(path), stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+                preexec_fn=game_runtime.preexec(limits, None if cpu is None else {cpu}))
+        except SpawnError as e:
+            self.cpus.release(cpu)
+            return {"ok": False, "reason": e.reason, "detail": e.detail}
+        except Exception as e:
+            self.cpus.release(cpu)
+            return {"ok": False, "reason": "ERROR", "detail": f"{type(e).__name__}: {e}"}
+
+        print(f"[Host {self.name}] Room {rid}: {msg['game_id']} {msg['version']} on port {port}, cpu {cpu}")
+        log = game_runtime.OutputLog(self.log_dir / f"{rid}.log",
+                                     header=f"room {rid}: {msg['game_id']} {msg['version']}, pid {proc.pid}, "
+                                            f"limits {limits}, cpu {cpu}",
+                                     watch=lambda line: self.check_output(rid, line))
+        asyncio.create_task(game_runtime.drain(proc.stdout, log))
+        self.rooms[rid] = proc
+        asyncio.create_task(self.monitor(rid, proc, cpu, limits, replied))
+        up = await game_runtime.wait_listening(port, proc)
+        if up is None:
+            if proc.returncode is None: proc.kill()
+            return {"ok": False, "reason": "NOT_LISTENING", "detail": f"exit {proc.returncode}"}
+        return {"ok": True, "port": port, "pid": proc.pid, "startup": up}
+
+    def check_output(self, rid, line):
+        kind = game_runtime.violation_in(line)
+        if kind: asyncio.create_task(self.send({"type": "ROOM_VIOLATION", "room_id": rid, "limit": kind,
+                                                "detail": line.strip()}))
+
+    async def monitor(self, rid, proc, cpu, limits, replied):
+        usage = {}
+        sampler = asyncio.create_task(game_runtime.sample_cpu(proc, usage))
+        await proc.wait()
+        sampler.cancel()
+        self.cpus.release(cpu)
+        if self.rooms.get(rid) is proc: del self.rooms[rid]
+        await replied.wait()
+        print(f"[Host {self.name}] Room {rid} game server exited with {proc.returncode}")
+        await self.send({"type": "ROOM_EXITED", "room_id": rid, "returncode": proc.returncode,
+                         "violation": game_runtime.exit_violation(proc.returncode, limits, usage.get("cpu"))})
+
+    async def handle_spawn(self, msg):
+        replied = asyncio.Event()  # ROOM_EXITED must not overtake the answer to SPAWN
+        try:
+            resp = await self.spawn(msg, replied)
+            await self.send({"id": msg.get("id"), **resp})
+        finally:
+            replied.set()
+
+    def load(self):
+        if not hasattr(os, "getloadavg"): return 0.0
+        return round(os.getloadavg()[0] / (os.cpu_count() or 1), 3)
+
+    async def report(self):
+        while True:
+            await self.send({"type": "HOST_LOAD", "rooms": len(self.rooms), "load": self.load()})
+            await asyncio.sleep(HOST_REPORT)
+
+    def stop_rooms(self):
+        for proc in self.rooms.values():
+            if proc.returncode is None:
+                try: proc.terminate()
+                except ProcessLookupError: pass
+
+    async def run(self):
+        delay = 0.5
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(self.lobby_host, self.lobby_port)
+            except OSError:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 5.0)
+                continue
+            reporter = None
+            try:
+                await sendf(writer, {"type": "HOST_REGISTER", "name": self.name, "address": self.address,
+                                     "capacity": self.capacity, "secret": GAME_HOST_SECRET})
+                resp = await recvf(reader)
+                if resp.get("status") != "OK": raise ConnectionError(resp.get("reason"))
+                print(f"[Host {self.name}] Registered with lobby {self.lobby_host}:{self.lobby_port} "
+                      f"as {self.address}, capacity {self.capacity}")
+                self.writer = writer
+                delay = 0.5
+                reporter = asyncio.create_task(self.report())
+                while True:
+                    msg = await recvf(reader)
+                    if msg.get("cmd") == "SPAWN":
+                        asyncio.create_task(self.handle_spawn(msg))
+                    elif msg.get("cmd") == "KILL":
+                        proc = self.rooms.get(msg.get("room_id"))
+                        if proc and proc.returncode is None: proc.terminate()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[Host {self.name}] Lobby connection lost ({type(e).__name__}: {e}), reconnecting")
+            finally:
+                self.writer = None
+                if reporter: reporter.cancel()
+                writer.close()
+                self.stop_rooms()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 5.0)
+
+async def main(agent):
+    # SIGTERM unwinds run() like Ctrl-C does, so the game servers are stopped with the agent
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    except (NotImplementedError, AttributeError):  # Windows
+        pass
+    await agent.run()
+
+if __name__ == "__main__":
+    here = Path(__file__).parent
+    parser = argparse.ArgumentParser(description="Game host agent for the lobby")
+    parser.add_argument("--name", default=f"{socket.gethostname()}-{os.getpid()}")
+    parser.add_argument("--advertise", default="127.0.0.1", help="address players reach this machine's game servers at")
+    parser.add_argument("--capacity", type=int, default=os.cpu_count() or 1, help="rooms at a time")
+    parser.add_argument("--lobby-host", default=DEFAULT_LOBBY_HOST)
+    parser.add_argument("--lobby-port", type=int, default=LOBBY_PORT)
+    parser.add_argument("--storage", help="where fetched games go (default server/host_storage/<name>)")
+    parser.add_argument("--reserve-cpu", type=int, help="core to keep game servers off (e.g. the lobby's)")
+    args = parser.parse_args()
+    agent = HostAgent(args.name, args.advertise, args.capacity,
+                      args.storage or here / "host_storage" / args.name, here / "logs" / "hosts" / args.name,
+                      args.lobby_host, args.lobby_port, args.reserve_cpu)
+    try:
+        asyncio.run(main(agent))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
@@ -0,0 +1,296 @@
+"""
+Helpers for running uploaded games, shared by the dev server (upload
+checks) and the lobby (room launches).
+"""
+import asyncio
+import compileall
+import os
+import signal
+import socket
+import sys
+import time
+from collections import deque
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows: games run without limits
+    resource = None
+
+STARTUP_TIMEOUT = 10.0   # seconds for a game server to start listening
+STARTUP_POLL = 0.02
+NETSTAT_POLL = 0.1    # where the socket table is read by running netstat
+LOG_MAX_BYTES = int(os.environ.get("ROOM_LOG_MAX_BYTES", str(1 << 20)))  # per file, before rotating
+LOG_BACKUPS = 2        # rotated files kept: room.log.1, room.log.2
+LOG_TAIL_LINES = 500   # recent lines kept in memory for tail()
+LOG_FLUSH = 0.5        # seconds output is buffered before it is written to the file
+READ_CHUNK = 1 << 16
+
+# Ceilings for every game server; "limits" in game_config.json can only tighten them. 0 = no limit.
+GAME_LIMITS = {
+    "cpu_seconds": int(os.environ.get("GAME_CPU_SECONDS", "3600")),  # CPU time, not wall time
+    "memory_mb": int(os.environ.get("GAME_MEMORY_MB", "1024")),      # address space
+    "open_files": int(os.environ.get("GAME_OPEN_FILES", "256")),
+    "nice": int(os.environ.get("GAME_NICE", "5")),                   # at least this nice
+}
+CPU_GRACE = 5  # seconds between SIGXCPU and SIGKILL
+CPU_SAMPLE = 1.0  # seconds between CPU time samples of a running game (well under CPU_GRACE)
+# Output lines that mean the game ran into one of its limits
+VIOLATION_MARKERS = (("MemoryError", "memory"), ("Cannot allocate memory", "memory"),
+                     ("Too many open files", "open_files"))
+
+def resolve_cmd(cmd):
+    """server_cmd/run_cmd with "python" pinned to this interpreter, whose bytecode precompile() wrote."""
+    cmd = list(cmd)
+    if cmd and cmd[0] in ("python", "python3"):
+        cmd[0] = sys.executable
+    return cmd
+
+def precompile(path):
+    """Compile every module under path into __pycache__ for this interpreter. Returns success."""
+    return bool(compileall.compile_dir(str(path), quiet=1, workers=1))
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def resource_limits(cfg):
+    """The limits a game server runs with: GAME_LIMITS, tightened by the game's own "limits"."""
+    want = (cfg or {}).get("limits") or {}
+    limits = {}
+    for key, cap in GAME_LIMITS.items():
+        v = want.get(key) if isinstance(want, dict) else None
+        if type(v) is not int: v = cap
+        elif key == "nice": v = min(max(v, cap), 19)
+        else: v = min(max(v, 1), cap) if cap else max(v, 1)
+        limits[key] = v
+    return limits
+
+def _setrlimit(res, soft, hard):
+    cur = resource.getrlimit(res)[1]
+    if cur != resource.RLIM_INFINITY: soft, hard = min(soft, cur), min(hard, cur)
+    resource.setrlimit(res, (soft, hard))
+
+def preexec(limits, cpus=None):
+    """
+    preexec_fn applying `limits` (see resource_limits) and CPU affinity in the
+    child before it execs, or None where the platform has no rlimits.
+    """
+    if resource is None: return None
+    def apply():
+        _setrlimit(resource.RLIMIT_CORE, 0, 0)  # SIGXCPU would dump core into the game directory
+        if limits.get("cpu_seconds"):
+            _setrlimit(resource.RLIMIT_CPU, limits["cpu_seconds"], limits["cpu_seconds"] + CPU_GRACE)
+        if limits.get("memory_mb"):
+            _setrlimit(resource.RLIMIT_AS, limits["memory_mb"] << 20, limits["memory_mb"] << 20)
+        if limits.get("open_files"):
+            _setrlimit(resource.RLIMIT_NOFILE, limits["open_files"], limits["open_files"])
+        if limits.get("nice"): os.nice(limits["nice"])
+        if cpus: os.sched_setaffinity(0, cpus)
+    return apply
+
+def violation_in(line):
+    """The limit an output line reports running into, or None."""
+    for marker, kind in VIOLATION_MARKERS:
+        if marker in line: return kind
+    return None
+
+def exit_violation(returncode, limits=None, cpu_used=None):
+    """
+    The limit that killed a game server, judged by its exit status, or None.
+    SIGKILL is the hard CPU limit only if the game had used up cpu_seconds
+    (last sample from sample_cpu); otherwise it could be the OOM killer or
+    an operator, and is reported as "unknown".
+    """
+    if resource is None or returncode is None: return None
+    if returncode == -signal.SIGXCPU: return "cpu"
+    if returncode == -signal.SIGKILL:
+        budget = (limits or {}).get("cpu_seconds")
+        return "cpu" if budget and cpu_used is not None and cpu_used >= budget else "unknown"
+    return None
+
+def cpu_time(pid):
+    """CPU seconds (user + system) a live process has used, or None without /proc."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except (OSError, IndexError):
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+async def sample_cpu(proc, usage):
+    """Keep usage["cpu"] at proc's CPU time until it exits, for exit_violation()."""
+    while proc.returncode is None:
+        used = cpu_time(proc.pid)
+        if used is None: return
+        usage["cpu"] = used
+        await asyncio.sleep(CPU_SAMPLE)
+
+class CpuPlacer:
+    """
+    Spreads game servers over the cores this process may use, one core per
+    game and the least loaded first, keeping off `reserved`. acquire()
+    returns None when there is no core to spare.
+    """
+    def __init__(self, reserved=None):
+        cores = os.sched_getaffinity(0) if hasattr(os, "sched_getaffinity") else set()
+        self.reserved = reserved if reserved in cores else None
+        self.load = {c: 0 for c in sorted(cores) if c != reserved}
+
+    def acquire(self):
+        if not self.load: return None
+        core = min(self.load, key=lambda c: (self.load[c], c))
+        self.load[core] += 1
+        return core
+
+    def release(self, core):
+        if core in self.load: self.load[core] -= 1
+
+def _proc_listening(port):
+    """Linux: is there a LISTEN socket on port, from /proc/net/tcp{,6} (state 0A)."""
+    for table in ("/proc/net/tcp", "/proc/net/tcp6"):
+        try:
+            with open(table) as f:
+                next(f)
+                for line in f:
+                    fields = line.split()
+                    if fields[3] == "0A" and int(fields[1].rsplit(":", 1)[1], 16) == port: return True
+        except OSError:
+            continue
+    return False
+
+async def _netstat_listening(port):
+    """Elsewhere: the same from `netstat -an` (Windows "LISTENING", macOS "LISTEN", "*.port" on macOS)."""
+    proc = await asyncio.create_subprocess_exec("netstat", "-an", "-p", "tcp", stdout=asyncio.subprocess.PIPE,
+                                                stderr=asyncio.subprocess.DEVNULL)
+    out, _ = await proc.communicate()
+    for line in out.decode(errors="replace").splitlines():
+        fields = line.split()
+        if len(fields) >= 2 and "LISTEN" in line and fields[1].endswith((f":{port}", f".{port}")): return True
+    return False
+
+async def wait_listening(port, proc, timeout=STARTUP_TIMEOUT):
+    """
+    Seconds until something listens on port, or None if proc exits or the
+    timeout passes first. Checked from the OS socket table, never by
+    connecting: games count every connection as a player (some quit when
+    it leaves).
+    """
+    t0 = time.perf_counter()
+    linux = os.path.exists("/proc/net/tcp")
+    while time.perf_counter() - t0 < timeout:
+        if proc.returncode is not None: return None
+        if _proc_listening(port) if linux else await _netstat_listening(port):
+            return time.perf_counter() - t0
+        await asyncio.sleep(STARTUP_POLL if linux else NETSTAT_POLL)
+    return None
+
+async def probe_startup(path, cfg):
+    """
+    Start the game's server_cmd once in `path` and time spawn-to-listening.
+    Returns milliseconds, or None when it does not come up.
+    """
+    cmd = cfg.get("server_cmd")
+    if not cmd: return None
+    port = free_port()
+    t0 = time.perf_counter()
+    proc = await asyncio.create_subprocess_exec(
+        *resolve_cmd(cmd), "--port", str(port), "--token", os.urandom(8).hex(), "--room-id", "startup-probe",
+        cwd=str(path), stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+        preexec_fn=preexec(resource_limits(cfg)))
+    try:
+        up = await wait_listening(port, proc)
+        return None if up is None else round((time.perf_counter() - t0) * 1000, 1)
+    finally:
+        if proc.returncode is None:
+            proc.kill()
+        await proc.wait()
+
+class OutputLog:
+    """
+    A game process's stdout+stderr: appended to `path`, rotated to
+    path.1 .. path.N at max_bytes, with the last lines kept in memory
+    (numbered from 1) for tail(). watch(text) is called for every line.
+    Output is buffered and written out every LOG_FLUSH seconds in the
+    default executor, so file I/O never runs on the event loop.
+    """
+    def __init__(self, path, header=None, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS, watch=None):
+        self.path = Path(path)
+        self.watch = watch
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.f = None       # opened by the first flush
+        self.size = 0
+        self.buf = []
+        self.flushing = None  # task writing buf out
+        self.closed = False
+        self.lines = deque(maxlen=LOG_TAIL_LINES)
+        self.seq = 0        # number of the last complete line
+        self.partial = b""
+        if header: self.write(f"--- {time.strftime('%Y-%m-%d %H:%M:%S')} {header}\n".encode("utf-8"))
+
+    def write(self, data):
+        if self.closed: return
+        self.buf.append(data)
+        if not self.flushing: self.flushing = asyncio.get_running_loop().create_task(self._flush())
+        *done, self.partial = (self.partial + data).split(b"\n")
+        for line in done:
+            self.seq += 1
+            text = line.decode("utf-8", "replace")
+            self.lines.append((self.seq, text))
+            if self.watch: self.watch(text)
+
+    async def _flush(self):
+        await asyncio.sleep(LOG_FLUSH)
+        loop = asyncio.get_running_loop()
+        while self.buf:
+            data, self.buf = b"".join(self.buf), []
+            try:
+                await loop.run_in_executor(None, self._append, data)
+            except OSError as e:
+                print(f"[Log] Could not write {self.path}: {e}")
+        self.flushing = None
+
+    def _append(self, data):
+        if self.f is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.f = open(self.path, "ab")
+            self.size = self.f.tell()
+        for i in range(0, len(data), READ_CHUNK):
+            piece = data[i:i + READ_CHUNK]
+            if self.size and self.size + len(piece) > self.max_bytes: self.rotate()
+            self.f.write(piece)
+            self.size += len(piece)
+        self.f.flush()
+
+    def rotate(self):
+        self.f.close()
+        for i in range(self.backups, 0, -1):
+            src = self.path if i == 1 else self.path.with_name(f"{self.path.name}.{i - 1}")
+            if src.exists(): os.replace(src, self.path.with_name(f"{self.path.name}.{i}"))
+        self.f = open(self.path, "ab")
+        self.size = 0
+
+    def tail(self, n=50, after=0):
+        """[(line number, text)] of up to the last n lines numbered above `after`."""
+        return [x for x in self.lines if x[0] > after][-n:]
+
+    async def close(self):
+        """Write out what is still buffered and close the file."""
+        if self.closed: return
+        if self.partial:
+            self.write(b"\n")
+        self.closed = True
+        if self.flushing: await self.flushing
+        if self.f: await asyncio.get_running_loop().run_in_executor(None, self.f.close)
+
+async def drain(stream, log):
+    """Copy a process's output pipe into log until EOF, so the process can never block on a full pipe."""
+    try:
+        while True:
+            chunk = await stream.read(READ_CHUNK)
+            if not chunk: break
+            log.write(chunk)
+    finally:
+        await log.close()
@@ -2,33 +2,97 @@ import asyncio
 import json
 import os
 import sys
-import random
 import uuid
 import subprocess
+import time
+from collections import Counter
 from pathlib import Path
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from shared.protocol import sendf, recvf
-from shared.consts import LOBBY_PORT, DB_PORT, DEFAULT_DB_HOST, STORAGE_DIR
+from shared.consts import LOBBY_PORT, DB_PORT, DEFAULT_DB_HOST, STORAGE_DIR, LOBBY_ADMIN_PORT, ADMIN_HOST
+from shared import metrics, tracing, profiler, watchdog
+from shared.cache import TTLCache
+from db_feed import FeedClient, applied
+import game_runtime
+import game_host
 
 # --- Globals ---
 ONLINE_PLAYERS = {} # { username: {writer, status} }
-ROOMS = {}          # { room_id: {id, game_id, game_version, min_players, status, host, port, token, players: [], proc} }
+ROOMS = {}          # { room_id: {id, game_id, game_version, min_players, status, host, server_host, port, token, players: [], proc} }
+GAME_HOSTS = {}     # { name: game_host.GameHost } of registered game host agents
 INVITES = {}        # { username: [invites...] }
 
+# --- Metrics ---
+LOBBY_CMDS = {
+    "LOGIN", "REGISTER", "LIST_GAMES", "DOWNLOAD_GAME", "SUBMIT_REVIEW", "LIST_REVIEWS",
+    "LIST_ONLINE", "CREATE_ROOM", "JOIN_ROOM", "ROOM_STATUS", "START_GAME", "LEAVE_ROOM"
+}
+M_REQS = metrics.counter("lobby_requests_total", "Lobby requests by type and status", ("type", "status"))
+M_LATENCY = metrics.histogram("lobby_request_seconds", "Lobby request handling time", ("type",))
+M_DB_CALLS = metrics.histogram("lobby_db_call_seconds", "Round-trip time of lobby -> DB calls", ("collection", "action"))
+M_GAME_SPAWNS = metrics.counter("lobby_game_spawns_total", "Game server launches", ("result",))
+M_ROOMS_REAPED = metrics.counter("lobby_rooms_reaped_total", "WAITING rooms closed for inactivity")
+M_GAME_STARTUP = metrics.histogram("lobby_game_startup_seconds", "Game server spawn-to-listening time", ("game",),
+                                   buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+M_LIMIT_VIOLATIONS = metrics.counter("lobby_game_limit_violations_total", "Game servers that ran into a resource limit",
+                                     ("game", "limit"))
+M_CACHE = metrics.counter("lobby_cache_requests_total", "Game cache lookups by result", ("cache", "result"))
+
+def observe_cmd(cmd, t0, status, root=None):
+    c = cmd if cmd in LOBBY_CMDS else "unknown"
+    M_LATENCY.observe(time.perf_counter() - t0, c)
+    M_REQS.inc(c, status or "NONE")
+    tracing.end(root, status=status)
+
+def register_state_gauges():
+    metrics.gauge("lobby_online_players", "Logged-in players").set_function(lambda: len(ONLINE_PLAYERS))
+    metrics.gauge("lobby_rooms", "Rooms by status", ("status",)).set_function(
+        lambda: {(st,): n for st, n in Counter(r["status"] for r in ROOMS.values()).items()})
+    metrics.gauge("lobby_game_processes", "Live game server processes").set_function(
+        lambda: sum(1 for r in ROOMS.values() if r.get("proc") and r["proc"].returncode is None))
+    metrics.gauge("lobby_game_host_rooms", "Game servers per game host agent", ("host",)).set_function(
+        lambda: {(h.name,): h.active() for h in GAME_HOSTS.values()})
+    metrics.gauge("lobby_cache_entries", "Cached entries", ("cache",)).set_function(
+        lambda: {(c.name,): len(c) for c in (GAMES, CATALOG)})
+
+# --- Game metadata cache ---
+# Invalidated by db_server's change feed; only trusted while the feed is connected.
+GAME_CACHE_TTL = float(os.environ.get("GAME_CACHE_TTL", "300"))
+GAME_CACHE_SIZE = int(os.environ.get("GAME_CACHE_SIZE", "1024"))
+
+def on_db_change(ev):
+    if ev.get("game_id") is not None: GAMES.invalidate(ev["game_id"])
+    CATALOG.clear()  # uploads, status and ratings all show up in the list
+
+def on_db_reset():
+    GAMES.clear()
+    CATALOG.clear()
+
+FEED = FeedClient(on_db_change, on_db_reset, tag="Lobby")
+GAMES = TTLCache("games", GAME_CACHE_SIZE, GAME_CACHE_TTL, lambda: FEED.live, M_CACHE)
+CATALOG = TTLCache("catalog", 1, GAME_CACHE_TTL, lambda: FEED.live, M_CACHE)
+
 # --- DB Helpers ---
 async def db_call(payload):
-    try:
-        reader, writer = await asyncio.open_connection(DEFAULT_DB_HOST, DB_PORT)
-        await sendf(writer, payload)
-        resp = await recvf(reader)
-        writer.close()
-        await writer.wait_closed()
-        return resp
-    except Exception as e:
-        print(f"[Lobby] DB Error: {e}")
-        return {"ok": False, "reason": "DB_ERROR"}
+    t0 = time.perf_counter()
+    if "batch" in payload: col = act = "batch"
+    else: col, act = payload.get("collection"), payload.get("action")
+    with tracing.span(f"db {col}.{act}") as sp:
+        try:
+            reader, writer = await asyncio.open_connection(DEFAULT_DB_HOST, DB_PORT)
+            await sendf(writer, tracing.inject(payload))
+            resp = await recvf(reader)
+            writer.close()
+            await writer.wait_closed()
+            return resp
+        except Exception as e:
+            print(f"[Lobby] DB Error: {e}")
+            sp.set(error=type(e).__name__)
+            return {"ok": False, "reason": "DB_ERROR"}
+        finally:
+            M_DB_CALLS.observe(time.perf_counter() - t0, col, act)
 
 async def db_auth_player(user, pwd):
     return await db_call({"collection": "Users_Player", "action": "auth", "data": {"user": user, "password": pwd}})
@@ -36,8 +100,8 @@ async def db_auth_player(user, pwd):
 async def db_reg_player(user, pwd):
     return await db_call({"collection": "Users_Player", "action": "register", "data": {"user": user, "password": pwd}})
 
-async def db_list_games():
-    return await db_call({"collection": "Games", "action": "list"})
+async def db_list_games(if_version=None):
+    return await db_call({"collection": "Games", "action": "list", "data": {"if_version": if_version}})
 
 async def db_get_game(gid):
     return await db_call({"collection": "Games", "action": "get", "data": {"game_id": gid}})
@@ -52,15 +116,47 @@ async def db_submit_review(user, gid, rating, comments):
 async def db_record_play(user, gid):
     return await db_call({"collection": "Users_Player", "action": "record_play", "data": {"user": user, "game_id": gid}})
 
+async def cached_game(gid):
+    return await GAMES.get(gid, lambda: db_get_game(gid), keep=lambda r: r.get("ok"))
+
+LAST_CATALOG = None  # the newest catalog loaded, kept past invalidation for if_version
+
+async def load_catalog():
+    """{"ok", "version", "frame"}: the LIST_GAMES reply pre-encoded, refetched only if the DB's version moved."""
+    global LAST_CATALOG
+    prev = LAST_CATALOG
+    res = await db_list_games(prev["version"] if prev else None)
+    if res.get("not_modified") and prev: return prev
+    if not res.get("ok"): return res
+    body = {"type": "LIST_GAMES", "status": "OK", "version": res.get("version"), "games": res.get("games", [])}
+    LAST_CATALOG = {"ok": True, "version": res.get("version"), "frame": json.dumps(body, ensure_ascii=False).encode("utf-8")}
+    return LAST_CATALOG
+
+async def cached_catalog():
+    return await CATALOG.get("list", load_catalog, keep=lambda r: r.get("ok"))
+
 async def db_list_reviews(gid):
     return await db_call({"collection": "Reviews", "action": "list", "data": {"game_id": gid}})
 
-# --- Game Process Managment ---
+async def db_batch(ops, stop_on_fail=True):
+    """
+    Run ops in one DB round trip and commit; resp["results"] lines up with ops.
+    A batch that took effect but may not be durable yet is returned as it ran.
+    """
+    return applied(await db_call({"batch": ops, "stop_on_fail": stop_on_fail}))
 
-def get_free_port():
-    while True:
-        port = random.randint(20000, 30000)
-        return port
+# --- Game Process Managment ---
+# A room's game server is spawned once the room has enough players to start
+# (or by START_GAME), and is supervised from then on. WAITING rooms are
+# reaped once idle, so only rooms about to play or playing hold a process.
+ROOM_IDLE_TIMEOUT = float(os.environ.get("ROOM_IDLE_TIMEOUT", "600"))  # seconds without room activity
+ROOM_LOG_DIR = Path(os.environ.get("ROOM_LOG_DIR") or Path(__file__).parent / "logs" / "rooms")
+# Each game server gets a core of its own (least loaded first), never LOBBY_CPU,
+# which the lobby pins itself to. Needs at least two cores; GAME_CPU_AFFINITY=0 turns it off.
+GAME_CPU_AFFINITY = os.environ.get("GAME_CPU_AFFINITY", "1") != "0"
+LOBBY_CPU = int(os.environ.get("LOBBY_CPU", "0"))
+CPUS = game_runtime.CpuPlacer(reserved=LOBBY_CPU)
+LOCAL_GAME_HOST = "127.0.0.1"  # where players reach game servers the lobby runs itself
 
 def load_game_config(game_id, version):
     base = Path(__file__).parent / STORAGE_DIR / game_id / version
@@ -73,52 +169,218 @@ def load_game_config(game_id, version):
     except:
         return None, base
 
-async def start_game_server(room_id, game_id, version, token):
+async def start_game_server(room):
+    """
+    Spawn the room's game server and wait until it listens. Returns the process, or None.
+    With game host agents registered the game runs on the least loaded of them, else here.
+    """
+    if GAME_HOSTS: return await start_remote_game_server(room)
+    rid, game_id, version = room["id"], room["game_id"], room["game_version"]
     try:
         cfg, base_path = load_game_config(game_id, version)
         if not cfg:
             print(f"[Lobby] Config not found for {game_id} {version}")
-            return None, None
+            M_GAME_SPAWNS.inc("no_config")
+            return None
 
-        port = get_free_port()
         cmd_template = cfg.get("server_cmd", [])
         if not cmd_template:
             print(f"[Lobby] No server_cmd for {game_id}")
-            return None, None
-            
-        cmd = list(cmd_template)
-        cmd.extend(["--port", str(port), "--token", token, "--room-id", str(room_id)])
-        
-        print(f"[Lobby] Launching game {game_id}: {cmd}")
+            return None
+
+        port = game_runtime.free_port()
+        cmd = game_runtime.resolve_cmd(cmd_template)
+        cmd.extend(["--port", str(port), "--token", room["token"], "--room-id", str(rid)])
+        limits = game_runtime.resource_limits(cfg)
+        cpu = CPUS.acquire() if GAME_CPU_AFFINITY else None
         
-        proc = await asyncio.create_subprocess_exec(
-            *cmd,
-            cwd=str(base_path),
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        return proc, port
+        print(f"[Lobby] Launching game {game_id}: {cmd} limits={limits} cpu={cpu}")
         
+        try:
+            with tracing.span("spawn", game=game_id):
+                proc = await asyncio.create_subprocess_exec(
+                    *cmd,
+                    cwd=str(base_path),
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.STDOUT,
+                    preexec_fn=game_runtime.preexec(limits, None if cpu is None else {cpu})
+                )
+        except BaseException:
+            CPUS.release(cpu)
+            raise
     except Exception as e:
         print(f"[Lobby] Failed to start game server: {e}")
-        return None, None
-
-async def monitor_game_process(room_id, proc):
+        M_GAME_SPAWNS.inc("error")
+        return None
+
+    # Always drain the pipe: a game that fills it would block mid-match
+    room["log"] = log = game_runtime.OutputLog(ROOM_LOG_DIR / f"{rid}.log",
+                                               header=f"room {rid}: {game_id} {version}, pid {proc.pid}, "
+                                                      f"limits {limits}, cpu {cpu}",
+                                               watch=lambda line: check_output(room, line))
+    asyncio.create_task(game_runtime.drain(proc.stdout, log))
+    asyncio.create_task(monitor_game_process(room, proc, cpu, limits))
+
+    if room["status"] == "CLOSED":
+        kill_proc(proc)
+        return None
+    room["proc"], room["server_host"], room["port"] = proc, LOCAL_GAME_HOST, port
+    with tracing.span("wait_listening"):
+        up = await game_runtime.wait_listening(port, proc)
+    if up is None:
+        print(f"[Lobby] Game {game_id} for room {rid} did not start listening")
+        M_GAME_SPAWNS.inc("not_listening")
+        kill_proc(proc)
+        return None
+    M_GAME_SPAWNS.inc("ok")
+    M_GAME_STARTUP.observe(up, game_id)
+    return proc
+
+async def start_remote_game_server(room):
+    rid, game_id = room["id"], room["game_id"]
+    host = game_host.pick_host(GAME_HOSTS.values())
+    if host is None:
+        print(f"[Lobby] No game host has a free slot for room {rid}")
+        M_GAME_SPAWNS.inc("no_capacity")
+        return None
+    print(f"[Lobby] Placing room {rid} ({game_id}) on game host {host.name} ({host.active()}/{host.capacity} rooms)")
+    try:
+        with tracing.span("remote_spawn", host=host.name):
+            proc, up = await host.spawn(rid, game_id, room["game_version"], room["token"])
+    except game_host.SpawnError as e:
+        print(f"[Lobby] Game host {host.name} could not start room {rid}: {e}")
+        M_GAME_SPAWNS.inc(e.reason.lower())
+        return None
+    asyncio.create_task(monitor_game_process(room, proc))
+    if room["status"] == "CLOSED":
+        kill_proc(proc)
+        return None
+    room["proc"], room["server_host"], room["port"], room["game_host"] = proc, host.address, proc.port, host.name
+    M_GAME_SPAWNS.inc("ok")
+    M_GAME_STARTUP.observe(up, game_id)
+    return proc
+
+async def serve_game_host(reader, writer, req):
+    """Take over a connection that sent HOST_REGISTER, until the agent goes away."""
+    name = req.get("name")
+    if not game_host.authorized(writer.get_extra_info("peername")[0], req.get("secret")):
+        await sendf(writer, {"type": "HOST_REGISTER", "status": "FAIL", "reason": "NOT_AUTHORIZED"})
+        return
+    if not name or name in GAME_HOSTS:
+        await sendf(writer, {"type": "HOST_REGISTER", "status": "FAIL", "reason": "NAME_TAKEN"})
+        return
+    host = GAME_HOSTS[name] = game_host.GameHost(reader, writer, req)
+    print(f"[Lobby] Game host {name} registered at {host.address}, capacity {host.capacity}")
+    try:
+        await sendf(writer, {"type": "HOST_REGISTER", "status": "OK"})
+        await host.serve(on_violation=remote_violation)
+    finally:
+        GAME_HOSTS.pop(name, None)
+        print(f"[Lobby] Game host {name} disconnected")
+
+def prespawn(room):
+    """Start the room's game server in the background once the room could start."""
+    task = room["spawn"]
+    if len(room["players"]) < room["min_players"]: return task
+    if task is None or (task.done() and spawn_result(room, task) is None):
+        task = room["spawn"] = asyncio.create_task(start_game_server(room))
+    return task
+
+def spawn_result(room, task):
+    """The process a finished spawn task produced, or None if it failed, raised or was cancelled."""
+    if task.cancelled(): return None
+    if task.exception() is not None:
+        print(f"[Lobby] Game server spawn for room {room['id']} failed: {task.exception()!r}")
+        return None
+    return task.result()
+
+def kill_proc(proc):
+    if proc and proc.returncode is None:
+        try: proc.terminate()
+        except ProcessLookupError: pass
+
+def close_room(rid, reason):
+    """Remove a room, send its players back to Idle and stop its game server."""
+    room = ROOMS.pop(rid, None)
+    if room is None: return
+    print(f"[Lobby] Closing room {rid} ({reason}) and resetting players.")
+    room["status"] = "CLOSED"
+    for p in room["players"]:
+        if p in ONLINE_PLAYERS:
+            ONLINE_PLAYERS[p]["status"] = "Idle"
+    kill_proc(room.get("proc"))
+
+def report_violation(room, kind, detail):
+    """A room's game server ran into one of its resource limits (reported once per limit)."""
+    if kind in room["violations"]: return
+    room["violations"].append(kind)
+    M_LIMIT_VIOLATIONS.inc(room["game_id"], kind)
+    print(f"[Lobby] Room {room['id']} ({room['game_id']}) hit its {kind} limit: {detail}")
+
+def remote_violation(rid, kind, detail):
+    room = ROOMS.get(rid)
+    if room is not None: report_violation(room, kind, detail)
+
+def check_output(room, line):
+    kind = game_runtime.violation_in(line)
+    if kind: report_violation(room, kind, line.strip())
+
+def room_info(room):
+    proc = room.get("proc")
+    return {"id": room["id"], "game_id": room["game_id"], "status": room["status"], "players": room["players"],
+            "server_host": room["server_host"], "port": room["port"], "game_host": room["game_host"],
+            "pid": proc.pid if proc and proc.returncode is None else None,
+            "violations": room["violations"], "log": str(room["log"].path) if room.get("log") else None}
+
+def room_log(q):
+    """Admin /rooms/log?room=<id>&lines=50&after=<line no.>: recent game server output of a live room."""
+    room = ROOMS.get(q.get("room"))
+    if room is None: raise ValueError(f"no live room {q.get('room')!r}")
+    log = room.get("log")
+    lines = log.tail(int(q.get("lines", 50)), int(q.get("after", 0))) if log else []
+    return json.dumps({"room": room["id"], "status": room["status"], "lines": lines,
+                       "next": lines[-1][0] if lines else int(q.get("after", 0))}, ensure_ascii=False) + "\n"
+
+def register_admin_routes():
+    metrics.add_admin_route("/rooms", lambda q: json.dumps([room_info(r) for r in ROOMS.values()], ensure_ascii=False) + "\n")
+    metrics.add_admin_route("/rooms/log", room_log)
+
+def touch_room(room):
+    room["last_active"] = time.monotonic()
+
+async def monitor_game_process(room, proc, cpu=None, limits=None):
+    room_id = room["id"]
+    usage = {}
+    sampler = asyncio.create_task(game_runtime.sample_cpu(proc, usage)) if limits else None
     try:
         await proc.wait()
         print(f"[Lobby] Game {room_id} process finished.")
     except Exception as e:
         print(f"[Lobby] Monitor error for {room_id}: {e}")
     finally:
-        if room_id in ROOMS:
-            room = ROOMS[room_id]
-            print(f"[Lobby] Closing room {room_id} and resetting players.")
-            
-            for p in room["players"]:
-                if p in ONLINE_PLAYERS:
-                    ONLINE_PLAYERS[p]["status"] = "Idle"
-            
-            del ROOMS[room_id]
+        CPUS.release(cpu)
+        if sampler: sampler.cancel()
+        if isinstance(proc, game_host.RemoteProc):
+            kind = proc.violation  # judged by the agent, which sampled it
+        else:
+            kind = game_runtime.exit_violation(proc.returncode, limits, usage.get("cpu"))
+        if kind: report_violation(room, kind, f"exited with {proc.returncode}")
+        if ROOMS.get(room_id) is room and room.get("proc") is proc:
+            if room["status"] == "PLAYING":
+                close_room(room_id, f"game server exited with {proc.returncode}" + (f" ({kind} limit)" if kind else ""))
+            else:
+                # Died before the game began: START_GAME spawns a new one
+                print(f"[Lobby] Game server of waiting room {room_id} exited with {proc.returncode}")
+                room["proc"] = room["server_host"] = room["port"] = room["game_host"] = room["spawn"] = None
+
+async def reap_idle_rooms():
+    while True:
+        await asyncio.sleep(min(30.0, ROOM_IDLE_TIMEOUT / 2))
+        now = time.monotonic()
+        for rid, room in list(ROOMS.items()):
+            if room["status"] == "WAITING" and now - room["last_active"] > ROOM_IDLE_TIMEOUT:
+                close_room(rid, f"idle for {ROOM_IDLE_TIMEOUT:.0f}s")
+                M_ROOMS_REAPED.inc()
 
 
 async def handle_client(reader, writer):
@@ -131,8 +393,16 @@ async def handle_client(reader, writer):
             req = await recvf(reader)
             if not req: break
             
+            t0 = time.perf_counter()
             cmd = req.get("type")
+            root = tracing.begin(cmd, user=user)
             resp = {"type": cmd, "status": "FAIL", "reason": "UNKNOWN_CMD"}
+
+            if cmd == "HOST_REGISTER":
+                # A game host agent: the connection is its control channel from now on
+                tracing.end(root)
+                await serve_game_host(reader, writer, req)
+                break
             
             # --- AUTH ---
             if cmd == "LOGIN":
@@ -158,20 +428,24 @@ async def handle_client(reader, writer):
 
             # --- STORE ---
             elif cmd == "LIST_GAMES":
-                g = await db_list_games()
-                if g.get("ok"):
-                    resp = {"type": cmd, "status": "OK", "games": g.get("games", [])}
-                else:
+                cat = await cached_catalog()
+                if not cat.get("ok"):
                     resp = {"type": cmd, "status": "FAIL"}
+                elif req.get("if_version") and req["if_version"] == cat["version"]:
+                    resp = {"type": cmd, "status": "NOT_MODIFIED", "version": cat["version"]}
+                else:
+                    await sendf(writer, cat["frame"])
+                    observe_cmd(cmd, t0, "OK", root)
+                    continue
 
             elif cmd == "DOWNLOAD_GAME":
                 gid = req.get("game_id")
-                ginfo = await db_get_game(gid)
+                ginfo = await cached_game(gid)
                 if not ginfo.get("ok"):
                     resp = {"type": cmd, "status": "FAIL", "reason": "GAME_NOT_FOUND"}
                 else:
                     game = ginfo["game"]
-                    latest = game.get("latest_version")
+                    latest = req.get("version") or game.get("latest_version")  # game hosts fetch exact versions
                     ver_entry = next((v for v in game.get("versions", []) if v["version"] == latest), None)
                     if not ver_entry:
                         resp = {"type": cmd, "status": "FAIL", "reason": "VERSION_NOT_FOUND"}
@@ -182,12 +456,13 @@ async def handle_client(reader, writer):
                         else:
                             fsize = os.path.getsize(fpath)
                             await sendf(writer, {"type": cmd, "status": "OK", "size": fsize, "version": latest, "filename": f"{gid}_{latest}.zip"})
-                            with open(fpath, "rb") as f:
+                            with tracing.span("send_file", size=fsize), open(fpath, "rb") as f:
                                 while True:
                                     chunk = f.read(64*1024)
                                     if not chunk: break
                                     writer.write(chunk)
                                     await writer.drain()
+                            observe_cmd(cmd, t0, "OK", root)
                             continue 
 
 
@@ -197,6 +472,10 @@ async def handle_client(reader, writer):
                 rating = req.get("rating")
                 comment = req.get("comment")
                 res = await db_submit_review(user, gid, rating, comment)
+                if res.get("ok"):
+                    # Ahead of the feed event, so this player's next read sees the new rating
+                    GAMES.invalidate(gid)
+                    CATALOG.clear()
                 resp = {"type": cmd, "status": "OK"} if res.get("ok") else {"type": cmd, "status": "FAIL", "reason": res.get("reason", "ERROR")}
             
             elif cmd == "LIST_REVIEWS":
@@ -217,43 +496,56 @@ async def handle_client(reader, writer):
                 gid = req.get("game_id")
                 host_ver = req.get("game_version")
                 
-                ginfo = await db_get_game(gid)
-                if not ginfo.get("ok"):
+                cached = GAMES.peek(gid)
+                if cached is None:
+                    # Version check and play record in one round trip
+                    res = await db_batch([
+                        {"collection": "Games", "action": "get", "data": {"game_id": gid},
+                         "expect": {"game.latest_version": host_ver}},
+                        {"collection": "Users_Player", "action": "record_play", "data": {"user": user, "game_id": gid}},
+                    ])
+                    ginfo = (res.get("results") or [res])[0]
+                elif cached["game"].get("latest_version") != host_ver:
+                    ginfo = res = {**cached, "ok": False, "reason": "EXPECT_FAILED"}
+                else:
+                    # Version checked against the cache; only the play record goes to the DB
+                    ginfo, res = cached, await db_record_play(user, gid)
+                if ginfo.get("reason") == "EXPECT_FAILED":
+                    resp = {"type": cmd, "status": "FAIL", "reason": f"VERSION_MISMATCH needed: {ginfo['game'].get('latest_version')}"}
+                elif not res.get("ok"):
                     resp = {"type": cmd, "status": "FAIL", "reason": "GAME_NOT_FOUND"}
                 else:
                     game = ginfo["game"]
                     latest = game.get("latest_version")
-                    if host_ver != latest:
-                        resp = {"type": cmd, "status": "FAIL", "reason": f"VERSION_MISMATCH needed: {latest}"}
-                    else:
-                        rid = str(uuid.uuid4())[:8]
-                        token = str(uuid.uuid4())
-                        proc, port = await start_game_server(rid, gid, latest, token)
-                        
-                        if not proc:
-                             resp = {"type": cmd, "status": "FAIL", "reason": "LAUNCH_FAIL"}
-                        else:
-                            ONLINE_PLAYERS[user]["status"] = f"In Room {rid}"
-                            ROOMS[rid] = {
-                                "id": rid,
-                                "game_id": gid,
-                                "game_version": latest,
-                                "min_players": game.get("min_players", 1),
-                                "max_players": game.get("max_players", 2),
-                                "status": "WAITING",
-                                "host": user,
-                                "port": port,
-                                "token": token,
-                                "players": [user],
-                                "proc": proc
-                            }
-                            await db_record_play(user, gid)
-                            resp = {
-                                "type": cmd, "status": "OK", 
-                                "room_id": rid, "port": port, "token": token, 
-                                "min_players": game.get("min_players", 1),
-                                "host": "127.0.0.1"
-                            }
+                    rid = str(uuid.uuid4())[:8]
+                    token = str(uuid.uuid4())
+                    # The game server comes later (prespawn); ROOM_STATUS reports its port once playing
+                    ONLINE_PLAYERS[user]["status"] = f"In Room {rid}"
+                    ROOMS[rid] = {
+                        "id": rid,
+                        "game_id": gid,
+                        "game_version": latest,
+                        "min_players": game.get("min_players", 1),
+                        "max_players": game.get("max_players", 2),
+                        "status": "WAITING",
+                        "host": user,
+                        "server_host": None,  # where players reach the game server, with port
+                        "port": None,
+                        "game_host": None,    # agent running it, None when local
+                        "token": token,
+                        "players": [user],
+                        "proc": None,
+                        "spawn": None,  # Task of start_game_server, see prespawn()
+                        "log": None,    # game_runtime.OutputLog of the game server
+                        "violations": [],  # resource limits its game server ran into
+                        "last_active": time.monotonic()
+                    }
+                    prespawn(ROOMS[rid])
+                    resp = {
+                        "type": cmd, "status": "OK", 
+                        "room_id": rid, "token": token, 
+                        "min_players": game.get("min_players", 1)
+                    }
             
             elif cmd == "JOIN_ROOM":
                 rid = req.get("room_id")
@@ -272,22 +564,26 @@ async def handle_client(reader, writer):
                     else:
                          ROOMS[rid]["players"].append(user)
                          ONLINE_PLAYERS[user]["status"] = f"In Room {rid}"
+                         touch_room(room)
+                         prespawn(room)
                          await db_record_play(user, room["game_id"])
                          resp = {
                                 "type": cmd, "status": "OK", 
-                                "room_id": rid, "port": room["port"], "token": room["token"], 
-                                "host": "127.0.0.1"
+                                "room_id": rid, "token": room["token"]
                         }
 
             elif cmd == "ROOM_STATUS":
                 rid = req.get("room_id")
                 if rid in ROOMS:
                     room = ROOMS[rid]
+                    touch_room(room)
                     resp = {
                         "type": cmd, "status": "OK", 
                         "room_status": room["status"], 
                         "players": room["players"],
-                        "min_players": room["min_players"]
+                        "min_players": room["min_players"],
+                        "server_host": room["server_host"],
+                        "port": room["port"]
                     }
                 else:
                     resp = {"type": cmd, "status": "FAIL", "reason": "ROOM_NOT_FOUND"}
@@ -296,18 +592,37 @@ async def handle_client(reader, writer):
                 rid = req.get("room_id")
                 if rid in ROOMS:
                     room = ROOMS[rid]
+                    touch_room(room)
                     if room["host"] != user:
                         resp = {"type": cmd, "status": "FAIL", "reason": "NOT_HOST"}
+                    elif room["status"] != "WAITING":
+                        resp = {"type": cmd, "status": "FAIL", "reason": "GAME_ALREADY_STARTED"}
                     elif len(room["players"]) < room["min_players"]:
                         resp = {"type": cmd, "status": "FAIL", "reason": f"NEED_MORE_PLAYERS ({len(room['players'])}/{room['min_players']})"}
                     else:
-                        room["status"] = "PLAYING"
-                        for p in room["players"]:
-                            if p in ONLINE_PLAYERS: ONLINE_PLAYERS[p]["status"] = "Playing"
-                        
-                        asyncio.create_task(monitor_game_process(rid, room["proc"]))
-                        
-                        resp = {"type": cmd, "status": "OK"}
+                        room["status"] = "STARTING"  # keeps joins and a second START out while we spawn
+                        with tracing.span("start_game_server"):
+                            task = prespawn(room)
+                            await asyncio.wait([task])
+                            proc = spawn_result(room, task)
+                        if proc is None:
+                            if room["status"] == "STARTING": room["status"] = "WAITING"
+                            resp = {"type": cmd, "status": "FAIL", "reason": "LAUNCH_FAIL"}
+                        elif ROOMS.get(rid) is not room:
+                            kill_proc(proc)  # closed while starting
+                            resp = {"type": cmd, "status": "FAIL", "reason": "ROOM_NOT_FOUND"}
+                        elif proc.returncode is not None or room.get("proc") is not proc or not room["port"]:
+                            # Died (or was replaced) between the spawn and now: the next START spawns anew
+                            kill_proc(proc)
+                            if room.get("proc") is proc:
+                                room["proc"] = room["server_host"] = room["port"] = room["game_host"] = room["spawn"] = None
+                            room["status"] = "WAITING"
+                            resp = {"type": cmd, "status": "FAIL", "reason": "LAUNCH_FAIL"}
+                        else:
+                            room["status"] = "PLAYING"
+                            for p in room["players"]:
+                                if p in ONLINE_PLAYERS: ONLINE_PLAYERS[p]["status"] = "Playing"
+                            resp = {"type": cmd, "status": "OK", "server_host": room["server_host"], "port": room["port"]}
                 else:
                      resp = {"type": cmd, "status": "FAIL", "reason": "ROOM_NOT_FOUND"}
             
@@ -318,16 +633,15 @@ async def handle_client(reader, writer):
                     if user in room["players"]:
                          room["players"].remove(user)
                          ONLINE_PLAYERS[user]["status"] = "Idle"
+                         touch_room(room)
                          if room["host"] == user:
-                             room["status"] = "CLOSED" 
-                             del ROOMS[rid]
-                             try: room["proc"].terminate()
-                             except: pass
+                             close_room(rid, "host left")
                     resp = {"type": cmd, "status": "OK"}
                 else:
                     resp = {"type": cmd, "status": "OK"}
 
             await sendf(writer, resp)
+            observe_cmd(cmd, t0, resp.get("status"), root)
 
     except Exception as e:
         print(f"[Lobby] Client Error: {e}")
@@ -345,17 +659,24 @@ async def handle_client(reader, writer):
                     if user in r["players"]: r["players"].remove(user)
             
             for rid in rooms_to_close:
-                proc = ROOMS[rid].get("proc")
-                if proc:
-                    try:
-                        proc.terminate()
-                    except: pass
-                del ROOMS[rid]
+                close_room(rid, "host disconnected")
 
         writer.close()
         await writer.wait_closed()
 
 async def main():
+    tracing.configure("lobby")
+    profiler.install("lobby")
+    watchdog.install("lobby")
+    register_state_gauges()
+    register_admin_routes()
+    if GAME_CPU_AFFINITY and CPUS.load and CPUS.reserved is not None:
+        os.sched_setaffinity(0, {LOBBY_CPU})
+        print(f"[Lobby] Pinned to CPU {LOBBY_CPU}; game servers go to CPUs {sorted(CPUS.load)}")
+    feed_task = asyncio.create_task(FEED.run())
+    reaper_task = asyncio.create_task(reap_idle_rooms())
+    await metrics.start_admin_server(LOBBY_ADMIN_PORT, ADMIN_HOST)
+    print(f"[Lobby] Metrics on http://{ADMIN_HOST}:{LOBBY_ADMIN_PORT}/metrics")
     server = await asyncio.start_server(handle_client, "0.0.0.0", LOBBY_PORT)
     print(f"[Lobby] Listening on 0.0.0.0:{LOBBY_PORT}")
     async with server:
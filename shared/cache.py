@@ -0,0 +1,95 @@
+"""
+In-process read-through cache with a TTL, a bounded LRU size and explicit
+invalidation.
+
+    cache = TTLCache("games", maxsize=1024, ttl=300, trusted=lambda: feed.live)
+    game = await cache.get("g1", lambda: db_get_game("g1"), keep=lambda r: r.get("ok"))
+    cache.invalidate("g1")
+
+Concurrent misses on one key share a single load. A load that overlaps an
+invalidation is returned to its callers but not stored, since it may have
+read the old value. While trusted() is False (e.g. the change feed that
+drives invalidation is down) every get() goes to the loader and nothing
+is stored. Cached values are shared between callers: do not mutate them.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+
+class TTLCache:
+    def __init__(self, name, maxsize=1024, ttl=60.0, trusted=None, counter=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.trusted = trusted or (lambda: True)
+        self.counter = counter  # metrics.Counter labelled (cache, result)
+        self.entries = OrderedDict()  # key -> (expires, value), least recently used first
+        self.inflight = {}            # key -> Future of the running load
+        self.gen = 0                  # bumped by every invalidation
+        self.stats = {"hit": 0, "miss": 0, "coalesced": 0, "expired": 0, "bypass": 0}
+
+    def _count(self, result):
+        self.stats[result] += 1
+        if self.counter: self.counter.inc(self.name, result)
+
+    async def get(self, key, loader, keep=None):
+        trusted = self.trusted()
+        if trusted:
+            e = self.entries.get(key)
+            if e is not None:
+                if e[0] > time.monotonic():
+                    self.entries.move_to_end(key)
+                    self._count("hit")
+                    return e[1]
+                del self.entries[key]
+                self._count("expired")
+        fut = self.inflight.get(key)
+        if fut is not None:
+            self._count("coalesced")
+            return await asyncio.shield(fut)
+        self._count("miss" if trusted else "bypass")
+        gen = self.gen
+        fut = self.inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()  # waiters get it re-raised; keep asyncio from logging it unretrieved
+            raise
+        else:
+            fut.set_result(value)
+        finally:
+            self.inflight.pop(key, None)
+        if gen == self.gen and self.trusted() and (keep is None or keep(value)):
+            self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def peek(self, key):
+        """The cached value, or None without loading (for callers that reach the DB anyway)."""
+        e = self.entries.get(key) if self.trusted() else None
+        if e is None or e[0] <= time.monotonic():
+            self._count("miss")
+            return None
+        self.entries.move_to_end(key)
+        self._count("hit")
+        return e[1]
+
+    def invalidate(self, key):
+        self.gen += 1
+        self.entries.pop(key, None)
+
+    def clear(self):
+        self.gen += 1
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
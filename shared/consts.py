@@ -4,6 +4,12 @@ DB_PORT = 10001
 LOBBY_PORT = 11000
 DEV_PORT = 12000
 
+# local-only admin endpoints (GET /metrics)
+DB_ADMIN_PORT = 10101
+LOBBY_ADMIN_PORT = 11101
+DEV_ADMIN_PORT = 12101
+ADMIN_HOST = "127.0.0.1"
+
 DEFAULT_DB_HOST = "127.0.0.1"
 DEFAULT_LOBBY_HOST = "127.0.0.1"
 DEFAULT_DEV_HOST = "127.0.0.1"
@@ -0,0 +1,200 @@
+import asyncio
+import bisect
+import time
+
+# Latency buckets in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(v):
+    """Escape backslash, double quote and newline in a label value (Prometheus text format)."""
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _fmt_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra: pairs.append(extra)
+    if not pairs: return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + body + "}"
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = self.header()
+        for lv, v in self.values.items():
+            lines.append(f"{self.name}{_fmt_labels(self.labels, lv)} {v}")
+        return lines
+
+class Gauge(_Metric):
+    """
+    Settable gauge. With set_function(fn) the value is computed at scrape
+    time instead: fn returns a number, or {label_tuple: number} for labelled gauges.
+    """
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self.values = {}
+        self.fn = None
+
+    def set(self, value, *labels):
+        self.values[labels] = value
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set_function(self, fn):
+        self.fn = fn
+
+    def render(self):
+        lines = self.header()
+        values = self.values
+        if self.fn:
+            v = self.fn()
+            values = v if isinstance(v, dict) else {(): v}
+        for lv, v in values.items():
+            lines.append(f"{self.name}{_fmt_labels(self.labels, lv)} {v}")
+        return lines
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        self.series = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value, *labels):
+        s = self.series.get(labels)
+        if s is None:
+            s = self.series[labels] = [0] * (len(self.buckets) + 2)
+        i = bisect.bisect_left(self.buckets, value)
+        if i < len(self.buckets): s[i] += 1
+        s[-2] += value
+        s[-1] += 1
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = self.header()
+        for lv, s in self.series.items():
+            acc = 0
+            for b, n in zip(self.buckets, s):
+                acc += n
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labels, lv, ('le', b))} {acc}")
+            lines.append(f"{self.name}_bucket{_fmt_labels(self.labels, lv, ('le', '+Inf'))} {s[-1]}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labels, lv)} {s[-2]}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labels, lv)} {s[-1]}")
+        return lines
+
+class _Timer:
+    __slots__ = ("h", "labels", "t0")
+
+    def __init__(self, h, labels):
+        self.h = h
+        self.labels = labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.h.observe(time.perf_counter() - self.t0, *self.labels)
+
+# --- Registry ---
+
+REGISTRY = {}
+
+def _register(cls, name, help, labels, **kw):
+    m = REGISTRY.get(name)
+    if m is None:
+        m = REGISTRY[name] = cls(name, help, labels, **kw)
+    return m
+
+def counter(name, help, labels=()):
+    return _register(Counter, name, help, labels)
+
+def gauge(name, help, labels=()):
+    return _register(Gauge, name, help, labels)
+
+def histogram(name, help, labels=(), buckets=DEFAULT_BUCKETS):
+    return _register(Histogram, name, help, labels, buckets=buckets)
+
+def render():
+    """Prometheus text exposition format (0.0.4)."""
+    lines = []
+    for m in REGISTRY.values():
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+# --- Admin endpoint ---
+
+ADMIN_ROUTES = {}  # path -> fn(params: dict) -> str
+
+def add_admin_route(path, fn):
+    """Expose fn on the admin port. fn gets the query parameters and returns the body text."""
+    ADMIN_ROUTES[path] = fn
+
+def _parse_query(qs):
+    params = {}
+    for part in qs.split("&"):
+        if part:
+            k, _, v = part.partition("=")
+            params[k] = v
+    return params
+
+async def _handle_admin(reader, writer):
+    try:
+        request = await asyncio.wait_for(reader.readline(), 5)
+        while True:
+            line = await asyncio.wait_for(reader.readline(), 5)
+            if line in (b"\r\n", b"\n", b""): break
+        parts = request.decode("latin-1").split()
+        path, _, qs = (parts[1] if len(parts) > 1 else "/").partition("?")
+        fn = ADMIN_ROUTES.get(path)
+        if path == "/metrics":
+            status, body = "200 OK", render().encode("utf-8")
+        elif fn:
+            try:
+                status, body = "200 OK", fn(_parse_query(qs)).encode("utf-8")
+            except Exception as e:
+                status, body = "400 Bad Request", f"{type(e).__name__}: {e}\n".encode("utf-8")
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+    except Exception:
+        pass
+    finally:
+        writer.close()
+
+async def start_admin_server(port, host="127.0.0.1"):
+    """Serve GET /metrics (and any add_admin_route paths) on a local admin port."""
+    return await asyncio.start_server(_handle_admin, host, port)
@@ -0,0 +1,165 @@
+"""
+On-demand sampling profiler for the asyncio servers.
+
+While running, a background thread samples the event-loop thread's stack
+every few ms, and a probe task measures loop lag (how late a sleep(period)
+wakes up) and the number of live asyncio tasks. On stop it writes:
+
+    profile-<service>-<time>.folded   collapsed stacks ("a;b;c <count>"),
+                                      readable by flamegraph.pl / speedscope
+    profile-<service>-<time>.json     loop lag percentiles and task counts
+
+Control, once install(service) has been called from main():
+    curl '127.0.0.1:<admin port>/profile/start?seconds=30&interval_ms=5'
+    curl 127.0.0.1:<admin port>/profile/stop
+    curl 127.0.0.1:<admin port>/profile/status
+    kill -USR1 <pid>     # toggle (POSIX only)
+"""
+import asyncio
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+
+from . import metrics
+
+DEFAULT_SECONDS = 30
+DEFAULT_INTERVAL_MS = 5
+LAG_PERIOD_MS = 10
+MAX_SECONDS = 600
+
+SERVICE = "server"
+OUT_DIR = "."
+_ACTIVE = None  # the running Profile, if any
+_LAST = None    # summary of the last finished run
+
+def _frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class Profile:
+    def __init__(self, seconds, interval_ms):
+        self.seconds = seconds
+        self.interval = interval_ms / 1000
+        self.stacks = Counter()
+        self.samples = 0
+        self.lags = []   # seconds late per probe wake-up
+        self.tasks = []  # live task count per probe wake-up
+        self.loop = asyncio.get_running_loop()
+        self.thread_id = threading.get_ident()
+        self.started = time.time()
+        self._halt = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+        self._probe = None
+        self._timer = None
+
+    def start(self):
+        self._thread.start()
+        self._probe = self.loop.create_task(self._lag_probe())
+        self._timer = self.loop.call_later(self.seconds, stop)
+
+    def _sample(self):
+        tid = self.thread_id
+        while not self._halt.wait(self.interval):
+            f = sys._current_frames().get(tid)
+            stack = []
+            while f is not None:
+                stack.append(_frame_name(f.f_code))
+                f = f.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    async def _lag_probe(self):
+        period = LAG_PERIOD_MS / 1000
+        while True:
+            t = self.loop.time()
+            await asyncio.sleep(period)
+            self.lags.append(max(0.0, self.loop.time() - t - period))
+            self.tasks.append(len(asyncio.all_tasks(self.loop)))
+
+    def finish(self):
+        self._halt.set()
+        self._thread.join(1.0)
+        if self._probe: self._probe.cancel()
+        if self._timer: self._timer.cancel()
+
+    def summary(self):
+        lags = sorted(self.lags)
+        def pct(p): return round(lags[min(len(lags) - 1, int(p * len(lags)))] * 1000, 3) if lags else None
+        return {
+            "service": SERVICE, "started": self.started,
+            "seconds": round(time.time() - self.started, 3),
+            "interval_ms": self.interval * 1000, "samples": self.samples,
+            "loop_lag_ms": {"p50": pct(.5), "p95": pct(.95), "p99": pct(.99), "max": pct(1.0),
+                            "probes": len(lags), "period_ms": LAG_PERIOD_MS},
+            "tasks": {"min": min(self.tasks, default=0), "max": max(self.tasks, default=0),
+                      "avg": round(sum(self.tasks) / len(self.tasks), 1) if self.tasks else 0},
+        }
+
+    def write(self):
+        base = os.path.join(OUT_DIR, f"profile-{SERVICE}-{time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started))}")
+        with open(base + ".folded", "w", encoding="utf-8") as f:
+            for stack, n in self.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+        summary = self.summary()
+        summary["folded"] = base + ".folded"
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+# --- Control ---
+
+def start(seconds=DEFAULT_SECONDS, interval_ms=DEFAULT_INTERVAL_MS):
+    """Start profiling from within the event loop. Returns a status dict."""
+    global _ACTIVE
+    if _ACTIVE is not None:
+        return {"running": True, "error": "ALREADY_RUNNING"}
+    seconds = min(float(seconds), MAX_SECONDS)
+    interval_ms = max(float(interval_ms), 1.0)
+    _ACTIVE = Profile(seconds, interval_ms)
+    _ACTIVE.start()
+    print(f"[Profiler] {SERVICE}: started for {seconds:g}s, sampling every {interval_ms:g}ms")
+    return status()
+
+def stop():
+    """Stop the running profile and write its output files."""
+    global _ACTIVE, _LAST
+    prof, _ACTIVE = _ACTIVE, None
+    if prof is None:
+        return {"running": False, "error": "NOT_RUNNING"}
+    prof.finish()
+    try:
+        _LAST = prof.write()
+    except OSError as e:
+        print(f"[Profiler] Write failed: {e}")
+        _LAST = prof.summary()
+    lag = _LAST["loop_lag_ms"]
+    print(f"[Profiler] {SERVICE}: {_LAST['samples']} samples, loop lag p99={lag['p99']}ms max={lag['max']}ms, "
+          f"tasks max={_LAST['tasks']['max']} -> {_LAST.get('folded')}")
+    return {"running": False, "last": _LAST}
+
+def status():
+    if _ACTIVE is not None:
+        return {"running": True, "current": _ACTIVE.summary()}
+    return {"running": False, "last": _LAST}
+
+def toggle():
+    return stop() if _ACTIVE is not None else start()
+
+def install(service, out_dir="."):
+    """Register /profile/* admin routes and a SIGUSR1 toggle. Call from main()."""
+    global SERVICE, OUT_DIR
+    SERVICE = service
+    OUT_DIR = out_dir
+    metrics.add_admin_route("/profile/start", lambda q: json.dumps(
+        start(q.get("seconds", DEFAULT_SECONDS), q.get("interval_ms", DEFAULT_INTERVAL_MS))) + "\n")
+    metrics.add_admin_route("/profile/stop", lambda q: json.dumps(stop()) + "\n")
+    metrics.add_admin_route("/profile/status", lambda q: json.dumps(status()) + "\n")
+    if hasattr(signal, "SIGUSR1"):
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, toggle)
+        except (NotImplementedError, RuntimeError):
+            pass
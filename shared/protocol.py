@@ -2,6 +2,9 @@ import struct
 import json
 import asyncio
 from .consts import MAX_FRAME_SIZE
+from . import metrics
+
+FRAME_BYTES = metrics.counter("frame_bytes_total", "Bytes of length-prefixed frames sent/received", ("direction",))
 
 def _pack(obj):
     """
@@ -30,6 +33,7 @@ async def sendf(writer: asyncio.StreamWriter, obj):
     if writer.is_closing():
         return
     data = _pack(obj)
+    FRAME_BYTES.inc("out", amount=len(data))
     writer.write(data)
     await writer.drain()
 
@@ -46,6 +50,7 @@ async def recvf(reader: asyncio.StreamReader):
             raise ValueError(f"Frame too large: {length}")
         
         body_data = await reader.readexactly(length)
+        FRAME_BYTES.inc("in", amount=4 + length)
         
         try:
             return json.loads(body_data.decode('utf-8'))
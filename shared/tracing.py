@@ -0,0 +1,167 @@
+"""
+Lightweight request tracing.
+
+A trace is started per incoming request with begin() and closed with end().
+Inside it, `with span(name):` records timed child spans, and inject(payload)
+adds {"trace": {id, span, sampled}} to an outgoing DB request so db_server
+can continue the same trace id on its side.
+
+Configured from the environment (all off by default):
+    TRACE_SAMPLE   fraction of requests whose span tree is written to TRACE_FILE
+    TRACE_SLOW_MS  print the span tree of any request slower than this
+    TRACE_FILE     JSONL output, default traces.jsonl
+
+With both TRACE_SAMPLE and TRACE_SLOW_MS unset, begin() returns None and
+span()/inject() are a context-var lookup each.
+"""
+import contextvars
+import json
+import os
+import random
+import time
+
+SAMPLE = float(os.environ.get("TRACE_SAMPLE", "0") or 0)
+SLOW_MS = float(os.environ.get("TRACE_SLOW_MS", "0") or 0)
+TRACE_FILE = os.environ.get("TRACE_FILE", "traces.jsonl")
+SERVICE = "unknown"
+
+_current = contextvars.ContextVar("trace_span", default=None)
+
+def configure(service, sample=None, slow_ms=None, path=None):
+    global SERVICE, SAMPLE, SLOW_MS, TRACE_FILE
+    SERVICE = service
+    if sample is not None: SAMPLE = sample
+    if slow_ms is not None: SLOW_MS = slow_ms
+    if path is not None: TRACE_FILE = path
+    if SAMPLE or SLOW_MS:
+        print(f"[Trace] {service}: sample={SAMPLE} slow_ms={SLOW_MS or 'off'} file={TRACE_FILE}")
+
+def _new_id(bits):
+    return format(random.getrandbits(bits), f"0{bits // 4}x")
+
+class Trace:
+    __slots__ = ("id", "sampled", "spans", "done")
+
+    def __init__(self, trace_id, sampled):
+        self.id = trace_id
+        self.sampled = sampled
+        self.spans = []
+        self.done = False
+
+class Span:
+    __slots__ = ("trace", "id", "parent", "name", "t0", "dur", "attrs", "_prev")
+
+    def __init__(self, trace, name, parent, attrs):
+        self.trace = trace
+        self.id = _new_id(32)
+        self.parent = parent
+        self.name = name
+        self.attrs = attrs
+        self.dur = None
+        self.t0 = time.perf_counter()
+        trace.spans.append(self)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self._prev = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.dur = time.perf_counter() - self.t0
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        _current.reset(self._prev)
+
+class _NoopSpan:
+    def set(self, **attrs): pass
+    def __enter__(self): return self
+    def __exit__(self, *exc): pass
+
+_NOOP = _NoopSpan()
+
+# --- API ---
+
+def begin(name, ctx=None, **attrs):
+    """
+    Start the root span for one request. ctx is the "trace" dict received
+    from an upstream service, if any. Returns the root span, or None when
+    this request is not being traced.
+    """
+    if ctx:
+        sampled = bool(ctx.get("sampled"))
+        if not (sampled or SLOW_MS): return None
+        trace = Trace(ctx.get("id") or _new_id(64), sampled)
+        parent = ctx.get("span")
+    else:
+        if not (SAMPLE or SLOW_MS): return None
+        trace = Trace(_new_id(64), SAMPLE > 0 and random.random() < SAMPLE)
+        parent = None
+    root = Span(trace, name, parent, attrs)
+    _current.set(root)
+    return root
+
+def end(root, **attrs):
+    """Close the root span; write it out if sampled and/or log it if slow."""
+    if root is None: return
+    _current.set(None)
+    root.dur = time.perf_counter() - root.t0
+    root.attrs.update(attrs)
+    trace = root.trace
+    trace.done = True
+    slow = SLOW_MS and root.dur * 1000 >= SLOW_MS
+    if trace.sampled or slow:
+        _write(root, slow)
+    if slow:
+        print(f"[Trace] SLOW {SERVICE} {root.name} {root.dur * 1000:.1f}ms trace={trace.id}")
+        for line in format_tree(root):
+            print(f"[Trace]   {line}")
+
+def span(name, **attrs):
+    """Child span of the current request, or a no-op if it isn't traced."""
+    parent = _current.get()
+    if parent is None or parent.trace.done: return _NOOP
+    return Span(parent.trace, name, parent.id, attrs)
+
+def inject(payload):
+    """Add the current trace context to an outgoing request payload."""
+    cur = _current.get()
+    if cur is not None and not cur.trace.done:
+        payload["trace"] = {"id": cur.trace.id, "span": cur.id, "sampled": cur.trace.sampled}
+    return payload
+
+# --- Output ---
+
+def _span_dict(s, t_base):
+    d = {"id": s.id, "parent": s.parent, "name": s.name,
+         "start_ms": round((s.t0 - t_base) * 1000, 3),
+         "dur_ms": None if s.dur is None else round(s.dur * 1000, 3)}
+    if s.attrs: d["attrs"] = s.attrs
+    return d
+
+def _write(root, slow):
+    rec = {
+        "trace_id": root.trace.id, "service": SERVICE, "name": root.name,
+        "ts": time.time() - root.dur, "dur_ms": round(root.dur * 1000, 3), "slow": bool(slow),
+        "spans": [_span_dict(s, root.t0) for s in root.trace.spans]
+    }
+    try:
+        with open(TRACE_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False, default=str) + "\n")
+    except OSError as e:
+        print(f"[Trace] Write failed: {e}")
+
+def format_tree(root):
+    """Indented lines: name, start offset and duration of each span under root."""
+    children = {}
+    for s in root.trace.spans:
+        if s is not root: children.setdefault(s.parent, []).append(s)
+    lines = []
+    def walk(s, depth):
+        dur = "open" if s.dur is None else f"{s.dur * 1000:.1f}ms"
+        attrs = " ".join(f"{k}={v}" for k, v in s.attrs.items())
+        lines.append(f"{'  ' * depth}{s.name} +{(s.t0 - root.t0) * 1000:.1f}ms {dur} {attrs}".rstrip())
+        for c in children.get(s.id, ()): walk(c, depth + 1)
+    walk(root, 0)
+    return lines
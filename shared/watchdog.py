@@ -0,0 +1,131 @@
+"""
+Event-loop watchdog.
+
+A heartbeat callback on the loop re-arms itself every PERIOD_MS and records
+how late it fired (loop lag). A monitor thread checks the heartbeat; if the
+loop has not come back for THRESHOLD_MS, whatever is running is blocking it,
+so the thread grabs the loop thread's stack. When the heartbeat resumes, the
+stall's duration is charged to the innermost non-stdlib frame of that stack
+("file.py:line func"), so each blocking call site accumulates count, total
+and max block time.
+
+    WATCHDOG_MS=100      block threshold (0 disables the watchdog)
+    curl 127.0.0.1:<admin port>/watchdog            per-location report (JSON)
+    curl '127.0.0.1:<admin port>/watchdog?reset=1'  report, then clear
+"""
+import asyncio
+import json
+import os
+import sys
+import sysconfig
+import threading
+import time
+import traceback
+
+from . import metrics
+
+THRESHOLD_MS = float(os.environ.get("WATCHDOG_MS", "100") or 0)
+PERIOD_MS = 20
+STACK_DEPTH = 12
+
+_STDLIB = os.path.normcase(sysconfig.get_paths()["stdlib"])
+_THIS = os.path.normcase(os.path.abspath(__file__))
+
+M_LAG = metrics.histogram("event_loop_lag_seconds", "How late the watchdog heartbeat fired")
+M_BLOCKS = metrics.counter("event_loop_blocks_total", "Loop stalls over the watchdog threshold", ("location",))
+M_BLOCKED = metrics.counter("event_loop_blocked_seconds_total", "Time the loop was blocked", ("location",))
+
+SERVICE = "server"
+LOCATIONS = {}  # location -> {count, total_ms, max_ms, stack}
+_WATCHDOG = None
+
+def _location(stack):
+    """Innermost frame outside the stdlib (asyncio, json, zipfile, ...)."""
+    if stack[-1].name == "select" and os.path.basename(stack[-1].filename) == "selectors.py":
+        # Loop was idle in select() but still woke late: CPU/GIL starvation, not a callback
+        return "(idle in select)"
+    for fs in reversed(stack):
+        fn = os.path.normcase(os.path.abspath(fs.filename))
+        if not fn.startswith(_STDLIB) and fn != _THIS and fs.name != "<module>":
+            return f"{os.path.basename(fs.filename)}:{fs.lineno} {fs.name}"
+    # Only the loop machinery itself (e.g. _run_once) was on the stack
+    fs = stack[-1]
+    return f"{os.path.basename(fs.filename)}:{fs.lineno} {fs.name}"
+
+class Watchdog:
+    def __init__(self, threshold_ms):
+        self.loop = asyncio.get_running_loop()
+        self.thread_id = threading.get_ident()
+        self.period = PERIOD_MS / 1000
+        self.threshold = threshold_ms / 1000
+        self.last = time.monotonic()
+        self.pending = None  # (heartbeat time it was captured against, stack)
+        self._halt = threading.Event()
+        self._thread = threading.Thread(target=self._monitor, name="watchdog", daemon=True)
+
+    def start(self):
+        self.loop.call_later(self.period, self._beat)
+        self._thread.start()
+
+    def stop(self):
+        self._halt.set()
+
+    def _beat(self):
+        now = time.monotonic()
+        prev = self.last
+        self.last = now
+        M_LAG.observe(max(0.0, now - prev - self.period))
+        pending = self.pending
+        if pending is not None and pending[0] == prev:
+            self.pending = None
+            self._record(now - prev - self.period, pending[1])
+        if not self._halt.is_set():
+            self.loop.call_later(self.period, self._beat)
+
+    def _monitor(self):
+        check = max(self.threshold / 4, 0.005)
+        while not self._halt.wait(check):
+            last = self.last
+            if time.monotonic() - last - self.period < self.threshold: continue
+            if self.pending is not None and self.pending[0] == last: continue
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None: continue
+            self.pending = (last, traceback.extract_stack(frame, limit=STACK_DEPTH))
+
+    def _record(self, blocked, stack):
+        loc = _location(stack)
+        ms = blocked * 1000
+        entry = LOCATIONS.get(loc)
+        if entry is None:
+            entry = LOCATIONS[loc] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                                      "stack": [f"{fs.filename}:{fs.lineno} {fs.name}" for fs in stack]}
+            print(f"[Watchdog] {SERVICE}: loop blocked {ms:.0f}ms at {loc} (new location)")
+            for line in entry["stack"][-5:]:
+                print(f"[Watchdog]     {line}")
+        else:
+            print(f"[Watchdog] {SERVICE}: loop blocked {ms:.0f}ms at {loc}")
+        entry["count"] += 1
+        entry["total_ms"] += ms
+        entry["max_ms"] = max(entry["max_ms"], ms)
+        M_BLOCKS.inc(loc)
+        M_BLOCKED.inc(loc, amount=blocked)
+
+def report(reset=False):
+    """Blocking call sites, worst total first."""
+    rows = [{"location": loc, "count": e["count"], "total_ms": round(e["total_ms"], 1),
+             "max_ms": round(e["max_ms"], 1), "avg_ms": round(e["total_ms"] / e["count"], 1),
+             "stack": e["stack"]} for loc, e in LOCATIONS.items()]
+    rows.sort(key=lambda r: -r["total_ms"])
+    if reset: LOCATIONS.clear()
+    return {"service": SERVICE, "threshold_ms": THRESHOLD_MS, "locations": rows}
+
+def install(service, threshold_ms=None):
+    """Start the watchdog on the running loop and expose /watchdog. Call from main()."""
+    global SERVICE, THRESHOLD_MS, _WATCHDOG
+    SERVICE = service
+    if threshold_ms is not None: THRESHOLD_MS = threshold_ms
+    if THRESHOLD_MS <= 0 or _WATCHDOG is not None: return
+    _WATCHDOG = Watchdog(THRESHOLD_MS)
+    _WATCHDOG.start()
+    metrics.add_admin_route("/watchdog", lambda q: json.dumps(
+        report(q.get("reset") in ("1", "true")), indent=2) + "\n")
@@ -0,0 +1,163 @@
+"""
+Read/write contention benchmark for db_server.
+
+Seeds a store with bench_db.build_db(--size) in a temp dir, starts
+db_server on it and runs closed-loop clients, each on its own connection:
+
+    readers   Games/list, Games/get, Users_Dev/auth, Users_Player/auth, Reviews/list
+    writers   Users_Player/record_play then Reviews/submit (reviews + game aggregates)
+
+Phase 1 runs the readers alone, phase 2 adds the writers, so the read
+latency of the two phases shows how much writes get in the way of reads.
+Afterwards every game's rating_sum/rating_count is checked against its
+reviews.
+
+    python tools/db_contention.py --backend json --size 100000 --readers 16 --writers 4
+    python tools/db_contention.py --backend sqlite --size 1000000 --duration 20
+"""
+import argparse
+import asyncio
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+sys.path.append(str(ROOT / "server"))
+
+from shared.protocol import sendf, recvf
+from shared.consts import DB_PORT
+from db_backends import JsonBackend, SqliteBackend
+from bench.bench_db import build_db
+from lobby_loadgen import Stats
+
+DB_FILES = {"json": "db.snap", "sqlite": "db.sqlite3"}
+
+def seed(backend, path, size):
+    base = build_db(size)
+    if backend == "json":
+        store = JsonBackend(path)
+        store.db = base
+        store.save()
+    else:
+        store = SqliteBackend(path)
+        store.open()
+        store.import_json(base)
+    store.close()
+    return len(base["users_player"]), len(base["games"])
+
+def wait_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return True
+        except OSError:
+            if time.time() >= deadline: return False
+            time.sleep(0.1)
+
+class Client:
+    def __init__(self, stats):
+        self.stats = stats
+        self.reader = self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection("127.0.0.1", DB_PORT)
+
+    async def call(self, col, act, data):
+        t0 = time.perf_counter()
+        await sendf(self.writer, {"collection": col, "action": act, "data": data})
+        resp = await recvf(self.reader)
+        if self.stats is not None:
+            self.stats.record(f"{col}.{act}"[:14], time.perf_counter() - t0, resp.get("ok"), resp.get("reason"))
+        return resp
+
+    def close(self):
+        if self.writer: self.writer.close()
+
+async def reader_loop(c, n_users, n_games, until):
+    while time.perf_counter() < until:
+        u, g = f"u{random.randrange(n_users)}", f"g{random.randrange(n_games)}"
+        op = random.random()
+        if op < 0.1: await c.call("Games", "list", {})
+        elif op < 0.4: await c.call("Games", "get", {"game_id": g})
+        elif op < 0.5: await c.call("Users_Dev", "auth", {"user": "dev0", "password": "pw"})
+        elif op < 0.8: await c.call("Users_Player", "auth", {"user": u, "password": "pw"})
+        else: await c.call("Reviews", "list", {"game_id": g})
+
+async def writer_loop(c, n_users, n_games, until):
+    while time.perf_counter() < until:
+        u, g = f"u{random.randrange(n_users)}", f"g{random.randrange(n_games)}"
+        await c.call("Users_Player", "record_play", {"user": u, "game_id": g})
+        await c.call("Reviews", "submit", {"user": u, "game_id": g, "rating": random.randint(1, 5), "comment": "load"})
+
+async def phase(name, args, n_users, n_games, writers):
+    reads, writes = Stats(), Stats()
+    clients = [Client(reads) for _ in range(args.readers)] + [Client(writes) for _ in range(writers)]
+    for c in clients: await c.connect()
+    t0 = time.perf_counter()
+    until = t0 + args.duration
+    await asyncio.gather(*(reader_loop(c, n_users, n_games, until) for c in clients[:args.readers]),
+                         *(writer_loop(c, n_users, n_games, until) for c in clients[args.readers:]))
+    elapsed = time.perf_counter() - t0
+    for c in clients: c.close()
+    print(f"\n=== {name}: {args.readers} readers, {writers} writers, {args.duration:.0f}s ===")
+    reads.report(elapsed)
+    if writers: writes.report(elapsed)
+
+async def check(n_games):
+    """Every game's aggregates must match its reviews."""
+    c = Client(None)
+    await c.connect()
+    bad = 0
+    for i in range(n_games):
+        g = (await c.call("Games", "get", {"game_id": f"g{i}"})).get("game") or {}
+        rs = (await c.call("Reviews", "list", {"game_id": f"g{i}"})).get("reviews", [])
+        if g.get("rating_count", 0) != len(rs) or g.get("rating_sum", 0) != sum(r["rating"] for r in rs):
+            bad += 1
+            if bad <= 5:
+                print(f"  g{i}: rating_count={g.get('rating_count')} rating_sum={g.get('rating_sum')} "
+                      f"but {len(rs)} reviews summing to {sum(r['rating'] for r in rs)}")
+    c.close()
+    print(f"\nConsistency: {n_games - bad}/{n_games} games match their reviews")
+    return bad == 0
+
+async def run(args, n_users, n_games):
+    await phase("reads only", args, n_users, n_games, 0)
+    await phase("reads + writes", args, n_users, n_games, args.writers)
+    return await check(n_games)
+
+def main(args):
+    if wait_port(DB_PORT, timeout=0):
+        sys.exit(f"Port {DB_PORT} is in use: stop the running db_server first")
+    workdir = Path(tempfile.mkdtemp(prefix="db_contention_"))
+    path = workdir / DB_FILES[args.backend]
+    t0 = time.perf_counter()
+    n_users, n_games = seed(args.backend, path, args.size)
+    print(f"Seeded {args.size} reviews ({n_users} players, {n_games} games) in {time.perf_counter() - t0:.1f}s")
+    proc = subprocess.Popen([sys.executable, str(ROOT / "server" / "db_server.py"), "--backend", args.backend,
+                             "--db-file", str(path)], cwd=workdir,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_port(DB_PORT):
+            sys.exit("db_server did not start")
+        ok = asyncio.run(run(args, n_users, n_games))
+    finally:
+        proc.terminate()
+        proc.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=sorted(DB_FILES), default="json")
+    parser.add_argument("--size", type=int, default=100000, help="number of reviews to seed")
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per phase")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,66 @@
+"""
+One-shot migration of a db_server JSON store (db.snap, or a pre-snapshot
+db.json) into the SQLite backend.
+
+    python tools/db_migrate.py server/db.snap server/db.sqlite3
+    python server/db_server.py --backend sqlite --db-file server/db.sqlite3
+
+The target must not exist (use --force to replace it). Rooms are not
+migrated; they are runtime state owned by the lobby.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+sys.path.append(str(ROOT / "server"))
+
+from db_backends import JsonBackend, SqliteBackend
+import db_snapshot
+
+def read_store(src):
+    """The whole JSON store as plain dicts."""
+    if Path(src).suffix == ".json":
+        return json.loads(Path(src).read_text(encoding="utf-8"))
+    js = JsonBackend(src)
+    js.map(db_snapshot.Snapshot(src))
+    try:
+        return {name: dict(coll.items()) for name, coll in js.db.items()}
+    finally:
+        js.close()
+
+def migrate(src, dst):
+    t0 = time.perf_counter()
+    db = read_store(src)
+    t_load = time.perf_counter()
+    store = SqliteBackend(dst)
+    store.open()
+    try:
+        store.import_json(db)
+        counts = store.counts()
+    finally:
+        store.close()
+    t_done = time.perf_counter()
+    print(f"[Migrate] read {src} in {t_load - t0:.2f}s, wrote {dst} in {t_done - t_load:.2f}s")
+    for col, n in counts.items():
+        expected = len(db.get(col, {}))
+        flag = "" if n == expected else f"  MISMATCH (json has {expected})"
+        print(f"[Migrate]   {col:<14} {n:>9}{flag}")
+    return all(n == len(db.get(col, {})) for col, n in counts.items())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("src", help="db.snap or db.json to read")
+    parser.add_argument("dst", help="SQLite file to create")
+    parser.add_argument("--force", action="store_true", help="replace dst if it exists")
+    args = parser.parse_args()
+    if os.path.exists(args.dst):
+        if not args.force:
+            sys.exit(f"{args.dst} already exists (use --force to replace it)")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.dst + suffix): os.remove(args.dst + suffix)
+    sys.exit(0 if migrate(args.src, args.dst) else 1)
@@ -0,0 +1,272 @@
+"""
+Load generator for the lobby server.
+
+Registers and logs in N synthetic players, then runs scripted scenarios
+against the lobby protocol with Poisson arrivals and reports per-command
+latency percentiles, throughput and error rates. A stub game (whose
+server just listens and sleeps) is uploaded through the dev server first,
+so rooms can be created and started without real game processes.
+
+    # against already running servers
+    python tools/lobby_loadgen.py --players 1000 --rate 200
+
+    # start throw-away DB/Lobby/Dev servers in a temp dir
+    python tools/lobby_loadgen.py --spawn --players 200 --mix browse=5,room=2,review=1,download=1
+"""
+import argparse
+import asyncio
+import io
+import json
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+import zipfile
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from shared.protocol import sendf, recvf
+from shared.consts import LOBBY_PORT, DEV_PORT, DEFAULT_LOBBY_HOST, DEFAULT_DEV_HOST
+
+STUB_GAME_ID = "lg_stub"
+STUB_VERSION = "1.0.0"
+
+# --- Stats ---
+
+class Stats:
+    def __init__(self):
+        self.lat = defaultdict(list)     # cmd -> [seconds]
+        self.err = defaultdict(int)      # cmd -> count
+        self.reasons = defaultdict(int)  # (cmd, reason) -> count
+
+    def record(self, cmd, dt, ok, reason=None):
+        self.lat[cmd].append(dt)
+        if not ok:
+            self.err[cmd] += 1
+            self.reasons[(cmd, reason)] += 1
+
+    def report(self, elapsed):
+        def pct(xs, p): return xs[min(len(xs) - 1, int(p * len(xs)))] * 1000
+        total = sum(len(v) for v in self.lat.values())
+        print(f"\n{'command':<14} {'count':>7} {'err%':>6} {'p50ms':>8} {'p90ms':>8} {'p99ms':>8} {'maxms':>8}")
+        print("-" * 66)
+        for cmd in sorted(self.lat):
+            xs = sorted(self.lat[cmd])
+            errp = 100.0 * self.err[cmd] / len(xs)
+            print(f"{cmd:<14} {len(xs):>7} {errp:>6.1f} {pct(xs, .5):>8.2f} {pct(xs, .9):>8.2f} {pct(xs, .99):>8.2f} {xs[-1]*1000:>8.2f}")
+        print("-" * 66)
+        print(f"total ops={total} elapsed={elapsed:.2f}s throughput={total / elapsed:.1f} ops/sec")
+        for (cmd, reason), n in sorted(self.reasons.items(), key=lambda kv: -kv[1])[:10]:
+            print(f"  error {cmd}: {reason} x{n}")
+
+# --- Player ---
+
+class Player:
+    def __init__(self, name, args, stats):
+        self.name = name
+        self.args = args
+        self.stats = stats
+        self.reader = None
+        self.writer = None
+        self.played = False
+        self.catalog = {}  # like lobby_client's on-disk catalog cache
+
+    async def call(self, req, raw_size_key=None):
+        """Send one request and time it until the reply (and any raw payload) is read."""
+        cmd = req["type"]
+        t0 = time.perf_counter()
+        try:
+            await sendf(self.writer, req)
+            resp = await recvf(self.reader)
+            if raw_size_key and resp.get("status") == "OK":
+                await self.reader.readexactly(resp[raw_size_key])
+        except Exception as e:
+            self.stats.record(cmd, time.perf_counter() - t0, False, type(e).__name__)
+            raise
+        ok = resp.get("status") in ("OK", "NOT_MODIFIED")
+        self.stats.record(cmd, time.perf_counter() - t0, ok, None if ok else resp.get("reason"))
+        return resp
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.args.lobby_host, self.args.lobby_port)
+        await self.call({"type": "REGISTER", "user": self.name, "password": "pw"})
+        resp = await self.call({"type": "LOGIN", "user": self.name, "password": "pw"})
+        return resp.get("status") == "OK"
+
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+            try: await self.writer.wait_closed()
+            except Exception: pass
+
+    # --- scenarios ---
+
+    async def browse(self, ctx):
+        resp = await self.call({"type": "LIST_GAMES", "if_version": self.catalog.get("version")})
+        if resp.get("status") == "OK": self.catalog = resp
+        games = self.catalog.get("games") or []
+        if games:
+            await self.call({"type": "LIST_REVIEWS", "game_id": random.choice(games)["id"]})
+
+    async def room(self, ctx):
+        resp = await self.call({"type": "CREATE_ROOM", "game_id": STUB_GAME_ID, "game_version": STUB_VERSION})
+        if resp.get("status") != "OK": return
+        self.played = True
+        rid = resp["room_id"]
+        # Offer the room to a guest for a moment, then start it
+        await ctx["open_rooms"].put(rid)
+        await asyncio.sleep(self.args.join_wait)
+        await self.call({"type": "ROOM_STATUS", "room_id": rid})
+        await self.call({"type": "START_GAME", "room_id": rid})
+        await self.call({"type": "LEAVE_ROOM", "room_id": rid})
+
+    async def join(self, ctx):
+        try:
+            rid = ctx["open_rooms"].get_nowait()
+        except asyncio.QueueEmpty:
+            return await self.browse(ctx)
+        resp = await self.call({"type": "JOIN_ROOM", "room_id": rid, "game_version": STUB_VERSION})
+        if resp.get("status") == "OK":
+            self.played = True
+            await self.call({"type": "LEAVE_ROOM", "room_id": rid})
+
+    async def review(self, ctx):
+        # The DB only accepts reviews from players who have played the game
+        if not self.played: return await self.room(ctx)
+        await self.call({
+            "type": "SUBMIT_REVIEW", "game_id": STUB_GAME_ID,
+            "rating": random.randint(1, 5), "comment": "load test"
+        })
+
+    async def download(self, ctx):
+        await self.call({"type": "DOWNLOAD_GAME", "game_id": STUB_GAME_ID}, raw_size_key="size")
+
+SCENARIOS = ["browse", "room", "join", "review", "download"]
+
+async def run_player(idx, args, stats, ctx, mix):
+    p = Player(f"lg_{ctx['run']}_{idx}", args, stats)
+    try:
+        if not await p.connect(): return
+        names, weights = zip(*mix.items())
+        for _ in range(args.iterations):
+            await getattr(p, random.choices(names, weights)[0])(ctx)
+            if args.think: await asyncio.sleep(random.expovariate(1.0 / args.think))
+    except Exception as e:
+        stats.record("CONNECTION", 0.0, False, type(e).__name__)
+    finally:
+        await p.close()
+
+# --- Setup ---
+
+# Listens like a real game server and runs until the lobby closes its room (or for --hold seconds)
+STUB_SERVER = """
+import argparse, socket, time
+p = argparse.ArgumentParser()
+p.add_argument("--port", type=int)
+p.add_argument("--hold", type=float, default=0.0)
+args, _ = p.parse_known_args()
+s = socket.create_server(("127.0.0.1", args.port))
+deadline = time.time() + (args.hold or 300)
+while time.time() < deadline:
+    s.settimeout(max(0.01, deadline - time.time()))
+    try: s.accept()[0].close()
+    except OSError: pass
+"""
+
+def build_stub_zip(hold):
+    cfg = {
+        "name": STUB_GAME_ID, "version": STUB_VERSION, "description": "load generator stub",
+        "type": "CLI", "min_players": 1, "max_players": 2,
+        "run_cmd": ["python", "-c", "pass"],
+        "server_cmd": ["python", "stub_server.py", "--hold", str(float(hold))]
+    }
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.writestr("game_config.json", json.dumps(cfg))
+        zf.writestr("stub_server.py", STUB_SERVER)
+    return cfg, buf.getvalue()
+
+async def upload_stub(args):
+    cfg, data = build_stub_zip(args.stub_hold)
+    reader, writer = await asyncio.open_connection(args.dev_host, args.dev_port)
+    try:
+        for t in ("REGISTER", "LOGIN"):
+            await sendf(writer, {"type": t, "user": "lg_dev", "password": "pw"})
+            await recvf(reader)
+        await sendf(writer, {
+            "type": "UPLOAD_INIT", "game_id": STUB_GAME_ID, "version": STUB_VERSION,
+            "file_size": len(data), "metadata": cfg
+        })
+        resp = await recvf(reader)
+        if resp.get("status") != "READY_TO_RECV":
+            raise RuntimeError(f"stub upload refused: {resp}")
+        writer.write(data)
+        await writer.drain()
+        resp = await recvf(reader)
+        if resp.get("status") != "OK":
+            raise RuntimeError(f"stub upload failed: {resp}")
+    finally:
+        writer.close()
+
+def spawn_servers(workdir):
+    procs = []
+    for name in ("db_server.py", "lobby_server.py", "dev_server.py"):
+        procs.append(subprocess.Popen(
+            [sys.executable, str(ROOT / "server" / name)], cwd=workdir,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        ))
+        time.sleep(0.5)
+    return procs
+
+def parse_mix(s):
+    mix = {}
+    for part in s.split(","):
+        k, _, v = part.partition("=")
+        if k not in SCENARIOS: raise SystemExit(f"unknown scenario {k!r}, choose from {SCENARIOS}")
+        mix[k] = float(v or 1)
+    return mix
+
+async def main(args):
+    procs = []
+    if args.spawn:
+        procs = spawn_servers(tempfile.mkdtemp(prefix="lobby_loadgen_"))
+    try:
+        await upload_stub(args)
+        stats = Stats()
+        ctx = {"run": uuid.uuid4().hex[:6], "open_rooms": asyncio.Queue()}
+        mix = parse_mix(args.mix)
+
+        t0 = time.perf_counter()
+        tasks = []
+        for i in range(args.players):
+            tasks.append(asyncio.create_task(run_player(i, args, stats, ctx, mix)))
+            if args.rate > 0:
+                await asyncio.sleep(random.expovariate(args.rate))
+        await asyncio.gather(*tasks)
+        stats.report(time.perf_counter() - t0)
+    finally:
+        for p in procs: p.terminate()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--players", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=50.0, help="player arrivals per second (0 = all at once)")
+    parser.add_argument("--iterations", type=int, default=10, help="scenarios per player")
+    parser.add_argument("--mix", default="browse=5,room=1,join=1,review=1,download=1")
+    parser.add_argument("--think", type=float, default=0.0, help="mean think time between scenarios (s)")
+    parser.add_argument("--join-wait", type=float, default=0.05, help="host waits this long for a guest")
+    parser.add_argument("--stub-hold", type=float, default=0.0, help="seconds the stub game server runs (0: until its room closes)")
+    parser.add_argument("--spawn", action="store_true", help="start DB/Lobby/Dev servers in a temp dir")
+    parser.add_argument("--lobby-host", default=DEFAULT_LOBBY_HOST)
+    parser.add_argument("--lobby-port", type=int, default=LOBBY_PORT)
+    parser.add_argument("--dev-host", default=DEFAULT_DEV_HOST)
+    parser.add_argument("--dev-port", type=int, default=DEV_PORT)
+    args = parser.parse_args()
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    asyncio.run(main(args))
@@ -0,0 +1,64 @@
+"""
+Tail the game server output of live lobby rooms, through the lobby's
+admin port.
+
+    python tools/room_tail.py                 # list live rooms
+    python tools/room_tail.py <room_id>       # last 50 lines
+    python tools/room_tail.py <room_id> -f    # keep following until the room closes
+
+The full output (rotated at ROOM_LOG_MAX_BYTES) stays in
+server/logs/rooms/<room_id>.log after the room is gone.
+"""
+import argparse
+import json
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from shared.consts import ADMIN_HOST, LOBBY_ADMIN_PORT
+
+def get(path):
+    with urllib.request.urlopen(f"http://{ADMIN_HOST}:{LOBBY_ADMIN_PORT}{path}", timeout=5) as r:
+        return json.loads(r.read())
+
+def list_rooms():
+    rooms = get("/rooms")
+    if not rooms: print("No live rooms")
+    for r in rooms:
+        print(f"{r['id']:<10} {r['game_id']:<15} {r['status']:<9} pid={r['pid']} port={r['port']} "
+              f"players={','.join(r['players'])}")
+
+def tail(room, lines, follow, interval):
+    after = 0
+    while True:
+        try:
+            res = get(f"/rooms/log?room={room}&lines={lines}&after={after}")
+        except urllib.error.HTTPError as e:
+            print(f"-- {e.read().decode().strip()}")
+            return
+        for n, text in res["lines"]:
+            print(text)
+        after = res["next"]
+        if not follow: return
+        lines = 10000  # everything new from here on
+        time.sleep(interval)
+
+def main(args):
+    if args.room: tail(args.room, args.lines, args.follow, args.interval)
+    else: list_rooms()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("room", nargs="?")
+    parser.add_argument("-n", "--lines", type=int, default=50)
+    parser.add_argument("-f", "--follow", action="store_true")
+    parser.add_argument("--interval", type=float, default=0.5, help="seconds between polls with -f")
+    try:
+        main(parser.parse_args())
+    except KeyboardInterrupt:
+        pass
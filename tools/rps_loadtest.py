@@ -0,0 +1,77 @@
+"""
+Load test for the cli_rps match server.
+Starts one server process with unlimited matches, plays N concurrent bot
+matches of R rounds each and reports matches/sec.
+
+    python tools/rps_loadtest.py --matches 500 --concurrency 100 --rounds 3
+"""
+import argparse
+import asyncio
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / "developer"))
+
+from game_sdk import connect
+
+TOKEN = "loadtest"
+
+async def bot(port, rounds):
+    conn = await connect("127.0.0.1", port, TOKEN)
+    played = 0
+    try:
+        while True:
+            msg = await conn.recv()
+            t = msg.get("type")
+            if t == "REQUEST_MOVE":
+                if played >= rounds:
+                    await conn.send({"move": "q"})
+                else:
+                    await conn.send({"move": random.choice(["rock", "paper", "scissors"])})
+                    played += 1
+            elif t == "GAME_END":
+                return True
+    except ConnectionResetError:
+        return False
+    finally:
+        conn.close()
+
+async def match(port, rounds):
+    a, b = await asyncio.gather(bot(port, rounds), bot(port, rounds))
+    return a and b
+
+async def run(args):
+    proc = subprocess.Popen(
+        [sys.executable, str(ROOT / "developer/games/cli_rps/server.py"),
+         "--port", str(args.port), "--token", TOKEN, "--room-id", "load", "--max-matches", "0"],
+        stdout=subprocess.DEVNULL
+    )
+    try:
+        await asyncio.sleep(1.0)
+        sem = asyncio.Semaphore(args.concurrency)
+        ok = 0
+
+        async def one():
+            nonlocal ok
+            async with sem:
+                if await match(args.port, args.rounds): ok += 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(args.matches)), return_exceptions=True)
+        dt = time.perf_counter() - t0
+        print(f"matches={args.matches} ok={ok} concurrency={args.concurrency} rounds={args.rounds}")
+        print(f"elapsed={dt:.2f}s throughput={ok / dt:.1f} matches/sec")
+    finally:
+        proc.terminate()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=24000)
+    parser.add_argument("--matches", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=3)
+    asyncio.run(run(parser.parse_args()))